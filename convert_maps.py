@@ -0,0 +1,42 @@
+"""
+Converts JSON maps to the compact binary map format and back.
+
+Usage:
+    python convert_maps.py data/maps/*.json     JSON -> compact, written next to each map
+    python convert_maps.py map.npz              compact -> JSON
+
+Compact maps keep a hash of the JSON they came from and are only loaded while it still matches,
+so re-run this after editing a JSON map to keep its compact copy in use.
+"""
+import json
+import os
+import sys
+from scripts.tilemap import TileGrid, MAP_BINARY_EXT, map_source_hash, save_map_binary, load_map_binary
+
+
+def json_to_binary(path):
+    f = open(path, 'rb')
+    source = f.read()
+    f.close()
+    map_data = json.loads(source)
+
+    grid = TileGrid()
+    grid.from_dict(map_data['tilemap'])
+    out_path = os.path.splitext(path)[0] + MAP_BINARY_EXT
+    save_map_binary(out_path, grid, map_data['tile_size'], map_data['offgrid'], source=map_source_hash(source))
+    return out_path
+
+
+def binary_to_json(path):
+    grid, tile_size, offgrid_tiles = load_map_binary(path)
+    out_path = os.path.splitext(path)[0] + '.json'
+    f = open(out_path, 'w')
+    json.dump({'tilemap': grid.to_dict(), 'tile_size': tile_size, 'offgrid': offgrid_tiles}, f)
+    f.close()
+    return out_path
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        out_path = binary_to_json(path) if path.endswith(MAP_BINARY_EXT) else json_to_binary(path)
+        print(f'{path} -> {out_path} ({os.path.getsize(path)} -> {os.path.getsize(out_path)} bytes)')
@@ -1,7 +1,9 @@
 import pygame
 import sys
+import os
 from scripts.utilities import *
 from scripts.tilemap import *
+from scripts.outline import OutlineLayer
 
 RENDER_SCALE = 2.0
 
@@ -18,6 +20,8 @@ class Editor:
         self.clock = pygame.time.Clock()
         self.screen = pygame.display.set_mode((self.screen_width,self.screen_height))
         self.display = pygame.Surface((self.screen_width / 2, self.screen_height / 2))
+        # The editor draws no outlines, but the tilemap bakes them with its chunks
+        self.outlines = OutlineLayer(self.display.get_size())
 
 
         #BASE_PATH = 'data/images/'
@@ -148,11 +152,12 @@ class Editor:
                     del self.tilemap.tilemap[tile_loc]
 
                 #Remove off-grid tiles
-                for tile in self.tilemap.offgrid_tiles.copy():
+                search_rect = pygame.Rect(mouse_pos[0] + self.scroll[0] - 128, mouse_pos[1] + self.scroll[1] - 128, 128, 128)
+                for tile in self.tilemap.offgrid_in_rect(search_rect):
                     tile_img = self.assets[tile['type']][tile['variant']]
                     tile_r = pygame.Rect(tile['pos'][0] - self.scroll[0], tile['pos'][1] - self.scroll[1], tile_img.get_width(), tile_img.get_height())
                     if tile_r.collidepoint(mouse_pos):
-                        self.tilemap.offgrid_tiles.remove(tile)
+                        self.tilemap.remove_offgrid_tile(tile)
 
             for index, variant_i in enumerate(range(len(self.assets[self.tile_list[self.tile_group]]))):
                 choice_tile = self.assets[self.tile_list[self.tile_group]][variant_i].copy()
@@ -173,7 +178,7 @@ class Editor:
                         self.clicking = True
                         if not self.ongrid:
                             to_add = {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': (mouse_pos[0] + self.scroll[0], mouse_pos[1] + self.scroll[1])}
-                            self.tilemap.offgrid_tiles.append(to_add)
+                            self.tilemap.add_offgrid_tile(to_add)
                     if event.button == 3:
                         self.right_clicking = True
 
@@ -216,14 +221,13 @@ class Editor:
                     if event.key == pygame.K_r:
                         self.tilemap.load_random_tilemap(20)
                     if event.key == pygame.K_o:
-                        self.tilemap.save_tilemap(self.savename)
+                        # Shift saves the compact binary format instead of JSON
+                        savename = os.path.splitext(self.savename)[0] + MAP_BINARY_EXT if self.shift else self.savename
+                        self.tilemap.save_tilemap(savename)
                     if event.key == pygame.K_f:
                         self.floodfill = True
                     if event.key == pygame.K_n:
-                        for tile in self.tilemap.tilemap.keys():
-                            print(self.tilemap.tilemap[tile]['type'])
-                            if self.tilemap.tilemap[tile]['type'] == 'walls':
-                                self.tilemap.tilemap[tile]['type'] = 'normal'
+                        self.tilemap.replace_tile_types(['walls'], 'normal')
 
                 if event.type == pygame.KEYUP:
                     if event.key == pygame.K_a:
@@ -16,8 +16,8 @@ import scripts.characters as _characters
 import scripts.utilities as _utilities
 import scripts.tilemap as _tilemap
 import scripts.clouds as _clouds
-import scripts.particle as _particle
 import scripts.spark as _spark
+import scripts.spatial as _spatial
 
 
 
@@ -43,9 +43,12 @@ class Game:
         pygame.joystick.init()
         _utilities.detect_joysticks(self)
         self.load_game_assets()
+        self.outlines.preload(self.assets)
 
         self.player = _entities.Player(self, (0, 0), (8, 12))
         self.tilemap = _tilemap.Tilemap(self, tile_size=16)
+        self.spatial = _spatial.SpatialHash()
+        self.activity = _spatial.ActivityRegion(self.spatial)
 
     def load_menu(self):
         self.sfx['ambience'].play(-1)
@@ -191,7 +194,7 @@ class Game:
             self.display.blit(background, (0, 0))
             self.display_outline.fill((0, 0, 0, 0))
             self.hud_display.fill((0, 0, 0, 0))
-            self.darkness_surface.fill((0, 0, 0, darkness))
+            self.lighting.fill(darkness)
 
             if not reducing_player:
                 self.draw_text('Who are you?', (self.screen_width / 4 + 30, self.screen_height / 2 - 125), self.text_font, (255, 255, 255), scale = 4, mode='center')
@@ -276,7 +279,7 @@ class Game:
                 customising_colours = False
 
             self.dummy_player.update(self.tilemap, (0, 0))
-            self.display_outline.blit(self.darkness_surface, (0, 0))
+            self.lighting.render(self.display_outline)
             self.dummy_player.render(self.display_outline, offset=self.render_scroll, scale = min(player_render_scale, 3))
 
             
@@ -310,6 +313,10 @@ class Game:
             #Skip blitting on some frames to increase FPS on some machines
             self.frame_count += 1
             self.display_frame = self.display_this_frame()
+            self.entities.flush()
+            self.activity.update(self)
+            self.spatial.rebuild(self)
+            self.entities.measure_to_player(self.player, self.frame_count)
 
             # Camera movement
             self.scroll[0] += (self.player.rect().centerx - self.screen_width / 4 - self.scroll[0]) / 15
@@ -321,7 +328,8 @@ class Game:
                 self.display.blit(self.background, (0, 0))
                 self.display_outline.fill((0, 0, 0, 0))
                 self.hud_display.fill((0, 0, 0, 0))
-                self.darkness_surface.fill((0, 0, 0, self.cave_darkness))
+                self.lighting.fill(self.cave_darkness)
+                self.outlines.begin()
             self.screenshake = max(0, self.screenshake - 1)
 
             # RENDER AND UPDATE ALL THE THINGS
@@ -331,7 +339,7 @@ class Game:
                 if self.display_frame:
                     portal.render(self.display_outline, offset=self.render_scroll)
 
-            for enemy in self.enemies.copy():
+            for enemy in self.enemies.active():
                 if not self.paused:
                     if enemy.update(self.tilemap, (0, 0)):
                         self.enemies.remove(enemy)
@@ -339,20 +347,20 @@ class Game:
                 if self.display_frame:
                     enemy.render(self.display_outline, offset=self.render_scroll)
 
-            for boss in self.bosses.copy():
+            for boss in self.bosses:
                 if not self.paused:
                     if boss.update(self.tilemap, (0, 0)):
                         self.bosses.remove(boss)
                 if self.display_frame:
                     boss.render(self.display_outline, offset=self.render_scroll)
 
-            for character in self.characters.copy():
+            for character in self.characters:
                 if not self.paused:
                     character.update(self.tilemap)
                 if self.display_frame:
                     character.render(self.display_outline, offset=self.render_scroll)
 
-            for spawn_point in self.spawn_points:
+            for spawn_point in self.spawn_points.active():
                 if not self.paused:
                     spawn_point.update(self.tilemap)
                 if self.display_frame:
@@ -364,17 +372,15 @@ class Game:
                 if self.display_frame:
                     self.player.render(self.display_outline, offset=self.render_scroll)
 
-            for projectile in self.projectiles.copy():
-                if projectile.update(self):
-                    self.projectiles.remove(projectile)
+            self.projectiles.update(self)
 
             for rect in self.potplants:
                 if random.random() < 0.01 and not self.paused:
                     pos = (rect.x + rect.width * random.random(),
                            rect.y + rect.height * random.random())
-                    self.particles.append(_particle.Particle(self, 'leaf', pos, vel=[0, random.uniform(0.2, 0.4)], frame=random.randint(0, 10)))
+                    self.particles.spawn('leaf', pos, vel=[0, random.uniform(0.2, 0.4)], frame=random.randint(0, 10))
 
-            for currency_item in self.currency_entities.copy():
+            for currency_item in self.currency_entities.active():
                 if not self.paused:
                     if currency_item.update(self.tilemap, (0, 0)):
                         self.currency_entities.remove(currency_item)
@@ -384,36 +390,25 @@ class Game:
             if self.display_frame:
                 self.tilemap.render(self.display_outline, offset=self.render_scroll)
 
-            for extra_entity in self.extra_entities.copy():
+            for extra_entity in self.extra_entities.active():
                 if not self.paused:
                     if extra_entity.update(self.tilemap):
                         self.extra_entities.remove(extra_entity)
                 if self.display_frame:
                     extra_entity.render(self.display_outline, offset=self.render_scroll)
 
-            for spark in self.sparks.copy():
+            for arc in self.arcs:
                 if not self.paused:
-                    if spark.update(self, offset=self.render_scroll):
-                        self.sparks.remove(spark)
+                    if arc.update(self, offset=self.render_scroll):
+                        self.arcs.remove(arc)
                 if self.display_frame:
-                    spark.render(self.display_outline, offset=self.render_scroll)
+                    self.outlines.add_effect(arc.render(self.outlines.effects, offset=self.render_scroll))
+            self.sparks.update(self, offset=self.render_scroll)
 
             if self.display_frame:
-                display_outline_mask = pygame.mask.from_surface(self.display_outline)
-                display_outline_sillhouette = display_outline_mask.to_surface(setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0))
-
-                for offset in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-                    self.display.blit(display_outline_sillhouette, offset)
+                self.outlines.render(self.display, self.display_outline)
 
-            for particle in self.particles.copy():
-                if self.display_frame:
-                    particle.render(self.display_outline, offset=self.render_scroll)
-                if not self.paused:
-                    kill = particle.update()
-                    if particle.type == 'leaf':
-                        particle.pos[0] += math.sin(particle.animation.frame * 0.035 + particle.randomness) * 0.2
-                    if kill:
-                        self.particles.remove(particle)
+            self.particles.update(self, offset=self.render_scroll)
 
             # Displaying HUD and text: - brilliant comment, I know
             self.display_hud_text()
@@ -552,8 +547,7 @@ class Game:
 
             if self.dead:
                 if self.display_frame:
-                    self.darkness_surface.fill(
-                        (0, 0, 0, max(self.min_pause_darkness, self.cave_darkness)))
+                    self.lighting.fill(max(self.min_pause_darkness, self.cave_darkness))
                     self.draw_text('YOU DIED', (self.screen_width / 4, self.screen_height / 4 - 30), self.text_font, (200, 0, 0), scale = 2, mode='center')
 
                     self.draw_text(self.death_message, (self.screen_width / 4, self.screen_height / 4 - 10), self.text_font, (200, 0, 0), mode='center')
@@ -566,7 +560,7 @@ class Game:
             if self.display_frame:
                 # Darkness effect blit:
                 if self.cave_darkness or self.paused or self.dead:
-                    self.display_outline.blit(self.darkness_surface, (0, 0))
+                    self.lighting.render(self.display_outline)
 
                 self.display.blit(self.display_outline, (0, 0))
                 screenshake_offset = (random.random() * self.screenshake - self.screenshake / 2, random.random() * self.screenshake - self.screenshake / 2) if self.screenshake_on else (0, 0)
@@ -855,10 +849,11 @@ class Game:
             if type in self.not_lost_on_death:
                 self.wallet[type] += currency.value
 
-        self.particles = []
-        self.projectiles = []
-        self.currency_entities = []
-        self.sparks = []
+        self.particles.clear()
+        self.projectiles.clear()
+        self.currency_entities.clear()
+        self.sparks.clear()
+        self.arcs.clear()
         self.player.dashing = 0
         self.parrots_randomised = False
 
@@ -891,12 +886,12 @@ class Game:
         self.player.light_size = min(90 + self.wallet['eyes'], 200)
 
         # Spawn in entities
-        self.enemies = []
-        self.bosses = []
-        self.portals = []
-        self.characters = []
-        self.extra_entities = []
-        self.spawn_points = []
+        self.enemies.clear()
+        self.bosses.clear()
+        self.portals.clear()
+        self.characters.clear()
+        self.extra_entities.clear()
+        self.spawn_points.clear()
         self.potplants = []
         self.meteor_sounds = 0
 
@@ -1008,9 +1003,7 @@ class Game:
         x_adj = 0
         y_adj = 0
 
-        img = font.render(str(text), True, colour)
-        if scale != 1:
-            img = pygame.transform.scale(img, (img.get_width() * scale, img.get_height() * scale))
+        img = self.text.render(str(text), font, colour, scale)
         if mode == 'center':
             x_adj = img.get_width() / 2
             y_adj = img.get_height() / 2
@@ -1169,10 +1162,10 @@ class Game:
                     self.__init__(fullscreen = self.is_fullscreen, screen_size=(self.screen_width, self.screen_height))
                     self.load_menu()
 
-            self.darkness_surface.fill((0, 0, 0, max(self.min_pause_darkness, self.cave_darkness)))
+            self.lighting.fill(max(self.min_pause_darkness, self.cave_darkness))
         if self.talking:
             self.display_text()
-            self.darkness_surface.fill((0, 0, 0, max(self.min_pause_darkness, self.cave_darkness)))
+            self.lighting.fill(max(self.min_pause_darkness, self.cave_darkness))
 
     def load_game_assets(self):
         """Loads all needed images for the game to operate as pygame surfaces.
@@ -1362,19 +1355,7 @@ class Game:
         """
         self.next_level = new_level
         self.transition += 1
-
-    def darkness_circle(self, transparency, radius, pos):
-        """Displays circle of light on the game.darkness_surface surface.
-
-        Args:
-            transparency: transparency value 0 - 255
-            radius: radius in pixels of circle
-            pos: where to blit circle
-        Returns:
-            none
-
-        """
-        pygame.draw.circle(self.darkness_surface, (0, 0, 0, transparency), pos, radius)
+        self.tilemap.pregenerate(new_level)
 
     def get_save_info(self):
         """Used on main menu to retrieve number of deaths for each save file.
@@ -1451,8 +1432,8 @@ class Game:
         for tunnel in [e for e in self.tunnels_broken if self.tunnels_broken[e] is True]:
 
             for loc in self.tunnel_positions[tunnel]:
-                if self.tilemap.tilemap[str(loc[0]) + ';' + str(loc[1])]['type'] == 'cracked':
-                    del self.tilemap.tilemap[str(loc[0]) + ';' + str(loc[1])]
+                if self.tilemap.tile_type(loc) == 'cracked':
+                    self.tilemap.delete_tile(loc, autotile=True)
 
     def get_completed_characters(self):
         """Get list of characters who's last dialogue has been said.
@@ -1482,13 +1463,10 @@ class Game:
         completed_characters = self.get_completed_characters()
 
         #Get helper objects
-        helper_objects = []
+        helper_objects = self.extra_entities.of_type('helper')
         machine_x = 0
-        for e in self.extra_entities:
-            if e.type == 'helper':
-                helper_objects.append(e)
-            elif e.type == 'machine':
-                machine_x = e.pos[0]
+        for e in self.extra_entities.of_type('machine'):
+            machine_x = e.pos[0]
 
         #Assign character skins to the helpers:
         for character in completed_characters:
@@ -111,8 +111,8 @@ class Character(_entities.PhysicsEntity):
     def render(self, surface, offset=(0, 0)):
         super().render(surface, offset=offset)
         if self.game.cave_darkness:
-            self.game.darkness_circle(0, 50, (int(self.pos[0]) - self.game.render_scroll[0] + self.size[0] / 2, int(
-                self.pos[1]) - self.game.render_scroll[1] + self.size[1] / 2))
+            self.game.lighting.add((int(self.pos[0]) - self.game.render_scroll[0] + self.size[0] / 2, int(
+                self.pos[1]) - self.game.render_scroll[1] + self.size[1] / 2), 50)
 
 
 class Hilbert(Character):
@@ -995,7 +995,7 @@ class Watson(Character):
         elif key == 3 and not self.game.dialogue_history[self.name][str(key) + 'said']:
             self.game.wallet['credits'] -= 10
             self.game.dump_machine_state['active'] = True
-            for entity in [e for e in self.game.extra_entities if e.type == 'dump_machine']:
+            for entity in self.game.extra_entities.of_type('dump_machine'):
                 entity.set_action('activating')
                 entity.light_size = 1
 
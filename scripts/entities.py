@@ -8,8 +8,8 @@ import math
 import random
 import numpy as np
 import copy
-import scripts.particle as _particle
 import scripts.spark as _spark
+import scripts.spatial as _spatial
 
 class PhysicsEntity:
     def __init__(self, game, e_type, pos, size):
@@ -31,6 +31,8 @@ class PhysicsEntity:
         self.light_size = 0
         self.death_intensity = 5
         self.friendly = False
+        # Whether update() does nothing beyond render_distance, so the entity can sleep in spatial.ActivityRegion
+        self.dormant_when_far = False
 
         self.action = ''
         self.anim_offset = (-3, -3)
@@ -41,6 +43,11 @@ class PhysicsEntity:
         self.frame_movement = [0, 0]
         self.last_movement = [0, 0]
 
+        # Filled by EntityManager.measure_to_player
+        self.player_measure = None
+        self.player_vector = [0, 0]
+        self.player_distance = 0
+
         self.dashing = 0
         self.dash_dist = 60
 
@@ -67,11 +74,11 @@ class PhysicsEntity:
     def set_action(self, action, override = False):
         if action != self.action or override:
             self.action = action
-            self.animation = self.game.assets[self.type + '/' + self.action].copy()
+            self.animation = self.game.assets[self.type + '/' + self.action].play()
 
     def too_far_to_render(self):
         # Only update/render at close distances
-        render_dist_to_player = np.linalg.norm(self.vector_to(self.game.player))
+        render_dist_to_player = self.distance_to_player()
         if render_dist_to_player > self.render_distance and not self.is_boss:
             return True
 
@@ -87,46 +94,10 @@ class PhysicsEntity:
         if self.collide_wall_check:
             # Check for collision with physics tiles
             self.pos[1] += self.frame_movement[1]
-            entity_rect = self.rect()
-            for rect in tilemap.physics_rects_around(self.rect().center, is_boss=self.is_boss):
-                if entity_rect.colliderect(rect):
-
-                    # Collision moving down
-                    if self.frame_movement[1] > 0:
-                        entity_rect.bottom = rect.top
-                        self.collisions['down'] = True
-
-                    # Collision moving up
-                    elif self.frame_movement[1] < 0:
-                        entity_rect.top = rect.bottom
-                        self.collisions['up'] = True
-                    if self.collide_wall:
-                        self.pos[1] = entity_rect.y
-
-                    if self.type == 'player':
-                        self.last_collided_wall = self.game.tilemap.tilemap[str(
-                            rect.x // self.game.tilemap.tilesize) + ';' + str(rect.y // self.game.tilemap.tilesize)]
+            self.collide_tiles(tilemap, 1, 'up', 'down')
 
             self.pos[0] += self.frame_movement[0]
-            entity_rect = self.rect()
-            for rect in tilemap.physics_rects_around(self.rect().center, is_boss=self.is_boss):
-                if entity_rect.colliderect(rect):
-
-                    # Collision moving right
-                    if self.frame_movement[0] > 0:
-                        entity_rect.right = rect.left
-                        self.collisions['right'] = True
-
-                    # Collision moving left
-                    elif self.frame_movement[0] < 0:
-                        entity_rect.left = rect.right
-                        self.collisions['left'] = True
-                    if self.collide_wall:
-                        self.pos[0] = entity_rect.x
-
-                    if self.type == 'player':
-                        self.last_collided_wall = self.game.tilemap.tilemap[str(
-                            rect.x // self.game.tilemap.tilesize) + ';' + str(rect.y // self.game.tilemap.tilesize)]
+            self.collide_tiles(tilemap, 0, 'left', 'right')
 
         # Facing direction
         if movement[0] > 0:
@@ -145,6 +116,20 @@ class PhysicsEntity:
         self.animation.update()
         self.display_darkness_circle()
 
+    def collide_tiles(self, tilemap, axis, back, forward):
+        # Push out of solid tiles along one axis, snapping to the tile edge like the rect based check did
+        rect, hit_back, hit_forward, last_hit = tilemap.sweep_axis(self.pos, self.size, axis, self.frame_movement[axis], is_boss=self.is_boss)
+        if last_hit is None:
+            return
+
+        self.collisions[back] = self.collisions[back] or hit_back
+        self.collisions[forward] = self.collisions[forward] or hit_forward
+        if self.collide_wall:
+            self.pos[axis] = rect[axis]
+
+        if self.type == 'player':
+            self.last_collided_wall = self.game.tilemap.get_tile(last_hit)
+
     def render(self, surface, offset=(0, 0), rotation=0, transparency=255, scale=1):
         # Only update/render at close distances
         posx = self.pos[0] - offset[0] + self.anim_offset[0]
@@ -154,18 +139,22 @@ class PhysicsEntity:
         if posy < -self.size[1]*2 or posy > surface.get_size()[1]:
             return False
 
-        image = self.animation.img()
-        image.set_alpha(transparency)
+        size = self.animation.img().get_size()
         if scale != 1:
-            image = pygame.transform.scale(image, (scale * image.get_width(), scale * image.get_height()))
+            size = (int(scale * size[0]), int(scale * size[1]))
+        image = self.animation.variant(flip=self.flip_x, rotation=rotation, size=size, alpha=transparency)
 
         if rotation != 0:
-            rot_image = pygame.transform.rotate(image, rotation * 180 / math.pi)
-            new_rect = rot_image.get_rect(center=image.get_rect(topleft=(posx, posy)).center)
+            pos = image.get_rect(center=pygame.Rect((posx, posy), size).center).topleft
+        else:
+            pos = (math.floor(posx), math.floor(posy))
 
-            surface.blit(pygame.transform.flip(rot_image, self.flip_x, False), new_rect.topleft)
+        # Plain frames use the outlines made when the assets were loaded
+        if rotation == 0 and scale == 1:
+            self.game.outlines.add(self.animation.img(), pos, flip=self.flip_x, transparency=transparency)
         else:
-            surface.blit(pygame.transform.flip(image, self.flip_x, False), (math.floor(posx), math.floor(posy)))
+            self.game.outlines.add(image, pos, transparency=transparency)
+        surface.blit(image, pos)
 
     def damage(self, intensity=10):
         self.game.screenshake = max(intensity, self.game.screenshake)
@@ -173,14 +162,12 @@ class PhysicsEntity:
         for _ in range(intensity):
             angle = random.random() * math.pi * 2
             speed = random.random() * 5
-            self.game.sparks.append(
-                _spark.Spark(self.rect().center, angle, 2 + random.random() * (intensity / 10)))
-            self.game.particles.append(_particle.Particle(self.game, 'particle1', self.rect().center, vel=[math.cos(
-                angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7)))
+            self.game.sparks.spawn(self.rect().center, angle, 2 + random.random() * (intensity / 10))
+            self.game.particles.spawn('particle1', self.rect().center, vel=[math.cos(
+                angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7))
 
-        self.game.sparks.append(_spark.Spark(self.rect().center, 0, intensity / 4))
-        self.game.sparks.append(
-            _spark.Spark(self.rect().center, math.pi, intensity / 4))
+        self.game.sparks.spawn(self.rect().center, 0, intensity / 4)
+        self.game.sparks.spawn(self.rect().center, math.pi, intensity / 4)
 
     def kill(self):
         self.game.screenshake = max(self.death_intensity, self.game.screenshake)
@@ -188,12 +175,12 @@ class PhysicsEntity:
         for _ in range(self.death_intensity):
             angle = random.random() * math.pi * 2
             speed = random.random() * 5
-            self.game.sparks.append(_spark.Spark(self.rect().center, angle, 2 + random.random() * (self.death_intensity / 10)))
-            self.game.particles.append(_particle.Particle(self.game, 'particle1', self.rect().center, vel=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7)))
+            self.game.sparks.spawn(self.rect().center, angle, 2 + random.random() * (self.death_intensity / 10))
+            self.game.particles.spawn('particle1', self.rect().center, vel=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7))
 
         if 'boss' in self.type:
-            self.game.sparks.append(_spark.Spark(self.rect().center, 0, self.death_intensity / 2))
-            self.game.sparks.append(_spark.Spark(self.rect().center, math.pi, self.death_intensity / 2))
+            self.game.sparks.spawn(self.rect().center, 0, self.death_intensity / 2)
+            self.game.sparks.spawn(self.rect().center, math.pi, self.death_intensity / 2)
             self.game.extra_entities.append(HeartAltar(self.game, self.pos, self.game.entity_info[18]['size'], falling = True, value = 3))
 
         # Create currencies only iff not boss - bosses drop currency in their own method.
@@ -211,7 +198,7 @@ class PhysicsEntity:
             position[0] += offset[0]
             position[1] += offset[1]
         if self.game.cave_darkness and self.game.transition <= 0 and self.light_size > 0:
-            self.game.darkness_circle(0, self.light_size, (position[0] - self.game.render_scroll[0], position[1] - self.game.render_scroll[1]))
+            self.game.lighting.add((position[0] - self.game.render_scroll[0], position[1] - self.game.render_scroll[1]), self.light_size)
 
     def check_damages(self, dash_die = True, bullet_die = True, player_contact = True):
         # Die if dashed through
@@ -222,11 +209,9 @@ class PhysicsEntity:
 
         # Also dies if hit by bullet:
         if bullet_die:
-            for projectile in self.game.projectiles:
-                if self.rect().collidepoint(projectile.pos) and projectile.type != 'spine':
-                    self.kill()
-                    self.game.projectiles.remove(projectile)
-                    return True
+            if self.game.projectiles.take_in_rect(self.rect()):
+                self.kill()
+                return True
 
         # Damages non-dashing player on contact
         if self.game.player.rect().colliderect(self.rect()) and player_contact:
@@ -247,26 +232,28 @@ class PhysicsEntity:
             self.flip_x = False
 
     def check_line_to_player(self):
-        x1, y1 = self.rect().centerx, self.rect().centery
-        x2, y2 = self.game.player.rect().centerx, self.game.player.rect().centery
-
-        x_dist = x2 - x1
-        y_dist = y2 - y1
-
-        clear = True
-        for n in range(10):
-            x = int((x1 + (n/10) * x_dist) // 16)
-            y = int((y1 + (n/10) * y_dist) // 16)
-            loc = str(x) + ';' + str(y)
-            if loc in self.game.tilemap.tilemap:
-                clear = False
-        return clear
+        return self.game.tilemap.line_of_sight(self.rect().center, self.game.player.rect().center)
 
     def vector_to(self, other):
         rect_o = self.rect()
         rect_d = other.rect()
         return [rect_d.centerx - rect_o.centerx, rect_d.centery - rect_o.centery]
 
+    def measured_to_player(self):
+        # True if this entity was in the batch measurement at the start of this frame. The measured values do not
+        # follow movement of this entity or the player later in the frame, so they can be a frame behind
+        return self.player_measure == self.game.frame_count
+
+    def vector_to_player(self):
+        if self.measured_to_player():
+            return list(self.player_vector)
+        return self.vector_to(self.game.player)
+
+    def distance_to_player(self):
+        if self.measured_to_player():
+            return self.player_distance
+        return math.hypot(*self.vector_to(self.game.player))
+
     def circular_attack(self, radius, pos=[0, 0], color=(random.randint(150, 200), 0, 0), color_str='red', can_damage_boss=False):
         for _ in range(int(radius / 3)):
             start_angle = random.random() * math.pi * 2
@@ -274,7 +261,7 @@ class PhysicsEntity:
             speed = random.random() * 2 + 1
             if pos == [0, 0]:
                 pos = self.rect().center
-            self.game.sparks.append(_spark.ExpandingArc(pos, radius, start_angle, end_angle, speed, color, color_str=color_str,can_damage_boss=can_damage_boss, width=5, damage=self.attack_power, type=self.type))
+            self.game.arcs.append(_spark.ExpandingArc(pos, radius, start_angle, end_angle, speed, color, color_str=color_str,can_damage_boss=can_damage_boss, width=5, damage=self.attack_power, type=self.type))
 
     def colour_change(self, image, old_c, new_c):
         img = pygame.Surface(image.get_size())
@@ -287,6 +274,7 @@ class PhysicsEntity:
 class Bat(PhysicsEntity):
     def __init__(self, game, pos, size, grace_done=False, velocity=[0, 0], friendly = False):
         super().__init__(game, 'bat', pos, size)
+        self.dormant_when_far = True
 
         self.currency_drops['cog'] = random.randint(0, 3)
         self.currency_drops['heartFragment'] = 1 if random.random() < 0.2 else 0
@@ -343,7 +331,7 @@ class Bat(PhysicsEntity):
 
                 if not self.timer and not self.friendly:
                     self.set_action('charging')
-                    to_player = self.vector_to(self.game.player)
+                    to_player = self.vector_to_player()
                     self.to_player = to_player / np.linalg.norm(to_player)
                     self.velocity = [-self.to_player[0] * 0.15, -self.to_player[1] * 0.15]
 
@@ -385,6 +373,7 @@ class Bat(PhysicsEntity):
 class GunGuy(PhysicsEntity):
     def __init__(self, game, pos, size):
         super().__init__(game, 'gunguy', pos, size)
+        self.dormant_when_far = True
         self.death_intensity = 15
         self.difficulty_level = 1
         self.walking = 0
@@ -489,8 +478,7 @@ class GunGuy(PhysicsEntity):
                         while not found_spot:
                             check_spot[0], check_spot[1] = int(player_pos_tile[0] + random.choice(
                                 range(-3, 4))), int(player_pos_tile[1] + random.choice(range(-2, 3)))
-                            loc_str = str(check_spot[0]) + ';' + str(check_spot[1])
-                            if loc_str not in self.game.tilemap.tilemap:
+                            if not self.game.tilemap.has_tile(check_spot):
                                 found_spot = True
                         self.game.extra_entities.append(Meteor(
                             self.game, (check_spot[0] * self.game.tilemap.tilesize, check_spot[1] * self.game.tilemap.tilesize), (16, 16)))
@@ -501,9 +489,10 @@ class GunGuy(PhysicsEntity):
                         self.game.enemies.append(Bat(self.game, batpos, self.game.entity_info[4]['size'], grace_done=True, velocity=bullet_velocity))
                     else:
                         self.game.sfx['shoot' if self.weapon == 'gun' else 'laser'].play()
-                        self.game.projectiles.append(Bullet(self.game, [self.rect().centerx - (bullet_offset[0] if self.flip_x else -bullet_offset[0]), self.rect().centery + bullet_offset[1]], bullet_velocity, self.label, type = f'projectile_{self.type.strip('gunguy')}'))
+                        bullet_pos = [self.rect().centerx - (bullet_offset[0] if self.flip_x else -bullet_offset[0]), self.rect().centery + bullet_offset[1]]
+                        self.game.projectiles.spawn(bullet_pos, bullet_velocity, self.label, type = f'projectile_{self.type.strip('gunguy')}')
                         for _ in range(4):
-                            self.game.sparks.append(_spark.Spark(self.game.projectiles[-1].pos, random.random() - 0.5 + (math.pi if self.flip_x else 0), 2 + random.random()))
+                            self.game.sparks.spawn(bullet_pos, random.random() - 0.5 + (math.pi if self.flip_x else 0), 2 + random.random())
 
             elif self.walking:
                 # Check jump condition, tilemap in_front and above:
@@ -603,7 +592,7 @@ class GunGuy(PhysicsEntity):
                                 self.walking = 0
 
                     elif self.weapon == 'staff' and self.game.current_level == 'space' and self.witch:
-                        distto_player = np.linalg.norm(self.vector_to(self.game.player))
+                        distto_player = self.distance_to_player()
 
                         if distto_player < self.game.screen_width / 8:
                             self.shoot_countdown = 60
@@ -625,8 +614,8 @@ class GunGuy(PhysicsEntity):
                     self.flying = 0
 
             if not self.gravity_affected and random.random() < 0.1:
-                self.game.sparks.append(_spark.Spark(self.rect().midbottom, random.random(
-                ) * math.pi, random.random() * 2, color=random.choice(self.colours)))
+                self.game.sparks.spawn(self.rect().midbottom, random.random(
+                ) * math.pi, random.random() * 2, color=random.choice(self.colours))
 
             # Setting animation type
             if self.action == 'jump':
@@ -655,17 +644,20 @@ class GunGuy(PhysicsEntity):
                 xpos = self.rect().centerx - 2 - self.game.assets['weapons/' +
                                      self.weapon][self.weapon_index].get_width() - offset[0]
                 ypos = self.rect().centery - offset[1] - y_offset
+                self.game.outlines.add(self.game.assets['weapons/' + self.weapon][self.weapon_index], (xpos, ypos), flip=True)
                 surface.blit(pygame.transform.flip(
                     self.game.assets['weapons/' + self.weapon][self.weapon_index], True, False), (xpos, ypos))
             else:
                 xpos = self.rect().centerx + 2 - offset[0]
                 ypos = self.rect().centery - offset[1] - y_offset
+                self.game.outlines.add(self.game.assets['weapons/' + self.weapon][self.weapon_index], (xpos, ypos))
                 surface.blit(
                     self.game.assets['weapons/' + self.weapon][self.weapon_index], (xpos, ypos))
 
             if self.witch:
-                surface.blit(pygame.transform.flip(self.game.assets['witchHat'], self.flip_x, False), [
-                             self.rect().midtop[0] - offset[0] - 7, self.rect().midtop[1] - offset[1] - 7])
+                hat_pos = [self.rect().midtop[0] - offset[0] - 7, self.rect().midtop[1] - offset[1] - 7]
+                self.game.outlines.add(self.game.assets['witchHat'], hat_pos, flip=self.flip_x)
+                surface.blit(pygame.transform.flip(self.game.assets['witchHat'], self.flip_x, False), hat_pos)
 
 class Portal(PhysicsEntity):
     def __init__(self, game, pos, size, destination):
@@ -711,8 +703,8 @@ class Portal(PhysicsEntity):
             if random.random() < (0.1 + (0.1 if self.action == 'active' else 0)):
                 angle = (random.random()) * 2 * math.pi
                 speed = random.random() * (3 if self.action == 'active' else 2)
-                self.game.sparks.append(_spark.Spark(self.rect(
-                ).center, angle, speed, color=random.choice(self.colours[self.destination])))
+                self.game.sparks.spawn(self.rect(
+                ).center, angle, speed, color=random.choice(self.colours[self.destination]))
 
         # Collision and level change
         player_rect = self.game.player.rect()
@@ -776,8 +768,8 @@ class Player(PhysicsEntity):
                     angle = (random.random()) * math.pi
                     speed = random.random() * (2)
                     extra = 2 if abs(self.dashing) > 40 else 0
-                    self.game.sparks.append(_spark.Spark((self.rect().centerx, self.rect(
-                    ).bottom), angle, speed + extra, color=(190, 200, 220)))
+                    self.game.sparks.spawn((self.rect().centerx, self.rect(
+                    ).bottom), angle, speed + extra, color=(190, 200, 220))
             self.air_time = 0
             self.jumps = self.total_jumps
 
@@ -787,8 +779,8 @@ class Player(PhysicsEntity):
                 angle = (random.random()) * math.pi
                 speed = random.random() * (2)
                 extra = 2 if self.dashing else 0
-                self.game.sparks.append(_spark.Spark((self.rect().centerx, self.rect(
-                ).top), angle, speed + extra, color=(190, 200, 220)))
+                self.game.sparks.spawn((self.rect().centerx, self.rect(
+                ).top), angle, speed + extra, color=(190, 200, 220))
 
         self.wall_slide = False
         if (self.collisions['left'] or self.collisions['right']) and self.air_time > 5:
@@ -809,8 +801,8 @@ class Player(PhysicsEntity):
                     angle = (random.random() - 0.5) * math.pi + (math.pi if self.collisions['right'] else 0)
                     speed = random.random() * (2)
                     extra = 2
-                    self.game.sparks.append(_spark.Spark(((self.rect().left if self.collisions['left'] else self.rect(
-                    ).right), self.rect().centery), angle, speed + extra, color=(190, 200, 220)))
+                    self.game.sparks.spawn(((self.rect().left if self.collisions['left'] else self.rect(
+                    ).right), self.rect().centery), angle, speed + extra, color=(190, 200, 220))
 
         if not self.wall_slide:
             if self.air_time > 5:
@@ -838,8 +830,8 @@ class Player(PhysicsEntity):
 
             if self.game.transition < 1:
                 p_velocity = [abs(self.dashing) / self.dashing * random.random() * 3, 0]
-                self.game.particles.append(_particle.Particle(self.game, 'particle' + str(self.game.power_level), self.rect(
-                ).center, vel=[movement[0] + random.random(), movement[1] + random.random()], frame=random.randint(0, 7)))
+                self.game.particles.spawn('particle' + str(self.game.power_level), self.rect(
+                ).center, vel=[movement[0] + random.random(), movement[1] + random.random()], frame=random.randint(0, 7))
 
             # Breaking cracked tiles:
             if any(self.collisions.values()) and (self.game.wallet['hammers']) > 0:
@@ -851,11 +843,11 @@ class Player(PhysicsEntity):
 
                             # Actually break all the tiles and save tunnel as broken:
                             for loc in self.game.tunnel_positions[tunnel_name]:
-                                if self.game.tilemap.tilemap[str(loc[0]) + ';' + str(loc[1])]['type'] == 'cracked':
-                                    del self.game.tilemap.tilemap[str(loc[0]) + ';' + str(loc[1])]
+                                if self.game.tilemap.tile_type(loc) == 'cracked':
+                                    self.game.tilemap.delete_tile(loc, autotile=True)
                                     for _ in range(3):
-                                        self.game.sparks.append(_spark.Spark(
-                                        (loc[0] * self.game.tilemap.tilesize, loc[1] * self.game.tilemap.tilesize), random.random() * math.pi * 2, random.random() * 2 + 2))
+                                        self.game.sparks.spawn(
+                                        (loc[0] * self.game.tilemap.tilesize, loc[1] * self.game.tilemap.tilesize), random.random() * math.pi * 2, random.random() * 2 + 2)
 
                             self.game.tunnels_broken[tunnel_name] = True
                             self.game.wallet['hammers'] -= 1
@@ -867,8 +859,8 @@ class Player(PhysicsEntity):
                     speed = random.random() * 0.5 + 0.5
                     p_velocity = [math.cos(angle) * speed,
                                   math.sin(angle) * speed]
-                    self.game.particles.append(_particle.Particle(self.game, 'particle' + str(
-                        self.game.power_level), self.rect().center, vel=p_velocity, frame=random.randint(0, 7)))
+                    self.game.particles.spawn('particle' + str(
+                        self.game.power_level), self.rect().center, vel=p_velocity, frame=random.randint(0, 7))
 
         elif abs(self.dashing) == 1:
             self.game.sfx['dashClick'].play()
@@ -876,8 +868,8 @@ class Player(PhysicsEntity):
                 angle = random.random() * 2 * math.pi
                 speed = random.random() * 1.5
                 p_velocity = [math.cos(angle) * speed, math.sin(angle) * speed]
-                self.game.particles.append(_particle.Particle(self.game, 'particle' + str(
-                    self.game.power_level), self.rect().center, vel=p_velocity, frame=random.randint(0, 7)))
+                self.game.particles.spawn('particle' + str(
+                    self.game.power_level), self.rect().center, vel=p_velocity, frame=random.randint(0, 7))
 
         if self.dashing > 0:
             self.dashing = max(0, self.dashing - 1)
@@ -892,7 +884,7 @@ class Player(PhysicsEntity):
             self.velocity[0] = min(self.velocity[0] + 0.1, 0)
 
         if self.animation.frame % 5 == 0:
-            webs = [e for e in self.game.extra_entities if e.type == 'web']
+            webs = self.game.extra_entities.of_type('web')
             self.terminal_vel = 5
             self.can_dash = True
             for web in webs:
@@ -918,8 +910,8 @@ class Player(PhysicsEntity):
             for _ in range(5):
                 angle = (random.random() + 1 + self.flip_x) * (math.pi / 4)
                 speed = random.random() * (2)
-                self.game.sparks.append(_spark.Spark(
-                    (self.rect().centerx, self.rect().bottom), angle, speed, color=(190, 200, 220)))
+                self.game.sparks.spawn(
+                    (self.rect().centerx, self.rect().bottom), angle, speed, color=(190, 200, 220))
             return True
 
         elif self.jumps > 0 and abs(self.dashing) < 50 and self.can_dash:
@@ -929,8 +921,8 @@ class Player(PhysicsEntity):
             for _ in range(5):
                 angle = (random.random()) * math.pi
                 speed = random.random() * (2)
-                self.game.sparks.append(_spark.Spark(
-                    (self.rect().centerx, self.rect().bottom), angle, speed, color=(190, 200, 220)))
+                self.game.sparks.spawn(
+                    (self.rect().centerx, self.rect().bottom), angle, speed, color=(190, 200, 220))
             return True
         
         elif (self.jumps > 0 and abs(self.dashing) < 50 and not self.can_dash) or (self.wall_slide and not self.can_dash):
@@ -952,9 +944,10 @@ class Player(PhysicsEntity):
         distance = 10000
         return_enemy = False
         for enemy in self.game.enemies:
-            if np.linalg.norm(self.vector_to(enemy)) < distance:
+            enemy_distance = enemy.distance_to_player()
+            if enemy_distance < distance:
                 return_enemy = enemy
-                distance = np.linalg.norm(self.vector_to(enemy))
+                distance = enemy_distance
 
             # Remove enemy if it got out of bounds.
             if enemy.pos[0] < 0 or enemy.pos[0] > self.game.tilemap.map_size*16 or enemy.pos[1] < 0 or enemy.pos[1] > self.game.tilemap.map_size*16:
@@ -981,10 +974,10 @@ class Player(PhysicsEntity):
                 for _ in range(30):
                     angle = random.random() * math.pi * 2
                     speed = random.random() * 5
-                    self.game.sparks.append(_spark.Spark(self.game.player.rect(
-                    ).center, angle, 2 + random.random(), color=(200, 0, 0)))
-                    self.game.particles.append(_particle.Particle(self.game, 'particle' + str(self.game.power_level), self.game.player.rect().center, vel=[
-                                               math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7)))
+                    self.game.sparks.spawn(self.game.player.rect(
+                    ).center, angle, 2 + random.random(), color=(200, 0, 0))
+                    self.game.particles.spawn('particle' + str(self.game.power_level), self.game.player.rect().center, vel=[
+                                               math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7))
                 self.game.dead = True
                 self.game.death_count += 1
                 self.dashing = 0
@@ -1009,10 +1002,10 @@ class Player(PhysicsEntity):
                 for _ in range(10):
                     angle = random.random() * math.pi * 2
                     speed = random.random() * 5
-                    self.game.sparks.append(_spark.Spark(self.game.player.rect(
-                    ).center, angle, 2 + random.random(), color=(100, 0, 0)))
-                    self.game.particles.append(_particle.Particle(self.game, 'particle' + str(self.game.power_level), self.game.player.rect().center, vel=[
-                                               math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7)))
+                    self.game.sparks.spawn(self.game.player.rect(
+                    ).center, angle, 2 + random.random(), color=(100, 0, 0))
+                    self.game.particles.spawn('particle' + str(self.game.power_level), self.game.player.rect().center, vel=[
+                                               math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7))
 
 class PlayerCustomise(PhysicsEntity):
     def __init__(self, game, pos, size):
@@ -1030,6 +1023,7 @@ class PlayerCustomise(PhysicsEntity):
 class Currency(PhysicsEntity):
     def __init__(self, game, currency_type, pos, size=(6, 6), value=1, velocity_0 = [0, 0]):
         super().__init__(game, currency_type, pos, size)
+        self.dormant_when_far = True
 
         self.velocity = list(velocity_0)
         self.value = value
@@ -1055,7 +1049,7 @@ class Currency(PhysicsEntity):
         if self.old_enough:
             self.old_enough = max(0, self.old_enough - 1)
 
-        if not self.old_enough and np.linalg.norm(self.vector_to(self.game.player)) < 15:
+        if not self.old_enough and self.distance_to_player() < 15:
             if self.pos[0] - self.game.player.pos[0] > 0:
                 self.velocity[0] = max(self.velocity[0]-0.1, -0.5)
             else:
@@ -1156,53 +1150,10 @@ class Glowworm(PhysicsEntity):
 
         super().update(tilemap, movement=movement)
 
-class Bullet():
-    def __init__(self, game, pos, speed, origin, type='projectile_'):
-        self.attack_power = 1
-
-        self.pos = list(pos)
-        self.game = game
-        self.speed = list(speed)
-        self.type = type
-        self.origin = origin
-        self.img = self.game.assets[self.type]
-        self.anim_offset = (-2, 0)
-        self.light_size = 10
-
-    def update(self, game):
-        if game.display_frame:
-            if game.cave_darkness and game.transition <= 0:
-                game.darkness_circle(0, self.light_size, (int(self.pos[0]) - game.render_scroll[0], int(self.pos[1]) - game.render_scroll[1]))
-            game.display_outline.blit(self.img, (self.pos[0] - self.img.get_width() / 2 - game.render_scroll[0], self.pos[1] - self.img.get_height() / 2 - game.render_scroll[1]))
-
-        if not game.paused:
-            self.pos[0] += self.speed[0]
-            self.pos[1] += self.speed[1]
-
-        # Check to destroy
-        if game.tilemap.solid_check(self.pos):
-            if self.type != 'spine':
-                velocity_angle = math.atan2(self.speed[1], (self.speed[0] if self.speed[0] != 0 else 0.01))
-                for _ in range(4):
-                    self.game.sparks.append(_spark.Spark(self.pos, random.random() - 0.5 + velocity_angle, 2 + random.random()))
-                self.game.sfx['proj_bye'].play()
-            return True
-
-        # Check for player/crate collision:
-        for crate in [e for e in game.extra_entities.copy() if e.type == 'crate']:
-            if crate.rect().collidepoint(self.pos):
-                crate.kill()
-                game.extra_entities.remove(crate)
-                return True
-
-        if game.player.rect().collidepoint(self.pos) and abs(game.player.dashing) < 50:
-            if not game.dead:
-                game.player.damage(self.attack_power, self.origin)
-                return True
-
 class RolyPoly(PhysicsEntity):
     def __init__(self, game, pos, size, initialFall=False, friendly = False):
         super().__init__(game, 'rolypoly', pos, size)
+        self.dormant_when_far = True
 
         self.attack_power = 1
 
@@ -1243,7 +1194,7 @@ class RolyPoly(PhysicsEntity):
             self.time_since_air += 1
 
             if self.time_since_air > 30 and self.time_since_air%5 == 0:
-                to_player = self.vector_to(self.game.player)
+                to_player = self.vector_to_player()
                 dist_to_player = np.linalg.norm(to_player)
                 to_player = [to_player[0] / dist_to_player, to_player[1] / dist_to_player]
 
@@ -1353,8 +1304,8 @@ class Parrot(PhysicsEntity):
 
         elif self.action == 'flying':
             if random.random() < 0.1 and not self.collisions['up']:
-                x_addition = 0.25 if self.vector_to(self.game.player)[0] > 0 else -0.25
-                y_addition = -2 if self.vector_to(self.game.player)[1] > 0 else 0
+                x_addition = 0.25 if self.vector_to_player()[0] > 0 else -0.25
+                y_addition = -2 if self.vector_to_player()[1] > 0 else 0
                 self.velocity = [random.random() - 0.5 + x_addition, -(random.random() + 2 + y_addition)]
                 self.flip_reset()
 
@@ -1364,7 +1315,7 @@ class Parrot(PhysicsEntity):
                 self.timer = random.randint(30, 60)
 
         if random.random() < 0.002:
-            if np.linalg.norm(self.vector_to(self.game.player)) < 50 and self.game.level_style != 'final':
+            if self.distance_to_player() < 50 and self.game.level_style != 'final':
                 self.game.sfx['chirp'].play()
 
         # Death Condition
@@ -1374,6 +1325,7 @@ class Parrot(PhysicsEntity):
 class SpawnPoint(PhysicsEntity):
     def __init__(self, game, pos, size):
         super().__init__(game, 'spawn_point', pos, size)
+        self.dormant_when_far = True
 
         self.gravity_affected = False
         self.collide_wall_check = False
@@ -1402,11 +1354,12 @@ class SpawnPoint(PhysicsEntity):
             if random.random() < 0.05:
                 angle = (random.random() + 1) * math.pi
                 speed = random.random() * 3
-                self.game.sparks.append(_spark.Spark(self.rect().center, angle, speed, color=random.choice([(58, 6, 82), (111, 28, 117)])))
+                self.game.sparks.spawn(self.rect().center, angle, speed, color=random.choice([(58, 6, 82), (111, 28, 117)]))
 
 class HeartAltar(PhysicsEntity):
     def __init__(self, game, pos, size, action='active', falling = False, value = 1, velocity_0 = [0,0]):
         super().__init__(game, 'heart_altar', pos, size)
+        self.dormant_when_far = True
 
         self.falling = falling
         self.value = value
@@ -1436,9 +1389,9 @@ class HeartAltar(PhysicsEntity):
 
         if self.value > 1 and self.game.frame_count % 60 in [0, 15] and self.action == 'active':
             for _ in range(self.value):
-                self.game.sparks.append(_spark.Spark(self.rect().center, random.uniform(0, math.pi * 2), random.random() + 1, color=random.choice([(112, 0, 2), (170, 27, 36)])))
+                self.game.sparks.spawn(self.rect().center, random.uniform(0, math.pi * 2), random.random() + 1, color=random.choice([(112, 0, 2), (170, 27, 36)]))
         
-        dist_player = np.linalg.norm(self.vector_to(self.game.player))
+        dist_player = self.distance_to_player()
         if dist_player < 15 and self.action == 'active':
             xpos = (self.rect().centerx - self.game.render_scroll[0]) - 7
             ypos = (self.rect().centery -self.game.render_scroll[1]) - 22
@@ -1456,6 +1409,7 @@ class HeartAltar(PhysicsEntity):
 class Torch(PhysicsEntity):
     def __init__(self, game, pos, size, action='idle'):
         super().__init__(game, 'torch', pos, size)
+        self.dormant_when_far = True
         self.gravity_affected = False
         self.collide_wall_check = False
         self.collide_wall = False
@@ -1488,8 +1442,8 @@ class Torch(PhysicsEntity):
         self.light_size = self.lights[int(self.animation.frame / self.animation.img_duration)]
 
         if random.random() < 0.05:
-            self.game.sparks.append(_spark.Spark([self.rect().x + (4 if self.flip_x else 12), self.pos[1]], random.random(
-            ) * math.pi + math.pi, random.random() + 1, color=random.choice([(229, 0, 0), (229, 82, 13)])))
+            self.game.sparks.spawn([self.rect().x + (4 if self.flip_x else 12), self.pos[1]], random.random(
+            ) * math.pi + math.pi, random.random() + 1, color=random.choice([(229, 0, 0), (229, 82, 13)]))
 
         self.animation.update()
         self.display_darkness_circle()
@@ -1497,6 +1451,7 @@ class Torch(PhysicsEntity):
 class Spider(PhysicsEntity):
     def __init__(self, game, pos, size, friendly = False):
         super().__init__(game, 'spider', pos, size)
+        self.dormant_when_far = True
 
         self.currency_drops['cog'] = random.randint(0, 1)
         self.currency_drops['heartFragment'] = 1 if random.random() < 0.2 else 0
@@ -1540,7 +1495,7 @@ class Spider(PhysicsEntity):
 
                 if not self.timer:
                     self.set_action('run')
-                    to_player = self.vector_to(self.game.player)
+                    to_player = self.vector_to_player()
                     dist_to_player = np.linalg.norm(to_player)
                     self.to_player = to_player / dist_to_player
                     self.velocity = [self.to_player[0]
@@ -1569,10 +1524,9 @@ class Spider(PhysicsEntity):
                     if random.random() < 0.5:
                         x = self.pos[0]//tilemap.tilesize
                         y = self.pos[1]//tilemap.tilesize
-                        tile_pos = str(x) + ';' + str(y)
                         pos = [x*tilemap.tilesize, y*tilemap.tilesize]
-                        web_positions = [w.pos for w in self.game.extra_entities if w.type == 'web']
-                        if tile_pos not in tilemap.tilemap and pos not in web_positions:
+                        web_positions = [w.pos for w in self.game.extra_entities.of_type('web')]
+                        if not tilemap.has_tile((x, y)) and pos not in web_positions:
                             self.game.extra_entities.append(Web(self.game, pos, self.game.entity_info[53]['size']))
 
         # Death Condition
@@ -1589,6 +1543,7 @@ class Spider(PhysicsEntity):
 class RubiksCube(PhysicsEntity):
     def __init__(self, game, pos, size, friendly = False):
         super().__init__(game, 'rubiksCube', pos, size)
+        self.dormant_when_far = True
 
         self.currency_drops['cog'] = random.randint(0, 3)
         self.currency_drops['heartFragment'] = random.randint(0, 1)
@@ -1681,6 +1636,7 @@ class RubiksCube(PhysicsEntity):
 class Kangaroo(PhysicsEntity):
     def __init__(self, game, pos, size, friendly = False):
         super().__init__(game, 'kangaroo', pos, size)
+        self.dormant_when_far = True
 
         self.currency_drops['cog'] = random.randint(0, 1)
         self.currency_drops['heartFragment'] = 1
@@ -1768,6 +1724,7 @@ class Kangaroo(PhysicsEntity):
 class Echidna(PhysicsEntity):
     def __init__(self, game, pos, size, friendly = False):
         super().__init__(game, 'echidna', pos, size)
+        self.dormant_when_far = True
 
         self.currency_drops['cog'] = random.randint(0, 1)
         self.currency_drops['heartFragment'] = 1
@@ -1838,9 +1795,9 @@ class Echidna(PhysicsEntity):
                     for _ in range(10):
                         angle = random.random() * math.pi + math.pi
                         spine_velocity = [2*math.cos(angle), 2*math.sin(angle)]
-                        self.game.projectiles.append(Bullet(self.game, self.rect().center, spine_velocity, 'echidna', type='spine'))
-                    self.game.projectiles.append(Bullet(self.game, self.rect().center, [2, 0], 'echidna', type='spine'))
-                    self.game.projectiles.append(Bullet(self.game, self.rect().center, [-2, 0], 'echidna', type='spine'))
+                        self.game.projectiles.spawn(self.rect().center, spine_velocity, 'echidna', type='spine')
+                    self.game.projectiles.spawn(self.rect().center, [2, 0], 'echidna', type='spine')
+                    self.game.projectiles.spawn(self.rect().center, [-2, 0], 'echidna', type='spine')
                     self.set_action('idle')
                     self.timer = random.randint(120, 180)
 
@@ -1886,6 +1843,7 @@ class Meteor(PhysicsEntity):
 class AlienShip(PhysicsEntity):
     def __init__(self, game, pos, size, grace_done=False, velocity=[0, 0], friendly = False):
         super().__init__(game, 'alienship', pos, size)
+        self.dormant_when_far = True
 
         self.currency_drops['cog'] = random.randint(0, 2)
         self.currency_drops['heartFragment'] = 1 if random.random() < 0.3 else 0
@@ -1933,7 +1891,7 @@ class AlienShip(PhysicsEntity):
                 self.velocity[0] = -self.velocity[0]
 
             if any(self.collisions.values()) and random.random() < 0.3:
-                to_player = self.vector_to(self.game.player)
+                to_player = self.vector_to_player()
                 norm = np.linalg.norm(to_player) * random.uniform(1.2, 1.5)
 
                 if not (tilemap.solid_check((self.rect().centerx + 8, self.rect().centery)) and tilemap.solid_check((self.rect().centerx - 8, self.rect().centery))):
@@ -1948,6 +1906,7 @@ class AlienShip(PhysicsEntity):
 class CreepyEyes(PhysicsEntity):
     def __init__(self, game, pos, size):
         super().__init__(game, 'creepy_eyes', pos, size)
+        self.dormant_when_far = True
 
         self.gravity_affected = False
         self.collide_wall_check = False
@@ -1961,7 +1920,7 @@ class CreepyEyes(PhysicsEntity):
             return False
         super().update(tilemap, movement=movement)
 
-        to_player = self.vector_to(self.game.player)
+        to_player = self.vector_to_player()
         self.to_player_norm = to_player / np.linalg.norm(to_player)
 
         self.pos[0] = self.main_pos[0] + round(self.to_player_norm[0] if abs(self.to_player_norm[0]) > 0.38 else 0)
@@ -1970,6 +1929,7 @@ class CreepyEyes(PhysicsEntity):
 class MeteorBait(PhysicsEntity):
     def __init__(self, game, pos, size):
         super().__init__(game, 'meteor_bait', pos, size)
+        self.dormant_when_far = True
 
         self.gravity_affected = False
         self.collide_wall_check = False
@@ -2007,8 +1967,7 @@ class MeteorBait(PhysicsEntity):
             test_loc[1] = int(center_tile[1] + random.choice([e[1]
                              for e in area]))
 
-            loc_str = str(test_loc[0]) + ';' + str(test_loc[1])
-            if loc_str not in self.game.tilemap.tilemap and test_loc not in success_tiles:
+            if not self.game.tilemap.has_tile(test_loc) and test_loc not in success_tiles:
                 success_tiles.append(test_loc.copy())
 
             attempts += 1
@@ -2020,6 +1979,7 @@ class MeteorBait(PhysicsEntity):
 class Candle(PhysicsEntity):
     def __init__(self, game, pos, size):
         super().__init__(game, 'candle', pos, size)
+        self.dormant_when_far = True
 
         self.gravity_affected = False
         self.collide_wall_check = False
@@ -2048,15 +2008,15 @@ class Candle(PhysicsEntity):
                 self.set_action('active')
                 self.timer = random.randint(200, 500)
             elif random.random() < 0.05:
-                self.game.sparks.append(_spark.Spark(self.rect().center, random.random(
-                ) * math.pi + math.pi, random.random() + 1, color=random.choice([(229, 0, 0), (229, 82, 13)])))
+                self.game.sparks.spawn(self.rect().center, random.random(
+                ) * math.pi + math.pi, random.random() + 1, color=random.choice([(229, 0, 0), (229, 82, 13)]))
 
         elif self.action == 'active':
             self.light_size = min(self.light_size + random.random(), 25)
 
             if random.random() < 0.1:
-                self.game.sparks.append(_spark.Spark(self.rect().center, random.random(
-                ) * math.pi + math.pi, random.random() + 2, color=random.choice([(229, 0, 0), (229, 82, 13)])))
+                self.game.sparks.spawn(self.rect().center, random.random(
+                ) * math.pi + math.pi, random.random() + 2, color=random.choice([(229, 0, 0), (229, 82, 13)]))
 
             if self.rect().colliderect(self.game.player.rect()) and abs(self.game.player.dashing) <= 50:
                 self.game.player.damage(self.attack_power, self.type)
@@ -2085,11 +2045,11 @@ class Chandelier(PhysicsEntity):
         # super().update(tilemap, movement=movement)
 
         if random.random() < 0.05:
-            self.game.sparks.append(_spark.Spark((self.rect().centerx + self.x_offset, self.rect().bottom - 18), random.random(
-            ) * math.pi + math.pi, random.random() + 1, color=random.choice([(229, 0, 0), (229, 82, 13)])))
+            self.game.sparks.spawn((self.rect().centerx + self.x_offset, self.rect().bottom - 18), random.random(
+            ) * math.pi + math.pi, random.random() + 1, color=random.choice([(229, 0, 0), (229, 82, 13)]))
 
-            self.game.sparks.append(_spark.Spark((self.rect().centerx - self.x_offset, self.rect().bottom - 18), random.random(
-            ) * math.pi + math.pi, random.random() + 1, color=random.choice([(229, 0, 0), (229, 82, 13)])))
+            self.game.sparks.spawn((self.rect().centerx - self.x_offset, self.rect().bottom - 18), random.random(
+            ) * math.pi + math.pi, random.random() + 1, color=random.choice([(229, 0, 0), (229, 82, 13)]))
 
         self.animation.update()
         self.light_size = self.lights[int(self.animation.frame / self.animation.img_duration)]
@@ -2119,6 +2079,7 @@ class Orb(PhysicsEntity):
 class Cherub(PhysicsEntity):
     def __init__(self, game, pos, size, start_action = 'idle', friendly = False):
         super().__init__(game, 'cherub', pos, size)
+        self.dormant_when_far = True
 
         self.currency_drops['blueCog'] = random.randint(2, 5)
         self.currency_drops['purpleCog'] = random.randint(0, 1)
@@ -2205,8 +2166,8 @@ class Cherub(PhysicsEntity):
 
         elif self.action == 'flying':
             if random.random() < 0.05 and not tilemap.solid_check((self.rect().centerx, self.rect().centery - 16)):
-                x_addition = 0.25 if self.vector_to(self.game.player)[0] > 0 else -0.25
-                y_addition = -2 if self.vector_to(self.game.player)[1] > 0 else 0
+                x_addition = 0.25 if self.vector_to_player()[0] > 0 else -0.25
+                y_addition = -2 if self.vector_to_player()[1] > 0 else 0
                 self.velocity = [random.random() - 0.5 + x_addition, -(random.random() + 2 + y_addition)]
                 self.flip_reset()
 
@@ -2217,9 +2178,9 @@ class Cherub(PhysicsEntity):
                 self.timer = random.randint(60, 120)
 
         if self.can_attack and random.random() < 0.01:
-            if self.check_line_to_player() and np.linalg.norm(self.vector_to(self.game.player)) > 50 and not self.friendly:
-                to_player = self.vector_to(self.game.player)
-                norm = np.linalg.norm(to_player) * 2
+            if self.check_line_to_player() and self.distance_to_player() > 50 and not self.friendly:
+                to_player = self.vector_to_player()
+                norm = self.distance_to_player() * 2
                 arrow_velocity = [to_player[0] / norm, to_player[1] / norm]
                 self.game.extra_entities.append(Orb(self.game, self.rect().center, self.game.entity_info[38]['size'], arrow_velocity, self.type, colour = self.colour))
 
@@ -2272,7 +2233,7 @@ class PenthouseLock(PhysicsEntity):
     def update(self, tilemap, movement=(0, 0)):
         super().update(tilemap, movement=movement)
 
-        dist_player = np.linalg.norm(self.vector_to(self.game.player))
+        dist_player = self.distance_to_player()
 
         if dist_player < 15:
             xpos = (self.rect().centerx - self.game.render_scroll[0]) - 7
@@ -2285,12 +2246,13 @@ class PenthouseLock(PhysicsEntity):
                     #spawn final boss portal with effects
                     self.game.portals.append(Portal(self.game, [tilemap.tilesize * 18, tilemap.tilesize * -82], (tilemap.tilesize, tilemap.tilesize), 'final'))
                     for _ in range(10):
-                        self.game.sparks.append(_spark.Spark([tilemap.tilesize * 18 + 8, tilemap.tilesize * -82 + 8], random.uniform(0, 2 * math.pi), 2, color=random.choice([(1, 1, 1), (255, 255, 255)])))
+                        self.game.sparks.spawn([tilemap.tilesize * 18 + 8, tilemap.tilesize * -82 + 8], random.uniform(0, 2 * math.pi), 2, color=random.choice([(1, 1, 1), (255, 255, 255)]))
                 self.game.run_text(self.text, talk_type = 'entity')
 
 class Web(PhysicsEntity):
     def __init__(self, game, pos, size):
         super().__init__(game, 'web', pos, size)
+        self.dormant_when_far = True
         self.gravity_affected = False
         self.collide_wall_check = False
         self.collide_wall = False
@@ -2308,6 +2270,7 @@ class Web(PhysicsEntity):
 class Crate(PhysicsEntity):
     def __init__(self, game, pos, size):
         super().__init__(game, 'crate', pos, size)
+        self.dormant_when_far = True
         self.gravity_affected = False
         self.collide_wall_check = False
         self.collide_wall = False
@@ -2329,6 +2292,7 @@ class Crate(PhysicsEntity):
 class Skull(PhysicsEntity):
     def __init__(self, game, pos, size):
         super().__init__(game, 'skull', pos, size)
+        self.dormant_when_far = True
         self.gravity_affected = False
         self.collide_wall_check = False
         self.collide_wall = False
@@ -2428,9 +2392,7 @@ class DumpMachine(PhysicsEntity):
         #Change tiles to random
         types = ['aussie', 'grass', 'heaven', 'hell', 'normal', 'rubiks', 'space', 'spooky']
         choice = random.choice(types)
-        for tile in self.game.tilemap.tilemap.keys():
-            if self.game.tilemap.tilemap[tile]['type'] in types:
-                self.game.tilemap.tilemap[tile]['type'] = choice
+        self.game.tilemap.replace_tile_types(types, choice)
         self.game.tilemap.autotile(windows = False)
         
     def update(self, tilemap, movement=(0, 0)):
@@ -2585,7 +2547,7 @@ class DumpMachine(PhysicsEntity):
             function()
 
             for _ in range(5):
-                self.game.sparks.append(_spark.Spark(self.rect().midtop, random.uniform(0, 2 * math.pi), 2, color=tuple([random.randint(0,255) for _ in range(3)])))
+                self.game.sparks.spawn(self.rect().midtop, random.uniform(0, 2 * math.pi), 2, color=tuple([random.randint(0,255) for _ in range(3)]))
 
 class Machine(PhysicsEntity):
     def __init__(self, game, pos, size):
@@ -2601,7 +2563,7 @@ class Machine(PhysicsEntity):
                            32, 44, 54]
         
         tile_w = game.tilemap.tilesize
-        self.base = [f'{(self.rect().centerx + (n * tile_w)) // tile_w};{(self.rect().bottom + tile_w // 2) // tile_w}' for n in [-1,0,1]]
+        self.base = [((self.rect().centerx + (n * tile_w)) // tile_w, (self.rect().bottom + tile_w // 2) // tile_w) for n in [-1,0,1]]
 
     def activate_machine(self):
         self.set_action('active')
@@ -2642,15 +2604,15 @@ class Machine(PhysicsEntity):
     def update(self, tilemap, movement=(0, 0)):
         super().update(tilemap, movement=movement)
 
-        dist_player = np.linalg.norm(self.vector_to(self.game.player))
+        dist_player = self.distance_to_player()
 
         if self.action == 'idle':
             if random.random() < 0.03:
-                self.game.sparks.append(_spark.Spark((self.rect().centerx, self.rect().centery - 15), random.uniform(0, 2 * math.pi), 2, color=random.choice([(149, 33, 211), (129, 29, 183)])))
+                self.game.sparks.spawn((self.rect().centerx, self.rect().centery - 15), random.uniform(0, 2 * math.pi), 2, color=random.choice([(149, 33, 211), (129, 29, 183)]))
 
         elif self.action == 'active':
             if random.random() < 0.1:
-                self.game.sparks.append(_spark.Spark((self.rect().centerx, self.rect().centery - 15), random.uniform(0, 2 * math.pi), 3.5, color=random.choice([(149, 33, 211), (129, 29, 183)])))
+                self.game.sparks.spawn((self.rect().centerx, self.rect().centery - 15), random.uniform(0, 2 * math.pi), 3.5, color=random.choice([(149, 33, 211), (129, 29, 183)]))
                 
             #Entities to go:
             entity_n = len(self.game.extra_entities)
@@ -2660,7 +2622,7 @@ class Machine(PhysicsEntity):
                 entity.kill()
                 self.game.extra_entities.remove(entity)
                 for _ in range(10):
-                    self.game.sparks.append(_spark.Spark(entity_pos, random.uniform(0, 2 * math.pi), 2, color=random.choice([(149, 33, 211), (129, 29, 183)])))
+                    self.game.sparks.spawn(entity_pos, random.uniform(0, 2 * math.pi), 2, color=random.choice([(149, 33, 211), (129, 29, 183)]))
                 self.game.screenshake = max(20, self.game.screenshake)
 
             elif entity_n <= 1 and self.game.cave_darkness >= 255:
@@ -2669,10 +2631,11 @@ class Machine(PhysicsEntity):
                 self.game.cave_darkness = min(self.game.cave_darkness + 0.05, 255)
 
             #Remove tiles:
+            tile_positions = self.game.tilemap.tile_positions()
             for _ in range(2):
-                random_tile = random.choice(list(self.game.tilemap.tilemap.keys()))
-                if str(random_tile) not in self.base:
-                    del self.game.tilemap.tilemap[random_tile]
+                random_tile = tuple(tile_positions[random.randrange(len(tile_positions))].tolist())
+                if random_tile not in self.base:
+                    self.game.tilemap.delete_tile(random_tile, autotile=True)
 
         if dist_player < 35 and self.action == 'idle':
             xpos = (self.rect().centerx - self.game.render_scroll[0])
@@ -2686,16 +2649,16 @@ class Machine(PhysicsEntity):
                 self.destroy_machine()
                 self.game.sfx['hit'].play()
                 for _ in range(10):
-                    self.game.sparks.append(_spark.Spark((self.rect().centerx, self.rect().centery - 15), random.uniform(0, 2 * math.pi), 4, color=random.choice([(230, 230, 230), (220, 220, 220)])))
+                    self.game.sparks.spawn((self.rect().centerx, self.rect().centery - 15), random.uniform(0, 2 * math.pi), 4, color=random.choice([(230, 230, 230), (220, 220, 220)]))
 
             elif self.game.interraction_frame_key == self.game.player_controls['Down'] and not self.game.dead:
                 self.activate_machine()
                 for _ in range(10):
-                    self.game.sparks.append(_spark.Spark((self.rect().centerx, self.rect().centery - 15), random.uniform(0, 2 * math.pi), 4, color=random.choice([(149, 33, 211), (129, 29, 183)])))
+                    self.game.sparks.spawn((self.rect().centerx, self.rect().centery - 15), random.uniform(0, 2 * math.pi), 4, color=random.choice([(149, 33, 211), (129, 29, 183)]))
 
         elif self.action == 'destroyed' and len(self.game.bosses) == 0:
             if random.random() < 0.1:
-                spawn_portal = random.choice([e for e in self.game.extra_entities if e.type == 'hilbert_orb_spawner'])
+                spawn_portal = random.choice(self.game.extra_entities.of_type('hilbert_orb_spawner'))
                 orb_spawn_loc = spawn_portal.rect().center
                 spawn_portal.set_action('activating')
 
@@ -2721,43 +2684,34 @@ class HilbertOrb(PhysicsEntity):
 
         self.boid_radius = 25
         self.boid_sepraration_strength = 0.001
-        self.time_to_update_neighbours = 45
-        self.neighbour_timer = 0
-        self.neighbours = []
+        self.separation = [0, 0]
+        self.separation_frame = None
 
         self.anim_offset = (-3, -3)
 
+    def flock(self):
+        # Separation of every orb from its close neighbours in one vectorised step. Called by the first orb to update
+        # each frame, after that orb has moved and before the others have, and every orb uses these positions all frame
+        orbs = self.game.extra_entities.of_type('hilbert_orb')
+        positions = np.array([orb.pos[:2] for orb in orbs], dtype=np.float64)
+        separations = _spatial.separation_sums(positions, self.boid_radius).tolist()
+        for orb, separation in zip(orbs, separations):
+            orb.separation = separation
+            orb.separation_frame = self.game.frame_count
+
     def boidsify(self):
-        self.neighbour_timer = min(self.neighbour_timer + 1, self.time_to_update_neighbours)
-        #find close boids:
         #only doing separation here because since theyre folloring the player its fine to not bunch up.
-        if self.neighbour_timer >= self.time_to_update_neighbours:
-            self.neighbour_timer = 0
-            self.neighbours = []
-            for boid in [e for e in self.game.extra_entities if (e.type == 'hilbert_orb' and e is not self)]:
-                if np.linalg.norm(self.vector_to(boid)) < self.boid_radius:
-                    self.neighbours.append(boid)
-
-        if len(self.neighbours) == 0:
-            return [0, 0]
-
-        separation_extra = [0, 0]
-
-        for boid in (b for b in self.neighbours if b in self.game.extra_entities):
-            #separation
-            separation_extra[0] += self.pos[0] - boid.pos[0]
-            separation_extra[1] += self.pos[1] - boid.pos[1]
-            
-        return [separation_extra[0] * self.boid_sepraration_strength, separation_extra[1] * self.boid_sepraration_strength]
-            
+        if self.separation_frame != self.game.frame_count:
+            self.flock()
+        return [self.separation[0] * self.boid_sepraration_strength, self.separation[1] * self.boid_sepraration_strength]
 
     def update(self, tilemap, movement=(0, 0)):
         super().update(tilemap, movement=movement)
 
         self.angle += 0.05
 
-        toPlayer = self.vector_to(self.game.player)
-        norm = np.linalg.norm(toPlayer)
+        toPlayer = self.vector_to_player()
+        norm = self.distance_to_player()
         if abs(norm) < 0.01:
             norm = 0.01
 
@@ -2797,13 +2751,13 @@ class HelperOrb(PhysicsEntity):
 
         self.anim_offset = (-2, -2)
 
-        self.target = random.choice([e for e in self.game.extra_entities if (e.type == 'hilbert_orb' and e.targeted == False)])
+        self.target = random.choice([e for e in self.game.extra_entities.of_type('hilbert_orb') if e.targeted == False])
         self.target.targeted = True
 
     def create_sparks(self):
         velocity_angle = math.atan2(self.velocity[1], self.velocity[0])
         for _ in range(10):
-            self.game.sparks.append(_spark.Spark(self.rect().center, velocity_angle + random.uniform(-1, 1), 1.5))
+            self.game.sparks.spawn(self.rect().center, velocity_angle + random.uniform(-1, 1), 1.5)
 
     def does_target_exist(self):
         if self.target in self.game.extra_entities:
@@ -2873,6 +2827,7 @@ class Helper(PhysicsEntity):
 
     def activate(self, character, flip = False):
         self.type = character
+        self.game.extra_entities.retype(self)
         self.gravity_affected = True
         self.flip_x = flip
         self.light_size = 25
@@ -2939,7 +2894,7 @@ class Helper(PhysicsEntity):
                 self.velocity[0] *= -1
 
             if random.random() < 0.1 and self.time_since_orb > self.help_frequency:
-                if len([e for e in self.game.extra_entities if (e.type == 'hilbert_orb' and e.targeted == False)]) > 0:
+                if len([e for e in self.game.extra_entities.of_type('hilbert_orb') if e.targeted == False]) > 0:
                     self.game.extra_entities.append(HelperOrb(self.game, self.rect().center, self.game.entity_info[48]['size'], [0, -2]))
                     self.time_since_orb = 0
 
@@ -3063,7 +3018,7 @@ class Boss(PhysicsEntity):
                     for enemy in self.game.enemies.copy():
                         enemy.currency_drops['credit'] = 1
                         enemy.kill()
-                    self.game.enemies = []
+                    self.game.enemies.clear()
                 return True
 
 class NormalBoss(Boss):
@@ -3099,14 +3054,14 @@ class NormalBoss(Boss):
         if super().update(tilemap, movement=movement):
             return True
 
-        to_player = self.vector_to(self.game.player)
+        to_player = self.vector_to_player()
         norm = np.linalg.norm(to_player)
 
         if self.action == 'idle':
             if norm < 140:
                 for boss in self.game.bosses:
                     boss.activate()
-                for grave in [e for e in self.game.extra_entities if e.type == 'gravestone']:
+                for grave in self.game.extra_entities.of_type('gravestone'):
                     grave.activate()
 
         elif self.action == 'activating':
@@ -3150,10 +3105,9 @@ class NormalBoss(Boss):
                 self.set_action('flying')
 
                 for _ in range(20):
-                    self.game.sparks.append(
-                        _spark.Spark(self.rect().center, random.random() * 2 * math.pi, 2 + random.random()))
-                    self.game.particles.append(_particle.Particle(self.game, 'particle1', self.rect().center, vel=[math.cos(
-                        random.random() * 2 * math.pi), math.cos(random.random() * 2 * math.pi)], frame=random.randint(0, 7)))
+                    self.game.sparks.spawn(self.rect().center, random.random() * 2 * math.pi, 2 + random.random())
+                    self.game.particles.spawn('particle1', self.rect().center, vel=[math.cos(
+                        random.random() * 2 * math.pi), math.cos(random.random() * 2 * math.pi)], frame=random.randint(0, 7))
 
                 # Check for player collision, not dashing and in attack mode:
                 self.circular_attack(self.attack_radius)
@@ -3215,12 +3169,12 @@ class GrassBoss(Boss):
         self.time_since_air += 1
 
         if self.action == 'idle':
-            to_player = self.vector_to(self.game.player)
-            norm = np.linalg.norm(to_player)
+            to_player = self.vector_to_player()
+            norm = self.distance_to_player()
             if norm < 120:
                 for boss in self.game.bosses:
                     boss.activate()
-                for grave in [e for e in self.game.extra_entities if e.type == 'gravestone']:
+                for grave in self.game.extra_entities.of_type('gravestone'):
                     grave.activate()
 
         elif self.action == 'activating':
@@ -3232,8 +3186,8 @@ class GrassBoss(Boss):
 
         elif self.action == 'run':
             # Turn around at torches
-            for ent in self.game.extra_entities:
-                if ent.type == 'torch' and ent.rect().colliderect(self.rect()):
+            for ent in self.game.spatial.query(self.rect(), 'extra_entities', 'torch'):
+                if ent.rect().colliderect(self.rect()) and ent in self.game.extra_entities:
 
                     # Reverse direction
                     self.heading[0] *= -1
@@ -3256,7 +3210,7 @@ class GrassBoss(Boss):
                     tile_loc = [int(self.pos[0] // tilemap.tilesize) + spawn_loc_offset[0],
                                int(self.pos[1] // tilemap.tilesize) + spawn_loc_offset[1]]
 
-                    if str(str(tile_loc[0]) + ';' + str(tile_loc[1])) not in self.game.tilemap.tilemap:
+                    if not self.game.tilemap.has_tile(tile_loc):
                         available_spawn_spots.append(
                             [tile_loc[0] * self.game.tilemap.tilesize, tile_loc[1] * self.game.tilemap.tilesize])
 
@@ -3356,8 +3310,8 @@ class SpaceBoss(Boss):
             return True
 
         # Also damage self from meteor collision:
-        for entity in self.game.extra_entities:
-            if entity.type == 'meteor' and entity.action == 'kaboom':
+        for entity in self.game.spatial.query(self.rect(), 'extra_entities', 'meteor'):
+            if entity.action == 'kaboom' and entity in self.game.extra_entities:
                 if self.rect().colliderect(entity.rect()):
 
                     if self.damage_self():
@@ -3372,12 +3326,12 @@ class SpaceBoss(Boss):
             if norm < 50:
                 for boss in self.game.bosses:
                     boss.activate()
-                for grave in [e for e in self.game.extra_entities if e.type == 'gravestone']:
+                for grave in self.game.extra_entities.of_type('gravestone'):
                     grave.activate()
 
                 for _ in range(3):
-                    self.game.sparks.append(_spark.Spark(self.rect().midbottom, random.uniform(
-                        0, math.pi), random.uniform(1.5, 2), color=random.choice([(0, 255, 0), (200, 0, 200)])))
+                    self.game.sparks.spawn(self.rect().midbottom, random.uniform(
+                        0, math.pi), random.uniform(1.5, 2), color=random.choice([(0, 255, 0), (200, 0, 200)]))
 
         elif self.action == 'activating':
             if any(self.collisions.values()):
@@ -3393,8 +3347,8 @@ class SpaceBoss(Boss):
                 self.velocity[1] = -random.uniform(2, 3)
 
                 for _ in range(3):
-                    self.game.sparks.append(_spark.Spark(self.rect().midbottom, random.uniform(
-                        0, math.pi), random.uniform(1.5, 2), color=random.choice([(0, 255, 0), (200, 0, 200)])))
+                    self.game.sparks.spawn(self.rect().midbottom, random.uniform(
+                        0, math.pi), random.uniform(1.5, 2), color=random.choice([(0, 255, 0), (200, 0, 200)]))
                     
                 self.light_size = random.choice([0, 25])
 
@@ -3438,10 +3392,9 @@ class SpaceBoss(Boss):
                 for angle in np.linspace(angleto_player, angleto_player + math.pi * 2, 5 + 3 * self.difficulty):
                     bullet_velocity = (bullet_speed * math.cos(angle), bullet_speed * math.sin(angle))
 
-                    self.game.projectiles.append(Bullet(
-                        self.game, [self.rect().centerx, self.rect().centery], bullet_velocity, self.type))
-                    self.game.sparks.append(
-                        _spark.Spark(self.rect().center, angle + math.pi, self.difficulty))
+                    self.game.projectiles.spawn(
+                        [self.rect().centerx, self.rect().centery], bullet_velocity, self.type)
+                    self.game.sparks.spawn(self.rect().center, angle + math.pi, self.difficulty)
 
             elif self.animation.done:
                 self.set_action('flying')
@@ -3453,8 +3406,8 @@ class SpaceBoss(Boss):
         # Create sparks
         if self.action not in ['idle', 'activating']:
             if random.random() < 0.1:
-                self.game.sparks.append(_spark.Spark(self.rect().midbottom, random.uniform(
-                    0, math.pi), random.uniform(1.5, 2), color=random.choice([(0, 255, 0), (200, 0, 200)])))
+                self.game.sparks.spawn(self.rect().midbottom, random.uniform(
+                    0, math.pi), random.uniform(1.5, 2), color=random.choice([(0, 255, 0), (200, 0, 200)]))
 
 class Gravestone(PhysicsEntity):
     def __init__(self, game, pos, size):
@@ -3481,7 +3434,7 @@ class Gravestone(PhysicsEntity):
             if norm < 50:
                 for boss in self.game.bosses:
                     boss.activate()
-                for grave in [e for e in self.game.extra_entities if e.type == 'gravestone']:
+                for grave in self.game.extra_entities.of_type('gravestone'):
                     grave.activate()
 
         elif self.action == 'active' and self.spawn_count and random.random() < 0.05:
@@ -3524,8 +3477,8 @@ class FlyGhost(PhysicsEntity):
             return True
 
         if random.random() < 0.1:
-            self.game.sparks.append(_spark.Spark(
-                self.rect().center, -self.angle + math.pi + random.uniform(-0.3, 0.3), 1.5))
+            self.game.sparks.spawn(
+                self.rect().center, -self.angle + math.pi + random.uniform(-0.3, 0.3), 1.5)
 
         # Death Condition
         elif abs(self.game.player.dashing) >= 50 and not self.friendly:
@@ -3605,9 +3558,7 @@ class SpookyBoss(Boss):
                 while not found_spot:
                     check_spot[0], check_spot[1] = int(player_pos_tile[0] + random.choice(
                         range(-5, 6))), int(player_pos_tile[1] + random.choice(range(-10, 4)))
-                    loc_str = str(check_spot[0]) + ';' + str(check_spot[1])
-                    loc_str2 = str(check_spot[0]) + ';' + str(check_spot[1] + 1)
-                    if loc_str not in self.game.tilemap.tilemap and loc_str2 not in self.game.tilemap.tilemap:
+                    if not self.game.tilemap.has_tile(check_spot) and not self.game.tilemap.has_tile((check_spot[0], check_spot[1] + 1)):
                         found_spot = True
                 self.tele_coords = [
                     check_spot[0] * tilemap.tilesize, check_spot[1] * tilemap.tilesize]
@@ -3703,7 +3654,7 @@ class RubiksBoss(Boss):
             if norm < 150:
                 for boss in self.game.bosses:
                     boss.activate()
-                for grave in [e for e in self.game.extra_entities if e.type == 'gravestone']:
+                for grave in self.game.extra_entities.of_type('gravestone'):
                     grave.activate()
 
         elif self.action != 'dying':
@@ -3842,7 +3793,7 @@ class AussieBoss(Boss):
             if norm < 150:
                 for boss in self.game.bosses:
                     boss.activate()
-                for grave in [e for e in self.game.extra_entities if e.type == 'gravestone']:
+                for grave in self.game.extra_entities.of_type('gravestone'):
                     grave.activate()
 
         elif self.action == 'active':
@@ -3939,19 +3890,19 @@ class HeavenBoss(Boss):
             return True
 
         if not self.active:
-            to_player = self.vector_to(self.game.player)
-            norm = np.linalg.norm(to_player)
+            to_player = self.vector_to_player()
+            norm = self.distance_to_player()
             if norm < 75:
                 for boss in self.game.bosses:
                     boss.activate()
-                for grave in [e for e in self.game.extra_entities if e.type == 'gravestone']:
+                for grave in self.game.extra_entities.of_type('gravestone'):
                     grave.activate()
 
         elif self.action == 'flying':
             self.timer = max(self.timer - 1, 0)
             if random.random() < 0.05 and not tilemap.solid_check((self.rect().centerx, self.rect().centery - 16)):
-                x_addition = 0.25 if self.vector_to(self.game.player)[0] > 0 else -0.25
-                y_addition = -2 if self.vector_to(self.game.player)[1] > 0 else 0
+                x_addition = 0.25 if self.vector_to_player()[0] > 0 else -0.25
+                y_addition = -2 if self.vector_to_player()[1] > 0 else 0
                 self.velocity = [random.random() - 0.5 + x_addition, -(random.random() + 2 + y_addition)]
                 self.flip_reset()
 
@@ -4048,7 +3999,7 @@ class HilbertBoss(Boss):
             self.game.sfx['hilbert_music'].fadeout(1000)
             return True
         
-        toPlayer = self.vector_to(self.game.player)
+        toPlayer = self.vector_to_player()
         
         if self.action == 'idle':
             self.pos[1] += 1
@@ -4064,14 +4015,14 @@ class HilbertBoss(Boss):
                 self.set_preparing_to_shoot()
 
             if random.random() < 0.05:
-                x_addition = 0.5 if self.vector_to(self.game.player)[0] > 0 else -0.5
-                y_addition = -0.5 if self.vector_to(self.game.player)[1] > 8 else 2
+                x_addition = 0.5 if self.vector_to_player()[0] > 0 else -0.5
+                y_addition = -0.5 if self.vector_to_player()[1] > 8 else 2
 
                 self.velocity = [random.random() - 0.5 + x_addition, -(random.random() + y_addition)]
                 self.flip_reset()
                 if self.health <= self.stage_two_health:
-                    if random.random() < 0.75 and len([e for e in self.game.extra_entities if e.type == 'hilbert_orb']) < 20:
-                        spawn_portal = random.choice([e for e in self.game.extra_entities if e.type == 'hilbert_orb_spawner'])
+                    if random.random() < 0.75 and len(self.game.extra_entities.of_type('hilbert_orb')) < 20:
+                        spawn_portal = random.choice(self.game.extra_entities.of_type('hilbert_orb_spawner'))
                         orb_spawn_loc = spawn_portal.rect().center
                         self.game.extra_entities.append(HilbertOrb(self.game, orb_spawn_loc, self.game.entity_info[47]['size'], [random.uniform(-2,2), 0]))
                         spawn_portal.set_action('activating')
@@ -4080,8 +4031,8 @@ class HilbertBoss(Boss):
                     angle = random.uniform(0, math.pi)
                     speed = max(abs(self.velocity[1]), 2)
 
-                    self.game.sparks.append(_spark.Spark(
-                        (self.rect().centerx, self.rect().bottom), angle, speed, color=(190, 200, 220)))
+                    self.game.sparks.spawn(
+                        (self.rect().centerx, self.rect().bottom), angle, speed, color=(190, 200, 220))
 
             elif not self.shoot_countdown and not self.can_shoot and not self.preparing_to_shoot and random.random() < 0.01:
                 self.set_preparing_to_shoot()
@@ -4090,7 +4041,7 @@ class HilbertBoss(Boss):
                 if random.random() < (self.preparing / self.preparing_time):
                     spark_angle = random.uniform(0, 2 * math.pi)
                     spark_location = [self.rect().centerx + 35 * math.cos(spark_angle), self.rect().centery + 35 * math.sin(spark_angle)]
-                    self.game.sparks.append(_spark.Spark(spark_location, spark_angle, 2, color = (255, 0, 255)))
+                    self.game.sparks.spawn(spark_location, spark_angle, 2, color = (255, 0, 255))
                 self.preparing += 1
 
                 if self.preparing > self.preparing_time:
@@ -0,0 +1,232 @@
+"""
+Entity manager module for Hilbert's Hotel.
+Holds every dynamic entity list, with O(1) removal that is deferred until the end of the frame,
+and the array pools used for effects too numerous to be objects.
+"""
+import itertools
+import numpy as np
+
+GROUPS = ('portals', 'enemies', 'bosses', 'characters', 'spawn_points', 'currency_entities',
+          'extra_entities', 'arcs')
+# Groups of PhysicsEntities whose distance to the player is measured in one batch every frame:
+MEASURED_GROUPS = ('portals', 'enemies', 'bosses', 'characters', 'spawn_points', 'currency_entities', 'extra_entities')
+
+
+class EntityList:
+    """
+    List-like container of unique entities.
+    Removing marks the entity dead straight away (it stops showing in iteration, len, in and type views)
+    and the slot is swap-removed in flush(), so entities can be removed while the list is being iterated.
+    Iterating only visits entities that were present when the iteration started, like iterating a copy.
+    Dormant entities stay in the list but are skipped by active(), see spatial.ActivityRegion.
+    """
+    def __init__(self):
+        self.items = []
+        self.slots = {}
+        self.handles = {}
+        self.by_handle = {}
+        self.types = {}
+        self.indexed_type = {}
+        self.killed = {}
+        self.dormant = {}
+        self.dormant_cells = {}
+        self.next_handle = itertools.count(1)
+        # Called with every entity added to the list, see spatial.SpatialHash
+        self.on_add = None
+
+    def add(self, entity):
+        key = id(entity)
+        if key in self.killed:
+            del self.killed[key]
+            self.index_type(entity)
+        elif key not in self.slots:
+            self.slots[key] = len(self.items)
+            self.items.append(entity)
+            handle = next(self.next_handle)
+            self.handles[key] = handle
+            self.by_handle[handle] = entity
+            self.index_type(entity)
+        else:
+            return self.handles[key]
+        if self.on_add is not None:
+            self.on_add(entity)
+        return self.handles[key]
+
+    def append(self, entity):
+        self.add(entity)
+
+    def get(self, handle):
+        # Entity for a handle, None once it has been removed
+        entity = self.by_handle.get(handle)
+        if entity is None or id(entity) in self.killed:
+            return None
+        return entity
+
+    def index_type(self, entity):
+        entity_type = getattr(entity, 'type', None)
+        self.indexed_type[id(entity)] = entity_type
+        self.types.setdefault(entity_type, {})[id(entity)] = entity
+
+    def retype(self, entity):
+        # Call after changing the type of an entity already in the list
+        if entity in self:
+            del self.types[self.indexed_type[id(entity)]][id(entity)]
+            self.index_type(entity)
+
+    def of_type(self, entity_type):
+        return list(self.types.get(entity_type, {}).values())
+
+    def remove(self, entity):
+        key = id(entity)
+        if key not in self.slots or key in self.killed:
+            raise ValueError('EntityList.remove(x): x not in list')
+        self.killed[key] = entity
+        del self.types[self.indexed_type[key]][key]
+
+    def kill(self, entity):
+        if entity in self:
+            self.remove(entity)
+
+    def clear(self):
+        for entity in self:
+            self.remove(entity)
+
+    def flush(self):
+        for key in self.killed:
+            if key in self.dormant:
+                self.wake(self.killed[key])
+            index = self.slots.pop(key)
+            last = self.items.pop()
+            if index < len(self.items):
+                self.items[index] = last
+                self.slots[id(last)] = index
+            del self.by_handle[self.handles.pop(key)]
+            del self.indexed_type[key]
+        self.killed = {}
+
+    def sleep(self, entity, cells):
+        # Park an entity in the given spatial cells until wake() is called
+        cells = list(cells)
+        self.dormant[id(entity)] = (entity, cells)
+        for cell in cells:
+            self.dormant_cells.setdefault(cell, {})[id(entity)] = entity
+
+    def wake(self, entity):
+        entity, cells = self.dormant.pop(id(entity))
+        for cell in cells:
+            bucket = self.dormant_cells[cell]
+            del bucket[id(entity)]
+            if not bucket:
+                del self.dormant_cells[cell]
+
+    def active(self):
+        # Like iterating the list, without the dormant entities
+        items = self.items
+        killed = self.killed
+        dormant = self.dormant
+        for index in range(len(items)):
+            entity = items[index]
+            if id(entity) not in killed and id(entity) not in dormant:
+                yield entity
+
+    def copy(self):
+        return list(self)
+
+    def __iter__(self):
+        items = self.items
+        killed = self.killed
+        for index in range(len(items)):
+            entity = items[index]
+            if id(entity) not in killed:
+                yield entity
+
+    def __len__(self):
+        return len(self.items) - len(self.killed)
+
+    def __contains__(self, entity):
+        return id(entity) in self.slots and id(entity) not in self.killed
+
+    def __getitem__(self, index):
+        if self.killed:
+            return self.copy()[index]
+        return self.items[index]
+
+
+class ArrayPool:
+    """
+    Rows of preallocated numpy arrays, one array per field, plus optional Python lists for object fields.
+    Capacity doubles when full and removal compacts the rows, so they always stay in spawn order.
+    """
+    def __init__(self, fields, lists=(), capacity=64):
+        self.fields = fields
+        self.lists = lists
+        self.count = 0
+        self.capacity = capacity
+        for name, (shape, dtype) in fields.items():
+            setattr(self, name, np.zeros((capacity,) + shape, dtype=dtype))
+        for name in lists:
+            setattr(self, name, [])
+
+    def add_row(self):
+        if self.count == self.capacity:
+            self.capacity *= 2
+            for name in self.fields:
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+        self.count += 1
+        return self.count - 1
+
+    def remove_rows(self, rows):
+        keep = np.ones(self.count, dtype=bool)
+        keep[rows] = False
+        count = int(keep.sum())
+        for name in self.fields:
+            array = getattr(self, name)
+            array[:count] = array[:self.count][keep]
+        if self.lists:
+            kept = keep.tolist()
+            for name in self.lists:
+                setattr(self, name, [item for item, keep_item in zip(getattr(self, name), kept) if keep_item])
+        self.count = count
+
+    def clear(self):
+        self.count = 0
+        for name in self.lists:
+            setattr(self, name, [])
+
+    def __len__(self):
+        return self.count
+
+
+class EntityManager:
+    """
+    One EntityList per game entity group, flushed together once per frame.
+    """
+    def __init__(self):
+        self.groups = {group: EntityList() for group in GROUPS}
+
+    def group(self, name):
+        return self.groups[name]
+
+    def flush(self):
+        for entity_list in self.groups.values():
+            if entity_list.killed:
+                entity_list.flush()
+
+    def measure_to_player(self, player, frame, groups=MEASURED_GROUPS):
+        # Vector and distance from every entity centre to the player centre in one numpy pass,
+        # cached on the entity along with the frame they were measured in
+        entities = [entity for group in groups for entity in self.groups[group].active() if hasattr(entity, 'player_measure')]
+        if not entities:
+            return
+
+        # Truncate like pygame.Rect does so the centres match rect().center
+        pos = np.array([entity.pos[:2] for entity in entities], dtype=np.float64).astype(np.int64)
+        size = np.array([entity.size[:2] for entity in entities], dtype=np.float64).astype(np.int64)
+        vectors = np.array(player.rect().center) - (pos + size // 2)
+        distances = np.hypot(vectors[:, 0], vectors[:, 1])
+
+        for entity, vector, distance in zip(entities, vectors.tolist(), distances.tolist()):
+            entity.player_vector = vector
+            entity.player_distance = distance
+            entity.player_measure = frame
@@ -0,0 +1,79 @@
+"""
+Lighting module for Hilbert's Hotel.
+Renders cave darkness into a reduced resolution lightmap lit by pre-rendered soft lights, then scales it up once per frame.
+"""
+import math
+import numpy as np
+import pygame
+
+# The lightmap is this many times smaller than the display along each side:
+LIGHTMAP_SCALE = 2
+# Fractions of a light's radius where it starts to fade out and where it is completely dark:
+LIGHT_INNER = 0.7
+LIGHT_OUTER = 1.2
+
+
+def light_sprite(radius):
+    # Black sprite whose alpha is the darkness left by a light of radius lightmap pixels:
+    # 0 up to LIGHT_INNER * radius, easing up to 255 at LIGHT_OUTER * radius and beyond
+    half = math.ceil(radius * LIGHT_OUTER)
+    centres = np.arange(2 * half) + 0.5 - half
+    distance = np.hypot(centres[:, None], centres[None, :]) / radius
+    fade = np.clip((distance - LIGHT_INNER) / (LIGHT_OUTER - LIGHT_INNER), 0, 1)
+    sprite = pygame.Surface((2 * half, 2 * half), pygame.SRCALPHA)
+    sprite.fill((0, 0, 0, 255))
+    pygame.surfarray.pixels_alpha(sprite)[:] = np.round(255 * fade * fade * (3 - 2 * fade)).astype(np.uint8)
+    return sprite
+
+
+class Lighting:
+    """
+    Darkness laid over the outlined layer, with the lights queued during the frame cut out of it.
+    Lights are stamped onto the lightmap with a min blend, so overlapping lights never darken each other,
+    and the darkness level is multiplied in once afterwards.
+    """
+    def __init__(self, size):
+        self.size = (int(size[0]), int(size[1]))
+        self.lightmap = pygame.Surface((math.ceil(self.size[0] / LIGHTMAP_SCALE), math.ceil(self.size[1] / LIGHTMAP_SCALE)), pygame.SRCALPHA)
+        self.overlay = pygame.Surface(self.size, pygame.SRCALPHA)
+        self.sprites = {}
+        self.darkness = 0
+        self.lights = []
+
+    def sprite(self, radius):
+        if radius not in self.sprites:
+            self.sprites[radius] = light_sprite(radius / LIGHTMAP_SCALE)
+        return self.sprites[radius]
+
+    def fill(self, darkness):
+        # Even darkness with no lights, until lights are added again
+        self.darkness = int(darkness)
+        self.lights = []
+
+    def add(self, pos, radius):
+        # Queue a light at pos on the display, skipping any that cannot reach the view
+        radius = round(radius)
+        reach = radius * LIGHT_OUTER
+        if radius < 1 or pos[0] + reach < 0 or pos[1] + reach < 0 or pos[0] - reach > self.size[0] or pos[1] - reach > self.size[1]:
+            return
+        self.lights.append((pos, radius))
+
+    def render(self, surface):
+        if self.darkness <= 0:
+            return
+        if not self.lights:
+            self.overlay.fill((0, 0, 0, self.darkness))
+            surface.blit(self.overlay, (0, 0))
+            return
+
+        self.lightmap.fill((0, 0, 0, 255))
+        stamps = []
+        for (x, y), radius in self.lights:
+            sprite = self.sprite(radius)
+            half = sprite.get_width() // 2
+            stamps.append((sprite, (round(x / LIGHTMAP_SCALE) - half, round(y / LIGHTMAP_SCALE) - half), None, pygame.BLEND_RGBA_MIN))
+        self.lightmap.blits(stamps, doreturn=False)
+        self.lightmap.fill((255, 255, 255, self.darkness), special_flags=pygame.BLEND_RGBA_MULT)
+
+        pygame.transform.scale(self.lightmap, self.size, self.overlay)
+        surface.blit(self.overlay, (0, 0))
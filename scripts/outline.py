@@ -0,0 +1,98 @@
+"""
+Outline module for Hilbert's Hotel.
+Draws the dark outline under everything on the outlined layer from outlines worked out once per sprite,
+instead of building a mask of the whole layer every frame.
+"""
+import weakref
+import pygame
+
+OUTLINE_COLOUR = (0, 0, 0, 180)
+# The outline is the silhouette blitted once at each of these offsets:
+OUTLINE_OFFSETS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+# Sprites blitted with a surface alpha at or below this are too faint to count as part of the silhouette:
+MASK_THRESHOLD = 127
+
+
+def build_outline(image):
+    # The four shifted silhouettes of image on one surface, one pixel larger than image on every side
+    silhouette = pygame.mask.from_surface(image).to_surface(setcolor=OUTLINE_COLOUR, unsetcolor=(0, 0, 0, 0))
+    outline = pygame.Surface((image.get_width() + 2, image.get_height() + 2), pygame.SRCALPHA)
+    outline.blits([(silhouette, (1 + dx, 1 + dy)) for dx, dy in OUTLINE_OFFSETS], doreturn=False)
+    return outline
+
+
+class OutlineLayer:
+    """
+    Outlines queued while a frame is drawn, blitted under the outlined layer in one pass.
+    Outlines of animation frames, tiles and tile chunks are cached against their surface, so a frame only costs blits.
+    Sparks and arcs are drawn on the effects surface instead and outlined from the regions they covered.
+    """
+    def __init__(self, size):
+        self.cache = weakref.WeakKeyDictionary()
+        self.blits = []
+        self.collecting = False
+        self.effects = pygame.Surface(size, pygame.SRCALPHA)
+        self.effects_rects = []
+
+    def outline(self, image, flip=False):
+        outlines = self.cache.get(image)
+        if outlines is None:
+            outlines = self.cache[image] = [build_outline(image), None]
+        if flip:
+            # The outline is symmetric about the image, so flipping it gives the outline of the flipped image
+            if outlines[1] is None:
+                outlines[1] = pygame.transform.flip(outlines[0], True, False)
+            return outlines[1]
+        return outlines[0]
+
+    def preload(self, assets):
+        # Outline every animation frame and tile both ways round at load time
+        for asset in assets.values():
+            images = getattr(asset, 'images', asset)
+            if isinstance(images, list):
+                for image in images:
+                    self.outline(image)
+                    self.outline(image, flip=True)
+
+    def begin(self):
+        self.blits = []
+        self.collecting = True
+
+    def add(self, image, pos, flip=False, transparency=255):
+        # Queue the outline of image, about to be blitted at pos on the outlined layer
+        if not self.collecting or transparency <= MASK_THRESHOLD:
+            return
+        outline = self.outline(image, flip)
+        # Blits truncate float positions, so the outline sits one pixel up and left of where the image lands
+        self.blits.append((outline, (int(pos[0]) - 1, int(pos[1]) - 1)))
+
+    def add_effect(self, rect):
+        # Note a region of the effects surface that was just drawn on
+        if rect.width and rect.height:
+            self.effects_rects.append(rect)
+
+    def effect_regions(self):
+        # The noted regions with overlapping ones merged, so each effect pixel is outlined and laid down once
+        # while effects spread across the display are not outlined through all the space between them
+        regions = []
+        for rect in self.effects_rects:
+            rect = rect.copy()
+            hits = rect.collidelistall(regions)
+            while hits:
+                for i in reversed(hits):
+                    rect.union_ip(regions.pop(i))
+                hits = rect.collidelistall(regions)
+            regions.append(rect)
+        self.effects_rects = []
+        return regions
+
+    def render(self, display, surface):
+        # Outline the effects from the regions they covered and lay them over the outlined layer,
+        # then blit every outline onto the display, under the outlined layer
+        for rect in self.effect_regions():
+            self.blits.append((build_outline(self.effects.subsurface(rect)), (rect.x - 1, rect.y - 1)))
+            surface.blit(self.effects, rect, rect)
+            self.effects.fill((0, 0, 0, 0), rect)
+        display.blits(self.blits, doreturn=False)
+        self.blits = []
+        self.collecting = False
@@ -1,28 +1,73 @@
 import math
 import random
+import numpy as np
+import scripts.entity_manager as _entity_manager
 
-class Particle:
-    def __init__(self, game, p_type, pos, vel = [0, 0], frame = 0):
+class ParticlePool(_entity_manager.ArrayPool):
+    """
+    Every live particle as rows of numpy arrays, stepped and drawn in bulk.
+    Particle animations never loop, so a particle goes once its animation has finished.
+    Leaves also sway sideways as they fall.
+    """
+    def __init__(self, game):
+        super().__init__({'pos': ((2,), np.float64), 'velocity': ((2,), np.float64), 'kind': ((), np.int16),
+                          'frame': ((), np.int64), 'done': ((), bool), 'randomness': ((), np.float64)})
         self.game = game
-        self.type = p_type
-        self.pos = list(pos)
-        self.velocity = list(vel)
-        self.animation = self.game.assets['particle/' + self.type].copy()
-        self.animation.frame = frame
-        self.randomness = random.random() * math.pi * 2
-
-    def update(self):
-        kill = False
-        
-        if self.animation.done:
-            kill = True
-
-        self.pos[0] += self.velocity[0]
-        self.pos[1] += self.velocity[1]
-
-        self.animation.update()
-        return kill
-    
+        self.kind_ids = {}
+        self.images = []
+        self.img_durations = np.zeros(0, dtype=np.int64)
+        self.last_frames = np.zeros(0, dtype=np.int64)
+
+    def kind_id(self, p_type):
+        if p_type not in self.kind_ids:
+            animation = self.game.assets['particle/' + p_type]
+            self.kind_ids[p_type] = len(self.images)
+            self.images.append(animation.images)
+            self.img_durations = np.append(self.img_durations, animation.img_duration)
+            self.last_frames = np.append(self.last_frames, animation.img_duration * len(animation.images) - 1)
+        return self.kind_ids[p_type]
+
+    def spawn(self, p_type, pos, vel = [0, 0], frame = 0):
+        row = self.add_row()
+        self.pos[row] = pos[0], pos[1]
+        self.velocity[row] = vel[0], vel[1]
+        self.kind[row] = self.kind_id(p_type)
+        self.frame[row] = frame
+        self.done[row] = False
+        self.randomness[row] = random.random() * math.pi * 2
+
+    def update(self, game, offset = (0, 0)):
+        if not self.count:
+            return
+        if game.display_frame:
+            self.render(game.display_outline, offset=offset)
+        if game.paused:
+            return
+
+        count = self.count
+        kind = self.kind[:count]
+        frame = self.frame[:count]
+        done = self.done[:count]
+        kill = np.flatnonzero(done)
+
+        self.pos[:count] += self.velocity[:count]
+        last_frames = self.last_frames[kind]
+        np.minimum(frame + 1, last_frames, out=frame)
+        done |= frame >= last_frames
+
+        if 'leaf' in self.kind_ids:
+            leaves = np.flatnonzero(kind == self.kind_ids['leaf'])
+            self.pos[leaves, 0] += np.sin(frame[leaves] * 0.035 + self.randomness[leaves]) * 0.2
+
+        if kill.size:
+            self.remove_rows(kill)
+
     def render(self, surface, offset = (0, 0)):
-        img = self.animation.img()
-        surface.blit(img, (self.pos[0] - offset[0] - img.get_width() // 2, self.pos[1] - offset[1] - img.get_height() // 2))
\ No newline at end of file
+        count = self.count
+        kind = self.kind[:count]
+        image_index = (self.frame[:count] // self.img_durations[kind]).tolist()
+        blits = []
+        for (x, y), kind_index, index in zip(self.pos[:count].tolist(), kind.tolist(), image_index):
+            img = self.images[kind_index][index]
+            blits.append((img, (x - offset[0] - img.get_width() // 2, y - offset[1] - img.get_height() // 2)))
+        surface.blits(blits, doreturn=False)
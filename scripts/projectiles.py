@@ -0,0 +1,126 @@
+"""
+Projectile module for Hilbert's Hotel.
+Keeps every bullet as a row of numpy arrays so they are moved, collided and drawn in batches.
+"""
+import math
+import random
+import numpy as np
+import scripts.entity_manager as _entity_manager
+
+ATTACK_POWER = 1
+LIGHT_SIZE = 10
+
+
+class ProjectilePool(_entity_manager.ArrayPool):
+    """
+    Structure of arrays holding the live bullets: position, velocity, type, origin and light size.
+    Effects of hits are resolved in spawn order, as when each bullet updated itself.
+    """
+    def __init__(self, game):
+        super().__init__({'pos': ((2,), np.float64), 'vel': ((2,), np.float64),
+                          'kind': ((), np.int16), 'light': ((), np.float64)}, lists=('origin',))
+        self.game = game
+        self.kind_names = []
+        self.kind_ids = {}
+        self.images = []
+
+    def kind_id(self, type):
+        if type not in self.kind_ids:
+            self.kind_ids[type] = len(self.kind_names)
+            self.kind_names.append(type)
+            self.images.append(self.game.assets[type])
+        return self.kind_ids[type]
+
+    def spawn(self, pos, speed, origin, type='projectile_'):
+        row = self.add_row()
+        self.pos[row] = pos[0], pos[1]
+        self.vel[row] = speed[0], speed[1]
+        self.kind[row] = self.kind_id(type)
+        self.light[row] = LIGHT_SIZE
+        self.origin.append(origin)
+
+    def points_in_rect(self, rect):
+        # Same test as rect.collidepoint, which truncates float points towards zero
+        points = np.trunc(self.pos[:self.count])
+        return ((points[:, 0] >= rect.left) & (points[:, 0] < rect.right) &
+                (points[:, 1] >= rect.top) & (points[:, 1] < rect.bottom))
+
+    def take_in_rect(self, rect):
+        # Removes the first bullet inside rect that can hurt enemies, True if there was one
+        if not self.count:
+            return False
+        hits = self.points_in_rect(rect)
+        if 'spine' in self.kind_ids:
+            hits &= self.kind[:self.count] != self.kind_ids['spine']
+        rows = np.flatnonzero(hits)
+        if not rows.size:
+            return False
+        self.remove_rows(rows[:1])
+        return True
+
+    def render(self, game):
+        pos = self.pos[:self.count]
+        scroll = game.render_scroll
+        if game.cave_darkness and game.transition <= 0:
+            lights = np.trunc(pos).astype(np.int64).tolist()
+            for (x, y), light in zip(lights, self.light[:self.count].tolist()):
+                game.lighting.add((x - scroll[0], y - scroll[1]), light)
+
+        blits = []
+        for (x, y), kind in zip(pos.tolist(), self.kind[:self.count].tolist()):
+            img = self.images[kind]
+            blits.append((img, (x - img.get_width() / 2 - scroll[0], y - img.get_height() / 2 - scroll[1])))
+            game.outlines.add(img, blits[-1][1])
+        game.display_outline.blits(blits, doreturn=False)
+
+    def update(self, game):
+        if not self.count:
+            return
+        if game.display_frame:
+            self.render(game)
+
+        pos = self.pos[:self.count]
+        if not game.paused:
+            pos += self.vel[:self.count]
+
+        # Wall, crate and player hits for every bullet at once
+        tiles = np.trunc(pos).astype(np.int64) // game.tilemap.tile_size
+        solid = game.tilemap.grid.solid_many(tiles[:, 0], tiles[:, 1])
+        hit_player = self.points_in_rect(game.player.rect())
+        crates = game.extra_entities.of_type('crate')
+        hit_crate = np.zeros(self.count, dtype=bool)
+        for crate in crates:
+            hit_crate |= self.points_in_rect(crate.rect())
+
+        rows = np.flatnonzero(solid | hit_crate | hit_player)
+        if not rows.size:
+            return
+
+        # Resolve the hits in spawn order, as the effects can change what later bullets see
+        removed = []
+        for row in rows.tolist():
+            point = pos[row].tolist()
+            if solid[row]:
+                if self.kind_names[self.kind[row]] != 'spine':
+                    speed = self.vel[row].tolist()
+                    velocity_angle = math.atan2(speed[1], (speed[0] if speed[0] != 0 else 0.01))
+                    for _ in range(4):
+                        game.sparks.spawn(point, random.random() - 0.5 + velocity_angle, 2 + random.random())
+                    game.sfx['proj_bye'].play()
+                removed.append(row)
+                continue
+
+            if hit_crate[row]:
+                crate = next((crate for crate in crates if crate.rect().collidepoint(point) and crate in game.extra_entities), None)
+                if crate is not None:
+                    crate.kill()
+                    game.extra_entities.remove(crate)
+                    removed.append(row)
+                    continue
+
+            if hit_player[row] and abs(game.player.dashing) < 50 and not game.dead:
+                game.player.damage(ATTACK_POWER, self.origin[row])
+                removed.append(row)
+
+        if removed:
+            self.remove_rows(removed)
@@ -1,28 +1,117 @@
 import math
+import numpy as np
 import pygame
+import scripts.entity_manager as _entity_manager
 
-class Spark:
-    def __init__(self, pos, angle, speed, color = (255, 255, 255)):
-        self.pos = list(pos)
-        self.angle = angle
-        self.speed = speed
-        self.color = color
+# Directions of the four polygon points relative to the spark angle, and their length in units of speed:
+POINT_TURNS = (0, math.pi / 2, math.pi, -math.pi / 2)
+POINT_LENGTHS = np.array([3, 0.5, 3, 0.5])
+
+class SparkPool(_entity_manager.ArrayPool):
+    """
+    Every live spark as rows of numpy arrays, moved, slowed and turned into polygons in bulk.
+    The point directions only depend on the angle, so they are worked out once at spawn.
+    """
+    def __init__(self):
+        super().__init__({'pos': ((2,), np.float64), 'speed': ((), np.float64),
+                          'points': ((4, 2), np.float64), 'color': ((3,), np.uint8)})
+
+    def spawn(self, pos, angle, speed, color = (255, 255, 255)):
+        row = self.add_row()
+        self.pos[row] = pos[0], pos[1]
+        self.speed[row] = speed
+        self.points[row] = [(math.cos(angle + turn), math.sin(angle + turn)) for turn in POINT_TURNS]
+        self.color[row] = color
 
     def update(self, game, offset = (0, 0)):
-        self.pos[0] += math.cos(self.angle) * self.speed
-        self.pos[1] += math.sin(self.angle) * self.speed
+        if not self.count:
+            return
+        finished = None
+        if not game.paused:
+            speed = self.speed[:self.count]
+            self.pos[:self.count] += self.points[:self.count, 0] * speed[:, None]
+            np.maximum(0, speed - 0.1, out=speed)
+            finished = np.flatnonzero(speed == 0)
+        # Sparks that just stopped are drawn one last time before they go
+        if game.display_frame:
+            for rect in self.render(game.outlines.effects, offset=offset):
+                game.outlines.add_effect(rect)
+        if finished is not None and finished.size:
+            self.remove_rows(finished)
 
-        self.speed = max(0, self.speed - 0.1)
-        return not self.speed
-    
     def render(self, surface, offset = (0, 0)):
-        render_points = [
-            (self.pos[0] + math.cos(self.angle) * self.speed * 3 - offset[0], self.pos[1] + math.sin(self.angle) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi / 2) * self.speed / 2 - offset[0], self.pos[1] + math.sin(self.angle + math.pi / 2) * self.speed / 2 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi) * self.speed * 3 - offset[0], self.pos[1] + math.sin(self.angle + math.pi) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle - math.pi / 2) * self.speed / 2 - offset[0], self.pos[1] + math.sin(self.angle - math.pi / 2) * self.speed / 2 - offset[1])
-        ]
-        pygame.draw.polygon(surface, self.color, render_points)
+        count = self.count
+        points = self.pos[:count, None, :] + self.points[:count] * self.speed[:count, None, None] * POINT_LENGTHS[None, :, None] - offset
+        # Polygons entirely off the surface draw nothing, skip them
+        width, height = surface.get_size()
+        low = points.min(axis=1)
+        high = points.max(axis=1)
+        visible = np.flatnonzero((high[:, 0] >= -1) & (low[:, 0] <= width) & (high[:, 1] >= -1) & (low[:, 1] <= height))
+        rects = [pygame.draw.polygon(surface, color, polygon) for polygon, color in zip(points[visible].tolist(), self.color[visible].tolist())]
+        # The areas drawn over, so they can be outlined
+        return rects
+
+def angle_in_arc(angle, start, end):
+    return end - start >= 2 * math.pi or (angle - start) % (2 * math.pi) <= end - start
+
+def segment_hits_rect(x0, y0, x1, y1, left, top, right, bottom):
+    # Liang-Barsky clip of the segment against the rect
+    t0, t1 = 0, 1
+    for p, q in ((x0 - x1, x0 - left), (x1 - x0, right - x0), (y0 - y1, y0 - top), (y1 - y0, bottom - y0)):
+        if p == 0:
+            if q < 0:
+                return False
+        elif p < 0:
+            t0 = max(t0, q / p)
+        else:
+            t1 = min(t1, q / p)
+    return t0 <= t1
+
+def sector_hits_rect(centre, inner_radius, outer_radius, start, end, rect):
+    # Exact overlap of a rect with the annular sector pygame.draw.arc fills,
+    # angles going anticlockwise on screen so a point at angle a is (cos a, -sin a) from the centre
+    left, right = rect.left - centre[0], rect.right - centre[0]
+    top, bottom = rect.top - centre[1], rect.bottom - centre[1]
+
+    # Rect entirely outside the outer circle or inside the inner one
+    near_x = min(max(0, left), right)
+    near_y = min(max(0, top), bottom)
+    if near_x * near_x + near_y * near_y > outer_radius * outer_radius:
+        return False
+    far_x = max(abs(left), abs(right))
+    far_y = max(abs(top), abs(bottom))
+    if far_x * far_x + far_y * far_y < inner_radius * inner_radius:
+        return False
+
+    # A rect corner inside the sector
+    for x in (left, right):
+        for y in (top, bottom):
+            if inner_radius * inner_radius <= x * x + y * y <= outer_radius * outer_radius and angle_in_arc(math.atan2(-y, x), start, end):
+                return True
+
+    # Either arc crossing a rect edge
+    for radius in (inner_radius, outer_radius):
+        for x in (left, right):
+            if abs(x) <= radius:
+                half = math.sqrt(radius * radius - x * x)
+                for y in (half, -half):
+                    if top <= y <= bottom and angle_in_arc(math.atan2(-y, x), start, end):
+                        return True
+        for y in (top, bottom):
+            if abs(y) <= radius:
+                half = math.sqrt(radius * radius - y * y)
+                for x in (half, -half):
+                    if left <= x <= right and angle_in_arc(math.atan2(-y, x), start, end):
+                        return True
+
+    # A straight edge of the sector inside the rect, or for a full ring, the whole ring inside it
+    if end - start >= 2 * math.pi:
+        return left <= outer_radius <= right and top <= 0 <= bottom
+    for angle in (start, end):
+        x, y = math.cos(angle), -math.sin(angle)
+        if segment_hits_rect(x * inner_radius, y * inner_radius, x * outer_radius, y * outer_radius, left, top, right, bottom):
+            return True
+    return False
 
 class ExpandingArc:
     def __init__(self, pos, maxRadius, angleA, angleB, speed, color = (255, 255, 255), color_str = 'white', can_damage_boss = False, width = 1, damage = 1, type = 'default'):
@@ -60,23 +149,19 @@ class ExpandingArc:
                 game.player.damage(self.damage, self.type)
 
         #Check for boss collision (Rubiks)
-        for boss in game.bosses.copy():
-            if self.checkCollision(boss.rect()) and self.color_str == boss.action and self.can_damage_boss:
+        for boss in game.spatial.query(self.posRect, 'bosses'):
+            if self.checkCollision(boss.rect()) and self.color_str == boss.action and self.can_damage_boss and boss in game.bosses:
                 if boss.damage_self():
                     boss.set_action('dying')
                     boss.gravity_affected = True
 
 
     def render(self, surface, offset = (0, 0)):
-        pygame.draw.arc(surface, self.color, self.dispRect, self.angleA, self.angleB, width = self.displayWidth)
+        return pygame.draw.arc(surface, self.color, self.dispRect, self.angleA, self.angleB, width = self.displayWidth)
 
     def checkCollision(self, rectToCollide):
-        if self.posRect.colliderect(rectToCollide):
-
-            for angle in range(int(math.degrees(self.angleA)), int(math.degrees(self.angleB)), 5):
-                rad_angle = math.radians(angle)
-                x = self.posRect.centerx + self.radius * math.cos(rad_angle)
-                y = self.posRect.centery + self.radius * math.sin(rad_angle)
-
-                if rectToCollide.collidepoint(x, y):
-                    return True
\ No newline at end of file
+        if not self.posRect.colliderect(rectToCollide):
+            return False
+        # The arc is drawn inwards from the edge of posRect, displayWidth thick
+        outer_radius = self.posRect.width / 2
+        return sector_hits_rect(self.posRect.center, max(0, outer_radius - self.displayWidth), outer_radius, self.angleA, self.angleB, rectToCollide)
@@ -0,0 +1,152 @@
+"""
+Spatial hash module for Hilbert's Hotel.
+Buckets the dynamic entities every frame so collision checks only look at nearby candidates,
+and puts entities far from the camera to sleep so they are not iterated at all.
+"""
+import functools
+import math
+import numpy as np
+
+CELL_SIZE = 64
+# Entities keep moving after the rebuild, so they are bucketed with this much padding:
+MOTION_MARGIN = 16
+GROUPS = ('enemies', 'bosses', 'extra_entities', 'currency_entities')
+
+# Distance the active window reaches past the camera view and the player's render distance:
+ACTIVE_MARGIN = 64
+ACTIVITY_GROUPS = ('enemies', 'currency_entities', 'extra_entities', 'spawn_points')
+# Cell offsets searched around each position by separation_sums:
+NEIGHBOUR_OFFSETS = np.array([(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)])
+
+
+def entity_bounds(entity):
+    rect = entity.rect()
+    return rect.left, rect.top, rect.right, rect.bottom
+
+
+def entity_centre(entity):
+    return entity.rect().center
+
+
+def separation_sums(positions, radius):
+    # For each position, the sum of (position - other) over the other positions strictly closer than radius.
+    # Positions are binned on a grid of radius sized cells so only the 3x3 cells around each one are compared.
+    count = len(positions)
+    sums = np.zeros((count, 2))
+    if count < 2:
+        return sums
+
+    cells = np.floor(positions / radius).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    width = cells[:, 0].max() + 2
+    keys = cells[:, 0] + cells[:, 1] * width
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    # The 3x3 neighbouring cells of every position, searched all at once
+    neighbours = (keys[None, :] + NEIGHBOUR_OFFSETS[:, 0, None] + NEIGHBOUR_OFFSETS[:, 1, None] * width).ravel()
+    start = np.searchsorted(sorted_keys, neighbours, side='left')
+    counts = np.searchsorted(sorted_keys, neighbours, side='right') - start
+    total = int(counts.sum())
+    # Every (i, j) pair between a position and the positions in its neighbouring cells
+    i = np.repeat(np.tile(np.arange(count), len(NEIGHBOUR_OFFSETS)), counts)
+    j = order[np.repeat(start - np.cumsum(counts) + counts, counts) + np.arange(total)]
+    diff = positions[i] - positions[j]
+    close = (np.hypot(diff[:, 0], diff[:, 1]) < radius) & (i != j)
+    sums[:, 0] = np.bincount(i[close], weights=diff[close, 0], minlength=count)
+    sums[:, 1] = np.bincount(i[close], weights=diff[close, 1], minlength=count)
+    return sums
+
+
+class SpatialHash:
+    """
+    Uniform grid of buckets holding (group, entity) pairs, group being the game list the entity lives in.
+    Rebuilt at the start of every frame, entities added during the frame are inserted as they are added.
+    Queries return candidates near the area, callers still do their exact test against current positions.
+    Entities removed during the frame stay in the buckets until the next rebuild.
+    Dormant entities are not rebuilt each frame, queries read them from their list's dormant cells.
+    """
+    def __init__(self, cell_size=CELL_SIZE, margin=MOTION_MARGIN):
+        self.cell_size = cell_size
+        self.margin = margin
+        self.buckets = {}
+        self.dormant = {}
+
+    def rebuild(self, game):
+        self.buckets = {}
+        for group in GROUPS:
+            entity_list = getattr(game, group)
+            self.dormant[group] = entity_list.dormant_cells
+            entity_list.on_add = functools.partial(self.insert, group=group)
+            for entity in entity_list.active():
+                self.insert(entity, group)
+
+    def candidates(self, cell, group):
+        for entity_group, entity in self.buckets.get(cell, ()):
+            if entity_group == group:
+                yield entity
+        yield from self.dormant.get(group, {}).get(cell, {}).values()
+
+    def cells(self, left, top, right, bottom):
+        for cx in range(int(left // self.cell_size), int(right // self.cell_size) + 1):
+            for cy in range(int(top // self.cell_size), int(bottom // self.cell_size) + 1):
+                yield cx, cy
+
+    def insert(self, entity, group):
+        left, top, right, bottom = entity_bounds(entity)
+        for cell in self.cells(left - self.margin, top - self.margin, right + self.margin, bottom + self.margin):
+            self.buckets.setdefault(cell, []).append((group, entity))
+
+    def query(self, rect, group, entity_type=None):
+        found = {}
+        for cell in self.cells(rect.left, rect.top, rect.right, rect.bottom):
+            for entity in self.candidates(cell, group):
+                if entity_type is None or entity.type == entity_type:
+                    found[id(entity)] = entity
+        return list(found.values())
+
+    def query_point(self, pos, group, entity_type=None):
+        found = []
+        for entity in self.candidates((int(pos[0] // self.cell_size), int(pos[1] // self.cell_size)), group):
+            if entity_type is None or entity.type == entity_type:
+                found.append(entity)
+        return found
+
+
+class ActivityRegion:
+    """
+    Active window around the camera and player, covering the view and every entity's render distance.
+    Entities with dormant_when_far only act within their render distance of the player, so once they
+    leave the window they are put to sleep in their list and skipped by the game loop until the window
+    moves back over the spatial cells they were parked in.
+    """
+    def __init__(self, spatial, margin=ACTIVE_MARGIN):
+        self.spatial = spatial
+        self.margin = margin
+
+    def window(self, game):
+        view_width, view_height = game.display.get_size()
+        centre = game.player.rect().center
+        reach = game.screen_width / 3 + self.margin
+        return (min(game.scroll[0] - self.margin, centre[0] - reach),
+                min(game.scroll[1] - self.margin, centre[1] - reach),
+                max(game.scroll[0] + view_width + self.margin, centre[0] + reach),
+                max(game.scroll[1] + view_height + self.margin, centre[1] + reach))
+
+    def update(self, game):
+        left, top, right, bottom = self.window(game)
+        for group in ACTIVITY_GROUPS:
+            entity_list = game.entities.group(group)
+
+            # Wake everything parked in the cells the window covers
+            for cell in self.spatial.cells(left, top, right, bottom):
+                for entity in list(entity_list.dormant_cells.get(cell, {}).values()):
+                    e_left, e_top, e_right, e_bottom = entity_bounds(entity)
+                    if e_right >= left and e_left <= right and e_bottom >= top and e_top <= bottom:
+                        entity_list.wake(entity)
+
+            for entity in entity_list.active():
+                if getattr(entity, 'dormant_when_far', False) and not entity.is_boss:
+                    e_left, e_top, e_right, e_bottom = entity_bounds(entity)
+                    if e_right < left or e_left > right or e_bottom < top or e_top > bottom:
+                        entity_list.sleep(entity, self.spatial.cells(e_left, e_top, e_right, e_bottom))
@@ -0,0 +1,98 @@
+"""
+Text module for Hilbert's Hotel.
+Draws strings from atlases of pre-rendered glyphs, one per font, colour and scale, and keeps recently drawn strings ready to blit.
+"""
+import collections
+import pygame
+
+# Glyphs rendered into every new atlas up front, others are added the first time they are drawn:
+ATLAS_CHARACTERS = ''.join(chr(code) for code in range(32, 127))
+# Composed strings are kept up to this many, least recently drawn go first:
+TEXT_CACHE_SIZE = 256
+
+
+class GlyphAtlas:
+    """
+    Every glyph of one font in one colour and scale, side by side on a single surface.
+    Glyphs are blended together with a max blend, which gives the same pixels as rendering the whole string.
+    """
+    def __init__(self, font, colour, scale):
+        self.font = font
+        self.colour = colour
+        self.scale = scale
+        self.surface = pygame.Surface((0, 0), pygame.SRCALPHA)
+        self.rects = {}
+        self.add(ATLAS_CHARACTERS)
+
+    def render(self, character):
+        glyph = self.font.render(character, True, self.colour)
+        if self.scale != 1:
+            glyph = pygame.transform.scale(glyph, (glyph.get_width() * self.scale, glyph.get_height() * self.scale))
+        return glyph
+
+    def add(self, characters):
+        # Render the new characters and rebuild the atlas with them on the end
+        glyphs = [(character, self.render(character)) for character in dict.fromkeys(characters) if character not in self.rects]
+        if not glyphs:
+            return
+        width = self.surface.get_width() + sum(glyph.get_width() for _, glyph in glyphs)
+        height = max([self.surface.get_height()] + [glyph.get_height() for _, glyph in glyphs])
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        surface.blit(self.surface, (0, 0))
+        x = self.surface.get_width()
+        for character, glyph in glyphs:
+            surface.blit(glyph, (x, 0))
+            self.rects[character] = pygame.Rect(x, 0, glyph.get_width(), glyph.get_height())
+            x += glyph.get_width()
+        self.surface = surface
+
+    def compose(self, text):
+        if not text:
+            return pygame.Surface((0, self.font.size('')[1] * self.scale), pygame.SRCALPHA)
+        return self.extend(None, text)
+
+    def extend(self, prefix, text):
+        # The image of text drawn after prefix, an image already composed by this atlas, or on its own if prefix is None
+        self.add(text)
+        rects = [self.rects[character] for character in text]
+        x = 0 if prefix is None else prefix.get_width()
+        height = max(rect.height for rect in rects)
+        if prefix is not None:
+            height = max(height, prefix.get_height())
+        image = pygame.Surface((x + sum(rect.width for rect in rects), height), pygame.SRCALPHA)
+        blits = [] if prefix is None else [(prefix, (0, 0), None, pygame.BLEND_RGBA_MAX)]
+        for rect in rects:
+            blits.append((self.surface, (x, 0), rect, pygame.BLEND_RGBA_MAX))
+            x += rect.width
+        image.blits(blits, doreturn=False)
+        return image
+
+
+class TextRenderer:
+    """
+    Composed strings kept by text, font, colour and scale, so text that has not changed since the last frame costs one blit.
+    New strings are put together from the glyph atlases rather than rasterised by the font.
+    """
+    def __init__(self, max_strings=TEXT_CACHE_SIZE):
+        self.max_strings = max_strings
+        self.atlases = {}
+        self.strings = collections.OrderedDict()
+
+    def render(self, text, font, colour, scale=1):
+        colour = tuple(colour)
+        key = (text, font, colour, scale)
+        image = self.strings.get(key)
+        if image is not None:
+            self.strings.move_to_end(key)
+            return image
+
+        atlas_key = (font, colour, scale)
+        if atlas_key not in self.atlases:
+            self.atlases[atlas_key] = GlyphAtlas(font, colour, scale)
+        atlas = self.atlases[atlas_key]
+        # Text that grows a character at a time, like dialogue, is drawn on the end of last frame's string
+        prefix = self.strings.get((text[:-1], font, colour, scale)) if len(text) > 1 else None
+        image = self.strings[key] = atlas.compose(text) if prefix is None else atlas.extend(prefix, text[-1])
+        if len(self.strings) > self.max_strings:
+            self.strings.popitem(last=False)
+        return image
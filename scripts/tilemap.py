@@ -3,10 +3,12 @@ Tilemap module for Hilbert's Hotel.
 Manages all tilemap behaviour, generation and rendering.
 """
 import json
+import hashlib
 import tkinter
 from tkinter import filedialog
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 import os
-import random
 import math
 import numpy as np
 import pygame
@@ -20,6 +22,18 @@ PHYSICS_TILES = {'grass', 'stone', 'normal', 'spooky',
 AUTOTILE_TYPES = {'grass', 'stone', 'normal', 'spooky',
                   'rubiks', 'aussie', 'space', 'heaven', 'hell', 'cracked'}
 
+# Static tiles are pre-rendered in square chunks of this many tiles:
+CHUNK_SIZE = 16
+CHUNK_CACHE_MAX = 48
+
+# Compact maps are numpy archives of the grid arrays and a packed offgrid table,
+# along with a hash of the JSON map they were converted from:
+MAP_BINARY_EXT = '.npz'
+MAP_BINARY_VERSION = 2
+
+# Next floors are generated here while the current one is still being played:
+FLOOR_GENERATOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='floor')
+
 AUTOTILE_MAP = {
     tuple(sorted([(1, 0), (0, 1)])): 0,
     tuple(sorted([(1, 0)])): 0,
@@ -42,18 +56,427 @@ AUTOTILE_MAP = {
     tuple(sorted([])): 11,
 }
 
+# Bit set in a tile's neighbour mask for each connecting neighbour, in the cracked tile variant order:
+AUTOTILE_BITS = {(0, 1): 1, (0, -1): 2, (1, 0): 4, (-1, 0): 8}
+AUTOTILE_LUT = np.full(16, -1, dtype=np.int16)
+for _neighbours, _variant in AUTOTILE_MAP.items():
+    AUTOTILE_LUT[sum(AUTOTILE_BITS[shift] for shift in _neighbours)] = _variant
+
+class TileGrid:
+    """
+    Array backed storage for on-grid tiles.
+    Tiles are held as a type id and a variant per cell, indexed [x - origin_x, y - origin_y].
+    Type id 0 is an empty cell.
+    """
+    def __init__(self):
+        self.type_names = ['']
+        self.type_ids = {'': 0}
+        self.physics_lut = np.zeros(1, dtype=bool)
+        self.autotile_lut = np.zeros(1, dtype=bool)
+        self.dirty_chunks = set()
+        self.clear()
+
+    def clear(self, origin=(0, 0), shape=(0, 0)):
+        self.origin = [int(origin[0]), int(origin[1])]
+        self.types = np.zeros(shape, dtype=np.uint8)
+        self.variants = np.zeros(shape, dtype=np.int16)
+        self.solid = np.zeros(shape, dtype=bool)
+        self.mark_all_dirty()
+
+    def mark_dirty(self, x, y):
+        self.dirty_chunks.add((x // CHUNK_SIZE, y // CHUNK_SIZE))
+
+    def mark_all_dirty(self):
+        self.dirty_all = True
+
+    def mark_region_dirty(self, x0, y0, x1, y1):
+        for cx in range(x0 // CHUNK_SIZE, x1 // CHUNK_SIZE + 1):
+            for cy in range(y0 // CHUNK_SIZE, y1 // CHUNK_SIZE + 1):
+                self.dirty_chunks.add((cx, cy))
+
+    def type_id(self, tile_type):
+        if tile_type not in self.type_ids:
+            self.type_ids[tile_type] = len(self.type_names)
+            self.type_names.append(tile_type)
+            self.physics_lut = np.append(self.physics_lut, tile_type in PHYSICS_TILES)
+            self.autotile_lut = np.append(self.autotile_lut, tile_type in AUTOTILE_TYPES)
+        return self.type_ids[tile_type]
+
+    def index(self, x, y):
+        i = x - self.origin[0]
+        j = y - self.origin[1]
+        if 0 <= i < self.types.shape[0] and 0 <= j < self.types.shape[1]:
+            return i, j
+        return None
+
+    def get(self, x, y):
+        i = x - self.origin[0]
+        j = y - self.origin[1]
+        if 0 <= i < self.types.shape[0] and 0 <= j < self.types.shape[1]:
+            return self.types[i, j]
+        return 0
+
+    def is_solid(self, x, y):
+        i = x - self.origin[0]
+        j = y - self.origin[1]
+        if 0 <= i < self.types.shape[0] and 0 <= j < self.types.shape[1]:
+            return self.solid[i, j]
+        return False
+
+    def solid_many(self, xs, ys):
+        # is_solid over arrays of tile coordinates
+        i = xs - self.origin[0]
+        j = ys - self.origin[1]
+        inside = (i >= 0) & (i < self.types.shape[0]) & (j >= 0) & (j < self.types.shape[1])
+        solid = np.zeros(len(i), dtype=bool)
+        solid[inside] = self.solid[i[inside], j[inside]]
+        return solid
+
+    def get_tile(self, x, y):
+        index = self.index(x, y)
+        if index is None or not self.types[index]:
+            return None
+        return {'type': self.type_names[self.types[index]], 'variant': int(self.variants[index]), 'pos': [x, y]}
+
+    def set(self, x, y, tile_type, variant):
+        if self.index(x, y) is None:
+            self.grow(x, y)
+        i, j = self.index(x, y)
+        type_id = self.type_id(tile_type)
+        self.types[i, j] = type_id
+        self.variants[i, j] = variant
+        self.solid[i, j] = self.physics_lut[type_id]
+        self.mark_dirty(x, y)
+
+    def delete(self, x, y):
+        index = self.index(x, y)
+        if index is None or not self.types[index]:
+            return False
+        self.types[index] = 0
+        self.variants[index] = 0
+        self.solid[index] = False
+        self.mark_dirty(x, y)
+        return True
+
+    def copy(self):
+        grid = TileGrid()
+        grid.type_names = list(self.type_names)
+        grid.type_ids = dict(self.type_ids)
+        grid.physics_lut = self.physics_lut.copy()
+        grid.autotile_lut = self.autotile_lut.copy()
+        grid.origin = list(self.origin)
+        grid.types = self.types.copy()
+        grid.variants = self.variants.copy()
+        grid.solid = self.solid.copy()
+        return grid
+
+    def delete_mask(self, mask):
+        self.types[mask] = 0
+        self.variants[mask] = 0
+        self.solid[mask] = False
+        self.mark_all_dirty()
+
+    def grow(self, x, y, padding=16):
+        width, height = self.types.shape
+        if not width or not height:
+            self.clear((x - padding, y - padding), (2 * padding + 1, 2 * padding + 1))
+            return
+
+        min_x = min(self.origin[0], x - padding)
+        min_y = min(self.origin[1], y - padding)
+        max_x = max(self.origin[0] + width, x + padding + 1)
+        max_y = max(self.origin[1] + height, y + padding + 1)
+        shift = (self.origin[0] - min_x, self.origin[1] - min_y)
+
+        types, variants, solid = self.types, self.variants, self.solid
+        self.clear((min_x, min_y), (max_x - min_x, max_y - min_y))
+        self.types[shift[0]:shift[0] + width, shift[1]:shift[1] + height] = types
+        self.variants[shift[0]:shift[0] + width, shift[1]:shift[1] + height] = variants
+        self.solid[shift[0]:shift[0] + width, shift[1]:shift[1] + height] = solid
+
+    def fill(self, mask, tile_type, variant, origin=(0, 0)):
+        self.clear(origin, mask.shape)
+        type_id = self.type_id(tile_type)
+        self.types[mask] = type_id
+        self.variants[mask] = variant
+        self.solid[mask] = self.physics_lut[type_id]
+
+    def replace_types(self, old_types, new_type):
+        old_ids = [self.type_ids[tile_type] for tile_type in old_types if tile_type in self.type_ids]
+        mask = np.isin(self.types, old_ids)
+        new_id = self.type_id(new_type)
+        self.types[mask] = new_id
+        self.solid[mask] = self.physics_lut[new_id]
+        self.mark_all_dirty()
+
+    def window(self, x0, y0, x1, y1):
+        # Type ids over an inclusive tile rect, empty outside the grid
+        window = np.zeros((x1 - x0 + 1, y1 - y0 + 1), dtype=np.uint8)
+        i0, j0 = max(x0 - self.origin[0], 0), max(y0 - self.origin[1], 0)
+        i1 = min(x1 - self.origin[0] + 1, self.types.shape[0])
+        j1 = min(y1 - self.origin[1] + 1, self.types.shape[1])
+        if i0 < i1 and j0 < j1:
+            wi, wj = i0 - (x0 - self.origin[0]), j0 - (y0 - self.origin[1])
+            window[wi:wi + i1 - i0, wj:wj + j1 - j0] = self.types[i0:i1, j0:j1]
+        return window
+
+    def type_mask(self, tile_type):
+        if tile_type not in self.type_ids:
+            return np.zeros(self.types.shape, dtype=bool)
+        return self.types == self.type_ids[tile_type]
+
+    def positions(self, mask=None):
+        return np.argwhere(self.types if mask is None else mask) + self.origin
+
+    def count(self):
+        return int(np.count_nonzero(self.types))
+
+    def from_dict(self, tiles):
+        if not tiles:
+            self.clear()
+            return
+
+        xs = np.array([int(tile['pos'][0]) for tile in tiles.values()])
+        ys = np.array([int(tile['pos'][1]) for tile in tiles.values()])
+        type_ids = np.array([self.type_id(tile['type']) for tile in tiles.values()], dtype=np.uint8)
+        variants = np.array([tile['variant'] for tile in tiles.values()], dtype=np.int16)
+
+        self.clear((xs.min(), ys.min()), (xs.max() - xs.min() + 1, ys.max() - ys.min() + 1))
+        self.types[xs - self.origin[0], ys - self.origin[1]] = type_ids
+        self.variants[xs - self.origin[0], ys - self.origin[1]] = variants
+        self.solid[:] = self.physics_lut[self.types]
+
+    def to_dict(self):
+        tiles = {}
+        for i, j in np.argwhere(self.types).tolist():
+            x, y = i + self.origin[0], j + self.origin[1]
+            tiles[str(x) + ';' + str(y)] = {'type': self.type_names[self.types[i, j]], 'variant': int(self.variants[i, j]), 'pos': [x, y]}
+        return tiles
+
+
+def map_source_hash(data):
+    # Hash of the bytes of a JSON map, stored in its compact copy to tell whether the two still match
+    return hashlib.sha1(data).hexdigest()
+
+
+def save_map_binary(path, grid, tile_size, offgrid_tiles, source=''):
+    offgrid_names = sorted({tile['type'] for tile in offgrid_tiles})
+    np.savez_compressed(path,
+                        version=MAP_BINARY_VERSION,
+                        source=np.array(source),
+                        tile_size=tile_size,
+                        origin=np.array(grid.origin, dtype=np.int32),
+                        type_names=np.array(grid.type_names),
+                        types=grid.types,
+                        variants=grid.variants,
+                        offgrid_names=np.array(offgrid_names, dtype=str),
+                        offgrid_types=np.array([offgrid_names.index(tile['type']) for tile in offgrid_tiles], dtype=np.uint8),
+                        offgrid_variants=np.array([tile['variant'] for tile in offgrid_tiles], dtype=np.int16),
+                        offgrid_pos=np.array([tile['pos'] for tile in offgrid_tiles], dtype=np.float64).reshape(-1, 2))
+
+
+def load_map_binary(path, source=None):
+    # Returns the same (grid, tile_size, offgrid_tiles) as a parsed JSON map.
+    # Given the hash of a JSON map, returns None instead unless the archive was converted from that JSON
+    with np.load(path) as data:
+        if source is not None and (int(data['version']) != MAP_BINARY_VERSION or str(data['source']) != source):
+            return None
+        if int(data['version']) != MAP_BINARY_VERSION:
+            raise ValueError(f'{path}: unsupported map version {int(data['version'])}')
+
+        grid = TileGrid()
+        type_ids = np.array([grid.type_id(str(tile_type)) for tile_type in data['type_names']], dtype=np.uint8)
+        grid.origin = [int(data['origin'][0]), int(data['origin'][1])]
+        grid.types = type_ids[data['types']]
+        grid.variants = data['variants'].astype(np.int16)
+        grid.solid = grid.physics_lut[grid.types]
+
+        offgrid_names = [str(tile_type) for tile_type in data['offgrid_names']]
+        offgrid_tiles = [{'type': offgrid_names[tile_type], 'variant': int(variant), 'pos': pos}
+                         for tile_type, variant, pos in zip(data['offgrid_types'].tolist(), data['offgrid_variants'].tolist(), data['offgrid_pos'].tolist())]
+        return grid, int(data['tile_size']), offgrid_tiles
+
+
+def file_stamp(path):
+    # (mtime, size) of a file, None if it does not exist
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class TileView(MutableMapping):
+    """
+    Dict style view of a TileGrid keyed by 'x;y' strings, matching the JSON map format.
+    Tiles read through the view are copies, so changes must be written back by assignment.
+    """
+    def __init__(self, grid):
+        self.grid = grid
+
+    @staticmethod
+    def parse_key(key):
+        try:
+            x_str, y_str = key.split(';')
+            return int(x_str), int(y_str)
+        except (AttributeError, ValueError):
+            raise KeyError(key)
+
+    def __getitem__(self, key):
+        tile = self.grid.get_tile(*self.parse_key(key))
+        if tile is None:
+            raise KeyError(key)
+        return tile
+
+    def __setitem__(self, key, tile):
+        x, y = self.parse_key(key)
+        self.grid.set(x, y, tile['type'], tile['variant'])
+
+    def __delitem__(self, key):
+        if not self.grid.delete(*self.parse_key(key)):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        try:
+            return bool(self.grid.get(*self.parse_key(key)))
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        for x, y in self.grid.positions().tolist():
+            yield str(x) + ';' + str(y)
+
+    def __len__(self):
+        return self.grid.count()
+
+    def copy(self):
+        return self.grid.to_dict()
+
+
+class OffgridIndex:
+    """
+    Coarse spatial buckets over the offgrid tiles, keyed by the bucket holding each tile's top left corner.
+    Tiles are also grouped by type so extract doesn't need to scan every decoration.
+    """
+    def __init__(self, bucket_size):
+        self.bucket_size = bucket_size
+        self.build([])
+
+    def build(self, tiles):
+        self.tiles = tiles
+        self.buckets = {}
+        self.types = {}
+        for tile in tiles:
+            self.insert(tile)
+
+    def bucket_of(self, pos):
+        return (int(pos[0] // self.bucket_size), int(pos[1] // self.bucket_size))
+
+    def insert(self, tile):
+        self.buckets.setdefault(self.bucket_of(tile['pos']), []).append(tile)
+        self.types.setdefault(tile['type'], []).append(tile)
+
+    def add(self, tile):
+        self.tiles.append(tile)
+        self.insert(tile)
+
+    def remove(self, tile):
+        self.tiles.remove(tile)
+        self.buckets[self.bucket_of(tile['pos'])].remove(tile)
+        self.types[tile['type']].remove(tile)
+
+    def remove_many(self, tiles):
+        removed = {id(tile) for tile in tiles}
+        self.build([tile for tile in self.tiles if id(tile) not in removed])
+
+    def of_type(self, tile_type):
+        return self.types.get(tile_type, [])
+
+    def query(self, x0, y0, x1, y1):
+        # All tiles with their top left corner inside the (inclusive) pixel rectangle
+        matches = []
+        for bx in range(int(x0 // self.bucket_size), int(x1 // self.bucket_size) + 1):
+            for by in range(int(y0 // self.bucket_size), int(y1 // self.bucket_size) + 1):
+                for tile in self.buckets.get((bx, by), []):
+                    if x0 <= tile['pos'][0] <= x1 and y0 <= tile['pos'][1] <= y1:
+                        matches.append(tile)
+        return matches
+
+
 class Tilemap:
     def __init__(self, game, tile_size=16):
         self.tile_size = tile_size
-        self.tilemap = {}
-        self.offgrid_tiles = []
+        self.grid = TileGrid()
+        self.tile_view = TileView(self.grid)
+        self.offgrid = OffgridIndex(CHUNK_SIZE * tile_size)
         self.map_size = 80
         self.game = game
         self.autotile_count = len(set(AUTOTILE_MAP.values()))
+        self.customise_shift = 0
+        self.chunk_cache = {}
+        self.pending_floor = None
+        self.map_cache = {}
+        self.sight_cache = {}
+        self.sight_frame = None
+        self.seed()
+
+    @property
+    def tilemap(self):
+        return self.tile_view
+
+    @tilemap.setter
+    def tilemap(self, tiles):
+        self.grid.from_dict(tiles)
+
+    @property
+    def offgrid_tiles(self):
+        return self.offgrid.tiles
+
+    @offgrid_tiles.setter
+    def offgrid_tiles(self, tiles):
+        self.offgrid.build(tiles)
+
+    def add_offgrid_tile(self, tile):
+        self.offgrid.add(tile)
+
+    def remove_offgrid_tile(self, tile):
+        self.offgrid.remove(tile)
+
+    def offgrid_in_rect(self, rect):
+        return self.offgrid.query(rect.left, rect.top, rect.right, rect.bottom)
+
+    def get_tile(self, tile_pos):
+        return self.grid.get_tile(int(tile_pos[0]), int(tile_pos[1]))
+
+    def tile_type(self, tile_pos):
+        return self.grid.type_names[self.grid.get(int(tile_pos[0]), int(tile_pos[1]))] or None
+
+    def has_tile(self, tile_pos):
+        return bool(self.grid.get(int(tile_pos[0]), int(tile_pos[1])))
+
+    def set_tile(self, tile_pos, tile_type, variant=0, autotile=False):
+        x, y = int(tile_pos[0]), int(tile_pos[1])
+        self.grid.set(x, y, tile_type, variant)
+        if autotile:
+            self.autotile_region(x - 1, y - 1, x + 1, y + 1)
+
+    def delete_tile(self, tile_pos, autotile=False):
+        x, y = int(tile_pos[0]), int(tile_pos[1])
+        deleted = self.grid.delete(x, y)
+        if deleted and autotile:
+            self.autotile_region(x - 1, y - 1, x + 1, y + 1)
+        return deleted
+
+    def tile_positions(self):
+        return self.grid.positions()
+
+    def replace_tile_types(self, old_types, new_type):
+        self.grid.replace_types(old_types, new_type)
 
     def render(self, surface, offset=(0, 0)):
-        # Render non-grid assets
-        for tile in self.offgrid_tiles:
+        # Render non-grid assets from the buckets overlapping the screen
+        margin = self.tile_size * 3
+        for tile in self.offgrid.query(offset[0] - margin, offset[1] - margin, offset[0] + self.game.screen_width / 2, offset[1] + self.game.screen_height / 2):
             posx = tile['pos'][0] - offset[0]
             if posx > self.game.screen_width / 2 or posx < -(self.tile_size*3):
                 continue
@@ -63,94 +486,135 @@ class Tilemap:
                 continue
 
             asset = self.game.assets[tile['type']][tile['variant']]
+            self.game.outlines.add(asset, (posx, posy))
             surface.blit(asset, (posx, posy))
 
-        # Render tiles
-        for x in range(offset[0] // self.tile_size, (offset[0] + surface.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size, (offset[1] + surface.get_height()) // self.tile_size + 1):
-                loc = str(x) + ';' + str(y)
-                if loc in self.tilemap:
-                    tile = self.tilemap[loc]
-
-                    asset = self.game.assets[tile['type']][tile['variant']]
-                    position = (tile['pos'][0] * self.tile_size - offset[0],
-                                tile['pos'][1] * self.tile_size - offset[1])
-                    surface.blit(asset, position)
+        # Render tiles from pre-rendered chunks
+        self.refresh_chunk_cache()
+        chunk_pixels = CHUNK_SIZE * self.tile_size
+        visible_chunks = set()
+        # Start one chunk early as oversized tiles can overhang into the next chunk
+        for cx in range(offset[0] // chunk_pixels - 1, (offset[0] + surface.get_width()) // chunk_pixels + 1):
+            for cy in range(offset[1] // chunk_pixels - 1, (offset[1] + surface.get_height()) // chunk_pixels + 1):
+                if (cx, cy) not in self.chunk_cache:
+                    self.chunk_cache[(cx, cy)] = self.bake_chunk(cx, cy)
+                visible_chunks.add((cx, cy))
+
+                chunk = self.chunk_cache[(cx, cy)]
+                if chunk is not None:
+                    self.game.outlines.add(chunk, (cx * chunk_pixels - offset[0], cy * chunk_pixels - offset[1]))
+                    surface.blit(chunk, (cx * chunk_pixels - offset[0], cy * chunk_pixels - offset[1]))
+
+        if len(self.chunk_cache) > CHUNK_CACHE_MAX:
+            for chunk_pos in [pos for pos in self.chunk_cache if pos not in visible_chunks]:
+                del self.chunk_cache[chunk_pos]
+
+    def refresh_chunk_cache(self):
+        # Drop chunks whose tiles have changed since they were rendered
+        grid = self.grid
+        if grid.dirty_all:
+            self.chunk_cache.clear()
+            grid.dirty_all = False
+        for chunk_pos in grid.dirty_chunks:
+            self.chunk_cache.pop(chunk_pos, None)
+        grid.dirty_chunks.clear()
+
+    def bake_chunk(self, cx, cy):
+        grid = self.grid
+        x0 = cx * CHUNK_SIZE - grid.origin[0]
+        y0 = cy * CHUNK_SIZE - grid.origin[1]
+        if x0 + CHUNK_SIZE <= 0 or y0 + CHUNK_SIZE <= 0:
+            return None
+
+        types = grid.types[max(x0, 0):x0 + CHUNK_SIZE, max(y0, 0):y0 + CHUNK_SIZE]
+        variants = grid.variants[max(x0, 0):x0 + CHUNK_SIZE, max(y0, 0):y0 + CHUNK_SIZE]
+        tiles = np.argwhere(types).tolist()
+        if not tiles:
+            return None
+
+        blits = []
+        width = height = CHUNK_SIZE * self.tile_size
+        for i, j in tiles:
+            asset = self.game.assets[grid.type_names[types[i, j]]][variants[i, j]]
+            position = ((i + max(x0, 0) - x0) * self.tile_size, (j + max(y0, 0) - y0) * self.tile_size)
+            width = max(width, position[0] + asset.get_width())
+            height = max(height, position[1] + asset.get_height())
+            blits.append((asset, position))
+
+        chunk = pygame.Surface((width, height), pygame.SRCALPHA)
+        chunk.blits(blits, doreturn=False)
+        # Bake the chunk's outline along with it
+        self.game.outlines.outline(chunk)
+        return chunk
 
     def render_colour_screen(self, surface, offset=(0, 0)):
         # Render tiles
-        for key in self.tilemap.keys():
-
-            tile = self.tilemap[key]
-            x_str, y_str = key.split(";")
-            x, y = float(x_str), float(y_str)
+        grid = self.grid
+        for i, j in np.argwhere(grid.types).tolist():
+            # Tiles scroll along a conveyor between x = 33 and x = 51
+            x = 33 + (i + grid.origin[0] - 33 - self.customise_shift) % 18
+            y = j + grid.origin[1]
 
             dist_to_dummy = np.linalg.norm((self.game.dummy_player.rect().centerx-(x*self.tile_size), self.game.dummy_player.rect().centery-(y*self.tile_size)))
             transparency = int(255 - 255*(dist_to_dummy / 200))
             transparency = -200 * math.atan((dist_to_dummy-130)/30) + 30
 
-            asset = self.game.assets[tile['type']][tile['variant']].copy()
+            asset = self.game.assets[grid.type_names[grid.types[i, j]]][grid.variants[i, j]].copy()
             asset.set_alpha(transparency)
-            position = (tile['pos'][0] * self.tile_size - offset[0],
-                        tile['pos'][1] * self.tile_size - offset[1])
+            position = (x * self.tile_size - offset[0],
+                        y * self.tile_size - offset[1])
             surface.blit(asset, position)
             
 
     def move_tiles_customise(self):
         #Move tiles:
-        keys = [key for key in self.tilemap.keys()]
-        for tile_key in keys:
-            x = self.tilemap[tile_key]['pos'][0]
-            y = self.tilemap[tile_key]['pos'][1]
-            newx = x - 0.05
-            newy = y
-
-            if newx < 33:
-                self.tilemap[f'{newx+18};{newy}'] = {'type': self.tilemap[tile_key]['type'], 'variant': self.tilemap[tile_key]['variant'], 'pos': [newx+18, newy]}
-            else:
-                self.tilemap[f'{newx};{newy}'] = {'type': self.tilemap[tile_key]['type'], 'variant': self.tilemap[tile_key]['variant'], 'pos': [newx, newy]}
-            del self.tilemap[tile_key]
+        self.customise_shift = (self.customise_shift + 0.05) % 18
 
-    def extract(self, search, keep=False):
+    def extract(self, search, keep=False, region=None):
         matches = []
+        grid = self.grid
+        mask = np.zeros(grid.types.shape, dtype=bool)
         if isinstance(search, list):
-            for tile in self.offgrid_tiles.copy():
+            candidates = []
+            for tile_type in dict.fromkeys(tile_type for tile_type, _ in search):
+                candidates += [tile for tile in self.offgrid.of_type(tile_type) if (tile['type'], tile['variant']) in search]
 
-                if (tile['type'], tile['variant']) in search:
-                    matches.append(tile.copy())
+            for tile_type, variant in search:
+                if tile_type in grid.type_ids:
+                    mask |= (grid.types == grid.type_ids[tile_type]) & (grid.variants == variant)
 
-                    if not keep:
-                        self.offgrid_tiles.remove(tile)
+        elif isinstance(search, str):
+            candidates = list(self.offgrid.of_type(search))
 
-            for loc in self.tilemap.copy():
-                tile = self.tilemap[loc]
-                if (tile['type'], tile['variant']) in search:
-                    matches.append(tile.copy())
-                    matches[-1]['pos'] = matches[-1]['pos'].copy()
-                    matches[-1]['pos'][0] *= self.tilesize
-                    matches[-1]['pos'][1] *= self.tilesize
+            if search in grid.type_ids:
+                mask = grid.types == grid.type_ids[search]
+        else:
+            candidates = []
 
-                    if not keep:
-                        del self.tilemap[loc]
-        elif isinstance(search, str):
-            for tile in self.offgrid_tiles.copy():
+        if region is not None:
+            candidates = [tile for tile in candidates if region.left <= tile['pos'][0] <= region.right and region.top <= tile['pos'][1] <= region.bottom]
 
-                if tile['type'] == search:
-                    matches.append(tile.copy())
+            region_mask = np.zeros(grid.types.shape, dtype=bool)
+            x0 = max(math.ceil(region.left / self.tilesize) - grid.origin[0], 0)
+            y0 = max(math.ceil(region.top / self.tilesize) - grid.origin[1], 0)
+            x1 = region.right // self.tilesize - grid.origin[0] + 1
+            y1 = region.bottom // self.tilesize - grid.origin[1] + 1
+            if x1 > 0 and y1 > 0:
+                region_mask[x0:x1, y0:y1] = True
+            mask &= region_mask
 
-                    if not keep:
-                        self.offgrid_tiles.remove(tile)
+        for tile in candidates:
+            matches.append(tile.copy())
+        if not keep:
+            self.offgrid.remove_many(candidates)
 
-            for loc in self.tilemap.copy():
-                tile = self.tilemap[loc]
-                if tile['type'] == search:
-                    matches.append(tile.copy())
-                    matches[-1]['pos'] = matches[-1]['pos'].copy()
-                    matches[-1]['pos'][0] *= self.tilesize
-                    matches[-1]['pos'][1] *= self.tilesize
+        for x, y in grid.positions(mask).tolist():
+            tile = grid.get_tile(x, y)
+            tile['pos'] = [x * self.tilesize, y * self.tilesize]
+            matches.append(tile)
 
-                    if not keep:
-                        del self.tilemap[loc]
+        if not keep:
+            grid.delete_mask(mask)
 
         return matches
 
@@ -159,14 +623,12 @@ class Tilemap:
         tile_pos = (int(pix_pos[0] // self.tile_size),
                     int(pix_pos[1] // self.tile_size))
         for offset in (NEIGHBOR_OFFSETS if not is_boss else NEIGHBOR_OFFSETS_EXTRA):
-            check_loc = str(tile_pos[0] + offset[0]) + \
-                ';' + str(tile_pos[1] + offset[1])
-
-            if check_loc in self.tilemap:
-                potential_tiles.append(self.tilemap[check_loc])
+            tile = self.grid.get_tile(tile_pos[0] + offset[0], tile_pos[1] + offset[1])
+            if tile is not None:
+                potential_tiles.append(tile)
         return potential_tiles
 
-    def load_random_tilemap(self, size, enemy_count_max=5, level_type='normal', level_style=''):
+    def load_random_tilemap(self, size, enemy_count_max=5, level_type='normal', level_style='', seed=None):
         if level_type != 'heaven_hell':
             level_style = level_type
             self.game.level_style = level_style
@@ -176,13 +638,92 @@ class Tilemap:
             self.game.level_style = level_style
 
         self.game.level_type = level_type
+        self.generate_floor(size, enemy_count_max, level_type, level_style, seed)
+
+    def generate_floor(self, size, enemy_count_max, level_type, level_style, seed=None):
+        # Only reads game state and only writes this tilemap, so it is safe to run on FLOOR_GENERATOR
+        if seed is not None:
+            self.seed(seed)
 
-        self.tilemap = self.generate_tiles(size, level_style)
+        self.generate_tiles(size, level_style)
         self.offgrid_tiles = self.populate_map(size, enemy_count_max, level_type, level_style)
         self.autotile()
 
+    def floor_plan(self, name):
+        # Size, enemy count and style of a generated floor, None if the floor is loaded from a map file
+        if name not in self.game.floors.keys() or name in ['final', 'dump']:
+            return None
+
+        specific_name = name
+        if name == 'heaven_hell':
+            specific_name = 'hell' if self.game.floors[name] % 2 == 0 else 'heaven'
+
+        actual_floor = (
+            self.game.floors[name] + (1 if name == 'infinite' else 0))
+        if actual_floor % self.game.boss_frequency == 0 and (actual_floor != 5 or name == 'infinite'):
+            return None
+
+        # All levels scale with floor:
+        enemy_count_max = int(self.game.floors[name])
+        size = int(5 * np.log(enemy_count_max ** 2) + 13 + enemy_count_max / 4)
+        if name == 'infinite':
+            enemy_count_max = int (enemy_count_max*1.5)
+            size += 5
+        return size, enemy_count_max, specific_name
+
+    def floor_key(self, name):
+        # All game state that generation depends on, a pre-generated floor is only used if this still matches
+        return (name, self.game.infinite_mode_active, tuple(self.game.characters_met.items()), tuple(self.game.floors.items()))
+
+    def pregenerate(self, name):
+        # Start generating the next floor in the background so the level transition does not hitch
+        self.pending_floor = None
+        plan = self.floor_plan(name)
+        if plan is None:
+            return
+
+        size, enemy_count_max, level_style = plan
+        if name == 'infinite':
+            level_style = self.game.get_random_level()
+
+        worker = Tilemap(self.game, self.tile_size)
+        worker.tilesize = self.tile_size
+        future = FLOOR_GENERATOR.submit(worker.generate_floor, size, enemy_count_max, name, level_style, int(self.rng.integers(2 ** 32)))
+        self.pending_floor = (self.floor_key(name), level_style, worker, future)
+
+    def load_pregenerated(self, name):
+        if self.pending_floor is None or self.pending_floor[0] != self.floor_key(name):
+            self.pregenerate(name)
+
+        _, level_style, worker, future = self.pending_floor
+        self.pending_floor = None
+        future.result()
+
+        self.grid = worker.grid
+        self.tile_view = worker.tile_view
+        self.offgrid = worker.offgrid
+        self.map_size = worker.map_size
+        self.game.level_style = level_style
+        self.game.level_type = name
+
+    def seed(self, seed=None):
+        # Generation draws only from this generator so a seeded floor is reproducible
+        self.rng = np.random.default_rng(seed)
+
+    def choice(self, options):
+        return options[int(self.rng.integers(len(options)))]
+
+    def weighted_choice(self, options, weights):
+        weights = np.asarray(weights, dtype=float)
+        return options[int(self.rng.choice(len(options), p=weights / weights.sum()))]
+
+    def weighted_choices(self, options, weights, count):
+        # count weighted_choice draws at once, the same picks as calling it count times in a row
+        weights = np.asarray(weights, dtype=float)
+        return [options[index] for index in self.rng.choice(len(options), size=count, p=weights / weights.sum()).tolist()]
+
     def generate_tiles(self, size, level_type):
-        tilemap = {}
+        rng = self.rng
 
         size = max(size, 10)
         vertex_num = int(size / 2)
@@ -199,62 +740,47 @@ class Tilemap:
 
         buffer = 22
         self.map_size = int(size + 2 * buffer)
+        low, high = buffer, self.map_size - buffer
 
-        map = np.zeros((self.map_size, self.map_size))
-        for i in range(self.map_size):
-            for j in range(self.map_size):
-                map[i, j] = 1
+        solid = np.ones((self.map_size, self.map_size), dtype=bool)
 
-        room_locations = []
-        for _ in range(vertex_num):
+        # Corridors branch out from the end of a previous corridor
+        room_locations = np.zeros((vertex_num, 2), dtype=int)
+        for n in range(vertex_num):
+            corridor_length = rng.integers(corridor_length_min, corridor_length_max + 1)
 
-            corridor_success = False
-            corridor_length = random.randint(
-                corridor_length_min, corridor_length_max)
-            while not corridor_success:
-
-                if len(room_locations) == 0:
-                    dig_pos = [random.randint(
-                        buffer, self.map_size - buffer), random.randint(buffer, self.map_size - buffer)]
+            while True:
+                if n == 0:
+                    dig_pos = rng.integers(low, high + 1, size=2)
                 else:
-                    dig_pos = random.choice(room_locations)
-
-                current_direction = [0, 0]
-                current_direction[random.randint(0, 1)] = random.choice([-1, 1])
-                new_pos = [dig_pos[0] + current_direction[0] * corridor_length,
-                          dig_pos[1] + current_direction[1] * corridor_length]
-
-                if new_pos[0] in range(buffer, self.map_size - buffer) and new_pos[1] in range(buffer, self.map_size - buffer):
-                    room_locations.append(new_pos)
-                    map[new_pos[1], new_pos[0]] = 0
-                    while dig_pos != new_pos:
-                        map[dig_pos[1], dig_pos[0]] = 0
-                        dig_pos[0] += current_direction[0]
-                        dig_pos[1] += current_direction[1]
-                    corridor_success = True
+                    dig_pos = room_locations[rng.integers(n)]
+
+                new_pos = dig_pos.copy()
+                new_pos[rng.integers(2)] += rng.choice((-1, 1)) * corridor_length
+                if np.all((new_pos >= low) & (new_pos < high)):
+                    break
+
+            room_locations[n] = new_pos
+            solid[min(dig_pos[0], new_pos[0]):max(dig_pos[0], new_pos[0]) + 1,
+                  min(dig_pos[1], new_pos[1]):max(dig_pos[1], new_pos[1]) + 1] = False
 
+        # Rooms are random walks from corridor ends, steps leaving the map are skipped
+        steps = np.array([(1, 0), (-1, 0), (0, 1), (0, -1)])
         for _ in range(room_count):
-            dig_pos = random.choice(room_locations)
-            current_room_count = 0
-
-            while current_room_count < room_size:
-                current_direction = [0, 0]
-                hori_vert = random.choice([0, 1])
-                current_direction[hori_vert] = random.choice([-1, 1])
-                new_pos = [dig_pos[0] + current_direction[0],
-                          dig_pos[1] + current_direction[1]]
-
-                if new_pos[0] in range(buffer, self.map_size - buffer) and new_pos[1] in range(buffer, self.map_size - buffer):
-                    map[new_pos[1], new_pos[0]] = 0
-                    dig_pos = new_pos
-                    current_room_count += 1
-
-        for i in range(self.map_size):
-            for j in range(self.map_size):
-                if map[i, j] == 1:
-                    tilemap[str(i) + ';' + str(j)
-                            ] = {'type': level_type, 'variant': 1, 'pos': [i, j]}
-        return tilemap
+            dig_pos = room_locations[rng.integers(vertex_num)]
+            remaining = int(room_size)
+
+            while remaining > 0:
+                path = dig_pos + np.cumsum(steps[rng.integers(4, size=remaining)], axis=0)
+                inside = np.all((path >= low) & (path < high), axis=1)
+                accepted = remaining if inside.all() else int(np.argmin(inside))
+
+                solid[path[:accepted, 0], path[:accepted, 1]] = False
+                if accepted:
+                    dig_pos = path[accepted - 1]
+                remaining -= accepted
+
+        self.grid.fill(solid, level_type, 1)
 
     def populate_map(self, size, enemy_count_max, level_type, level_style):
         offgrid_tiles = []
@@ -273,159 +799,167 @@ class Tilemap:
         cantor_placed = False
         melatos_placed = False
         enemy_count = 0
-        attempt_counter = 0
+        enemy_positions = []
 
-        while (not player_placed or not portal_placed or enemy_count < enemy_count_max or not infinite_portal_placed) and attempt_counter < 5000:
-            attempt_counter += 1
+        # Every empty cell with a floor below it, visited in random order
+        rect = (buffer, buffer, self.map_size - buffer - 1, self.map_size - buffer - 1)
+        candidates = np.argwhere((self.grid.window(*rect) == 0) & self.physics_mask(rect, [[0, 1]])) + (buffer, buffer)
 
-            y = random.choice(range(buffer, self.map_size - buffer))
-            x = random.choice(range(buffer, self.map_size - buffer))
-            loc = str(x) + ';' + str(y)
+        for x, y in self.rng.permutation(candidates).tolist():
+            if player_placed and portal_placed and enemy_count >= enemy_count_max and infinite_portal_placed:
+                break
 
-            # Important things:
-            if not self.is_tile([[x, y]]):
-                if self.is_physics_tile([[x, y+1]], count_portal = False):
+            # Player
+            if not player_placed:
+                self.set_tile((x, y), 'spawners', 0)
+                player_placed = True
 
-                    # Player
-                    if not player_placed:
-                        self.tilemap[loc] = {
-                            'type': 'spawners', 'variant': 0, 'pos': [x, y]}
-                        player_placed = True
+            # Portal
+            elif not portal_placed:
+                self.set_tile((x, y), 'spawnersPortal', 0)
+                portal_placed = True
 
-                    # Portal
-                    elif not portal_placed:
-                        self.tilemap[loc] = {
-                            'type': 'spawnersPortal', 'variant': 0, 'pos': [x, y]}
-                        portal_placed = True
+            # Infinite Portal
+            elif not infinite_portal_placed and self.game.infinite_mode_active:
+                infinite_portal_placed = True
 
-                    # Infinite Portal
-                    elif not infinite_portal_placed and self.game.infinite_mode_active:
-                        infinite_portal_placed = True
-
-                        self.tilemap[loc] = {
-                            'type': 'spawnersPortal', 'variant': 5, 'pos': [x, y]}
+                self.set_tile((x, y), 'spawnersPortal', 5)
                         
-                    # elif not skull_placed:
-                    #     self.tilemap[loc] = {
-                    #         'type': 'spawners', 'variant': 56, 'pos': [x, y]}
-                    #     skull_placed = True
-
-                    # Characters
-                    elif not self.game.characters_met['Noether'] and self.game.floors[level_type] > 5 and level_type == 'normal' and not noether_placed:
-                        self.tilemap[loc] = {'type': 'spawners', 'variant': 6, 'pos': [x, y]}
-                        noether_placed = True
-                    elif not self.game.characters_met['Lorenz'] and self.game.floors[level_type] > 8 and level_type == 'normal' and not lorenz_placed:
-                        self.tilemap[loc] = {'type': 'spawners', 'variant': 11, 'pos': [x, y]}
-                        lorenz_placed = True
-                    elif not self.game.characters_met['Curie'] and self.game.floors[level_type] > 10 and level_type == 'normal' and not curie_placed:
-                        self.tilemap[loc] = {'type': 'spawners', 'variant': 7, 'pos': [x, y]}
-                        curie_placed = True
-                    elif not self.game.characters_met['Planck'] and self.game.floors[level_type] > 13 and level_type == 'normal' and not planck_placed:
-                        self.tilemap[loc] = {'type': 'spawners', 'variant': 8, 'pos': [x, y]}
-                        planck_placed = True
-
-                    elif not self.game.characters_met['Franklin'] and self.game.floors[level_type] > 6 and level_type == 'spooky' and not franklin_placed:
-                        self.tilemap[loc] = {'type': 'spawners', 'variant': 14, 'pos': [x, y]}
-                        franklin_placed = True
-                    elif not self.game.characters_met['Rubik'] and self.game.floors[level_type] > 1 and level_type == 'rubiks' and not rubik_placed:
-                        self.tilemap[loc] = {'type': 'spawners', 'variant': 16, 'pos': [x, y]}
-                        rubik_placed = True
-                    elif not self.game.characters_met['Melatos'] and self.game.floors[level_type] > 3 and level_type == 'aussie' and not melatos_placed:
-                        self.tilemap[loc] = {'type': 'spawners', 'variant': 21, 'pos': [x, y]}
-                        melatos_placed = True
-                    elif not self.game.characters_met['Cantor'] and self.game.floors['infinite'] > 3 and not cantor_placed:
-                        self.tilemap[loc] = {'type': 'spawners', 'variant': 17, 'pos': [x, y]}
-                        cantor_placed = True
-
-                    # Add enemies:
-                    else:
-                        variant = random.choices(self.game.available_enemy_variants[level_style], self.game.available_enemy_variants[level_style + 'Weights'], k=1)[0]
-                        self.tilemap[loc] = {'type': 'spawners', 'variant': int(variant), 'pos': [x, y]}
-                        enemy_count += 1
+            # elif not skull_placed:
+            #     self.tilemap[loc] = {
+            #         'type': 'spawners', 'variant': 56, 'pos': [x, y]}
+            #     skull_placed = True
+
+            # Characters
+            elif not self.game.characters_met['Noether'] and self.game.floors[level_type] > 5 and level_type == 'normal' and not noether_placed:
+                self.set_tile((x, y), 'spawners', 6)
+                noether_placed = True
+            elif not self.game.characters_met['Lorenz'] and self.game.floors[level_type] > 8 and level_type == 'normal' and not lorenz_placed:
+                self.set_tile((x, y), 'spawners', 11)
+                lorenz_placed = True
+            elif not self.game.characters_met['Curie'] and self.game.floors[level_type] > 10 and level_type == 'normal' and not curie_placed:
+                self.set_tile((x, y), 'spawners', 7)
+                curie_placed = True
+            elif not self.game.characters_met['Planck'] and self.game.floors[level_type] > 13 and level_type == 'normal' and not planck_placed:
+                self.set_tile((x, y), 'spawners', 8)
+                planck_placed = True
+
+            elif not self.game.characters_met['Franklin'] and self.game.floors[level_type] > 6 and level_type == 'spooky' and not franklin_placed:
+                self.set_tile((x, y), 'spawners', 14)
+                franklin_placed = True
+            elif not self.game.characters_met['Rubik'] and self.game.floors[level_type] > 1 and level_type == 'rubiks' and not rubik_placed:
+                self.set_tile((x, y), 'spawners', 16)
+                rubik_placed = True
+            elif not self.game.characters_met['Melatos'] and self.game.floors[level_type] > 3 and level_type == 'aussie' and not melatos_placed:
+                self.set_tile((x, y), 'spawners', 21)
+                melatos_placed = True
+            elif not self.game.characters_met['Cantor'] and self.game.floors['infinite'] > 3 and not cantor_placed:
+                self.set_tile((x, y), 'spawners', 17)
+                cantor_placed = True
+
+            # Add enemies, their variants are drawn together below:
+            else:
+                enemy_positions.append((x, y))
+                enemy_count += 1
+
+        if enemy_positions:
+            variants = self.weighted_choices(self.game.available_enemy_variants[level_style], self.game.available_enemy_variants[level_style + 'Weights'], len(enemy_positions))
+            for pos, variant in zip(enemy_positions, variants):
+                self.set_tile(pos, 'spawners', int(variant))
 
         # Decorations
-        deco_num = 0
-        glowworm_count = 0
         glowwom_max = 15
         deco_num_max = math.ceil(size / 10 * self.game.floor_specifics[level_style]['decorationMod'])
         decoration_list = self.game.floor_specifics[level_style]['decorations']
-        weights = [deco[2] for deco in decoration_list]
-        attempt_counter = 0
         broken_machine_placed = False
 
-        while (deco_num < deco_num_max) and attempt_counter < 10*size**2:
-            attempt_counter += 1
-            x = random.choice(range(buffer, self.map_size - buffer))
-            y = random.choice(range(buffer, self.map_size - buffer))
-            loc = str(x) + ';' + str(y)
-
-            # Add random decorations
-            potential_decoration = random.choices(decoration_list, weights, k=1)[0]
-            if not self.is_physics_tile([[x, y]], offsets=potential_decoration[3], count_portal = True):
-                if self.is_physics_tile([[x, y]], offsets=potential_decoration[4][1:], mode=potential_decoration[4][0]):
-
-                    deco_offset_x = random.choice(potential_decoration[5][0])
-                    deco_offset_y = random.choice(potential_decoration[5][1])
-                    add_deco = {'type': potential_decoration[0], 'variant': random.choice(
-                        potential_decoration[1]), 'pos': [x * self.tile_size + deco_offset_x, y * self.tile_size + deco_offset_y]}
-                    if add_deco['variant'] != 22 or not broken_machine_placed:
-                        offgrid_tiles.append(add_deco)
-                    deco_num += 1
-                    if add_deco['variant'] == 22:
-                        broken_machine_placed = True
-
-            # Glowworms
-            if glowworm_count < glowwom_max:
-                to_add = {'type': 'spawners', 'variant': 5, 'pos': [
-                    self.tile_size * (x + random.random()), self.tile_size * (y + random.random())]}
-                offgrid_tiles.append(to_add)
-                glowworm_count += 1
+        # Valid anchors per decoration, with each decoration weighted by how many it has
+        deco_candidates = [np.argwhere(~self.physics_mask(rect, deco[3], count_portal = True) & self.physics_mask(rect, deco[4][1:], mode=deco[4][0])) + (buffer, buffer)
+                           for deco in decoration_list]
+        weights = [deco[2] * len(anchors) for deco, anchors in zip(decoration_list, deco_candidates)]
+
+        # Every decoration's type, anchor, offset and variant are drawn up front
+        deco_indices = self.weighted_choices(range(len(decoration_list)), weights, deco_num_max) if sum(weights) > 0 else []
+        picks = self.rng.random((len(deco_indices), 4)).tolist()
+        for deco_index, (anchor_pick, x_pick, y_pick, variant_pick) in zip(deco_indices, picks):
+            potential_decoration = decoration_list[deco_index]
+            anchors = deco_candidates[deco_index]
+            x, y = anchors[int(anchor_pick * len(anchors))].tolist()
+
+            deco_offset_x = potential_decoration[5][0][int(x_pick * len(potential_decoration[5][0]))]
+            deco_offset_y = potential_decoration[5][1][int(y_pick * len(potential_decoration[5][1]))]
+            add_deco = {'type': potential_decoration[0], 'variant': potential_decoration[1][int(variant_pick * len(potential_decoration[1]))],
+                        'pos': [x * self.tile_size + deco_offset_x, y * self.tile_size + deco_offset_y]}
+            if add_deco['variant'] != 22 or not broken_machine_placed:
+                offgrid_tiles.append(add_deco)
+            if add_deco['variant'] == 22:
+                broken_machine_placed = True
+
+        # Glowworms
+        glowworm_tiles = self.rng.integers(buffer, self.map_size - buffer, size=(glowwom_max, 2))
+        glowworm_fractions = self.rng.random((glowwom_max, 2))
+        for (x, y), (fx, fy) in zip(glowworm_tiles.tolist(), glowworm_fractions.tolist()):
+            to_add = {'type': 'spawners', 'variant': 5, 'pos': [
+                self.tile_size * (x + fx), self.tile_size * (y + fy)]}
+            offgrid_tiles.append(to_add)
 
         return offgrid_tiles
 
+    def physics_mask(self, rect, offsets=[[0, 0]], mode='any', count_portal = False):
+        # is_physics_tile for every anchor in an inclusive tile rect at once
+        x0, y0, x1, y1 = rect
+        if mode == 'clear':
+            return np.ones((x1 - x0 + 1, y1 - y0 + 1), dtype=bool)
+        grid = self.grid
+        lut = grid.physics_lut.copy()
+        if count_portal and 'spawnersPortal' in grid.type_ids:
+            lut[grid.type_ids['spawnersPortal']] = True
+        masks = [lut[grid.window(x0 + dx, y0 + dy, x1 + dx, y1 + dy)] for dx, dy in offsets]
+        return np.logical_and.reduce(masks) if mode == 'all' else np.logical_or.reduce(masks)
+
     def is_physics_tile(self, poss, offsets=[[0, 0]], mode='any', count_portal = False):
         if mode == 'clear':
             return True
+        grid = self.grid
+        portal_id = grid.type_ids.get('spawnersPortal', 0) if count_portal else 0
         for pos in poss:
             for offset in offsets:
-                loc = str(pos[0] + offset[0]) + ';' + str(pos[1] + offset[1])
+                type_id = grid.get(pos[0] + offset[0], pos[1] + offset[1])
 
                 if mode == 'all':
-                    if loc in self.tilemap:
-                        if self.tilemap[loc]['type'] not in PHYSICS_TILES:
-                            return False
-
-                    else:
+                    if not grid.physics_lut[type_id]:
                         return False
 
                 elif mode == 'any':
-                    if loc in self.tilemap:
-                        if self.tilemap[loc]['type'] in PHYSICS_TILES or (self.tilemap[loc]['type'] == 'spawnersPortal' and count_portal):
-                            return True
+                    if grid.physics_lut[type_id] or (portal_id and type_id == portal_id):
+                        return True
 
         return True if mode == 'all' else False
 
     def is_tile(self, poss, offsets=[[0, 0]], mode='any'):
         for pos in poss:
             for offset in offsets:
-                loc = str(pos[0] + offset[0]) + ';' + str(pos[1] + offset[1])
+                occupied = self.grid.get(pos[0] + offset[0], pos[1] + offset[1])
 
                 if mode == 'all':
-                    if loc in self.tilemap:
-                        return False
-
-                    else:
+                    if not occupied:
                         return False
 
                 elif mode == 'any':
-                    if loc in self.tilemap:
+                    if occupied:
                         return True
         return True if mode == 'all' else False
 
     def save_tilemap(self, path):
+        # The compact copy records the JSON this map saves as, so it is used next to an identical JSON save
+        data = json.dumps({'tilemap': self.grid.to_dict(), 'tile_size': self.tile_size,
+                           'offgrid': self.offgrid_tiles})
+        if path.endswith(MAP_BINARY_EXT):
+            save_map_binary(path, self.grid, self.tile_size, self.offgrid_tiles, source=map_source_hash(data.encode()))
+            return
+
         f = open(path, 'w')
-        json.dump({'tilemap': self.tilemap, 'tile_size': self.tile_size,
-                  'offgrid': self.offgrid_tiles}, f)
+        f.write(data)
         f.close()
 
     def load_tilemap(self, name=''):
@@ -445,17 +979,9 @@ class Tilemap:
                 filepath = 'data/maps/' + str(specific_name) + 'Boss.json'
                 self.game.level_style = specific_name
 
-            # Normal levels:
+            # Normal levels, usually already generated during the transition:
             else:
-                # All levels scale with floor:
-                enemy_count_max = int(self.game.floors[name])
-                size = int(5 * np.log(enemy_count_max ** 2) + 13 + enemy_count_max / 4)
-                if name == 'infinite':
-                    enemy_count_max = int (enemy_count_max*1.5)
-                    size += 5
-
-                self.load_random_tilemap(
-                    size, enemy_count_max, level_type=name, level_style=specific_name)
+                self.load_pregenerated(name)
                 return ()
 
         # Only for level editor
@@ -467,6 +993,7 @@ class Tilemap:
             filepath = filedialog.askopenfilename(initialdir=currdir,
                                                   title="Open map",
                                                   filetypes=(("JSON Files", "*.json*"),
+                                                             ("Compact Maps", "*" + MAP_BINARY_EXT),
                                                              ("All Files", "*.*")))
 
         # Otherwise try to open file eg for lobby.
@@ -474,15 +1001,13 @@ class Tilemap:
             filepath = 'data/maps/' + str(name) + '.json'
             self.game.level_style = name
 
-        f = open(filepath, 'r')
-        map_data = json.load(f)
-        f.close()
-
-        self.tilemap = map_data['tilemap']
-        self.tilesize = map_data['tile_size']
-        self.offgrid_tiles = map_data['offgrid']
+        grid, tile_size, offgrid_tiles = self.map_template(filepath)
+        self.grid = grid.copy()
+        self.tile_view = TileView(self.grid)
+        self.tilesize = tile_size
+        self.offgrid_tiles = [{'type': tile['type'], 'variant': tile['variant'], 'pos': list(tile['pos'])} for tile in offgrid_tiles]
 
-        if filepath.endswith('infiniteBoss.json'):
+        if os.path.splitext(filepath)[0].endswith('infiniteBoss'):
             # Decide which boss spawners to keep:
 
             type_to_spawner = {
@@ -512,75 +1037,266 @@ class Tilemap:
                     elif spawner['variant'] == 29 and keep_meteor_baits:
                         pass
                     else:
-                        del self.tilemap[str(int(spawner['pos'][0] // self.tile_size)) + ';' + str(
-                            int(spawner['pos'][1] // self.tile_size))]
+                        self.delete_tile((spawner['pos'][0] // self.tile_size, spawner['pos'][1] // self.tile_size))
+
+    def map_template(self, filepath):
+        # Parsed maps are kept until their files change, loading copies them rather than re-reading the map.
+        # A JSON map is read from its compact copy while that was converted from the JSON as it is now,
+        # a JSON edited without re-running convert_maps.py is loaded instead
+        binary_path = None if filepath.endswith(MAP_BINARY_EXT) else os.path.splitext(filepath)[0] + MAP_BINARY_EXT
+        stamps = (file_stamp(filepath), file_stamp(binary_path) if binary_path else None)
+        cached = self.map_cache.get(filepath)
+        if cached is not None and cached[0] == stamps:
+            return cached[2:]
+
+        template = None
+        source = None
+        if binary_path is None:
+            template = load_map_binary(filepath)
+        elif stamps[1] is not None and stamps[0] is None:
+            template = load_map_binary(binary_path)
+        elif stamps[1] is not None:
+            # The JSON is only hashed again when it has changed since it was last checked
+            if cached is not None and cached[0][0] == stamps[0]:
+                source = cached[1]
+            else:
+                with open(filepath, 'rb') as f:
+                    source = map_source_hash(f.read())
+            template = load_map_binary(binary_path, source)
+
+        if template is None:
+            with open(filepath, 'rb') as f:
+                data = f.read()
+            source = map_source_hash(data)
+            map_data = json.loads(data)
+            grid = TileGrid()
+            grid.from_dict(map_data['tilemap'])
+            template = (grid, map_data['tile_size'], map_data['offgrid'])
+        self.map_cache[filepath] = (stamps, source, *template)
+        return template
 
     def solid_check(self, pos, return_value=''):
-        tile_loc = str(int(pos[0]) // self.tile_size) + \
-            ';' + str(int(pos[1]) // self.tile_size)
-        if tile_loc in self.tilemap:
-            if self.tilemap[tile_loc]['type'] in PHYSICS_TILES:
-                if return_value == 'pos':
-                    return tuple(self.tilemap[tile_loc]['pos'])
-                elif return_value == 'bool':
-                    return True
-                else:
-                    return self.tilemap[tile_loc]
+        tile_x = int(pos[0]) // self.tile_size
+        tile_y = int(pos[1]) // self.tile_size
+        if self.grid.is_solid(tile_x, tile_y):
+            if return_value == 'pos':
+                return (tile_x, tile_y)
             elif return_value == 'bool':
-                return False
+                return True
+            else:
+                return self.grid.get_tile(tile_x, tile_y)
         elif return_value == 'bool':
             return False
 
-    def autotile(self, windows=True):
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-
-            # Rubik's level randomising
-            if tile['type'] == 'rubiks':
-                tile['variant'] = random.choice(range(0, 6))
-                continue
-
-            # Tunnel correction
-            if tile['type'] == 'cracked':
-                tile['variant'] = 4
-                for int, shift in enumerate([(0, 1), (0, -1), (1, 0), (-1, 0)]):
-                    check_loc = str(tile['pos'][0] + shift[0]) + ';' + str(tile['pos'][1] + shift[1])
-                    if check_loc not in self.tilemap:
-                        tile['variant'] = int
-                        continue
-                continue
-
-            neighbours = set()
-            for shift in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-                check_loc = str(tile['pos'][0] + shift[0]) + ';' + str(tile['pos'][1] + shift[1])
-                if check_loc in self.tilemap:
+    def neighbour_masks(self, padded):
+        # Autotile bitmask and cracked tile variant for each cell inside a type window padded by one
+        occupied = padded != 0
+        connects = self.grid.autotile_lut[padded]
+        shape = (padded.shape[0] - 2, padded.shape[1] - 2)
+        neighbour_mask = np.zeros(shape, dtype=np.int16)
+        cracked_variants = np.full(shape, 4, dtype=np.int16)
+        for n, (shift, bit) in enumerate(AUTOTILE_BITS.items()):
+            window = (slice(1 + shift[0], padded.shape[0] - 1 + shift[0]),
+                      slice(1 + shift[1], padded.shape[1] - 1 + shift[1]))
+            neighbour_mask[connects[window]] |= bit
+            cracked_variants[~occupied[window]] = n
+        return neighbour_mask, cracked_variants
+
+    def autotile_region(self, x0, y0, x1, y1):
+        # Re-autotile an inclusive tile rect after a local edit, O(rect) rather than O(map)
+        grid = self.grid
+        i0, j0 = max(x0 - grid.origin[0], 0), max(y0 - grid.origin[1], 0)
+        i1 = min(x1 - grid.origin[0] + 1, grid.types.shape[0])
+        j1 = min(y1 - grid.origin[1] + 1, grid.types.shape[1])
+        if i0 >= i1 or j0 >= j1:
+            return
+
+        types = grid.types[i0:i1, j0:j1]
+        variants = grid.variants[i0:i1, j0:j1]
+        x0, y0 = i0 + grid.origin[0], j0 + grid.origin[1]
+        x1, y1 = i1 - 1 + grid.origin[0], j1 - 1 + grid.origin[1]
+        neighbour_mask, cracked_variants = self.neighbour_masks(grid.window(x0 - 1, y0 - 1, x1 + 1, y1 + 1))
+
+        # Rubik's tiles keep their colour, cracked tiles follow the open side
+        rubiks = types == grid.type_ids.get('rubiks', -1)
+        cracked = types == grid.type_ids.get('cracked', -1)
+        variants[cracked] = cracked_variants[cracked]
+
+        # Windows and decorations survive as long as the tile is still a centre tile
+        autotile_variants = AUTOTILE_LUT[neighbour_mask]
+        autotiled = grid.autotile_lut[types] & ~rubiks & ~cracked & (autotile_variants >= 0)
+        autotiled &= ~((autotile_variants == 5) & (variants >= self.autotile_count))
+        variants[autotiled] = autotile_variants[autotiled]
+
+        grid.mark_region_dirty(x0, y0, x1, y1)
 
-                    if self.tilemap[check_loc]['type'] in AUTOTILE_TYPES:
-                        neighbours.add(shift)
-
-            neighbours = tuple(sorted(neighbours))
-
-            if (tile['type'] in AUTOTILE_TYPES) and (neighbours in AUTOTILE_MAP):
-                if AUTOTILE_MAP[neighbours] == 5 and windows == True:
-
-                    window_choice = random.choice(range(self.autotile_count, self.autotile_count + 3))
-                    tile['variant'] = window_choice if random.random() < 0.03 else 5
-
-                    if tile['type'] in ['grass', 'space', 'heaven'] and random.random() < (0.4 if tile['type'] == 'grass' else 0.1):
-                        tile['variant'] = random.choice(range(self.autotile_count + 3, len(self.game.assets[tile['type']])))
-
-                    elif tile['type'] == 'spooky' and random.random() < 0.005:
-                        self.offgrid_tiles.append({'type': 'spawners', 'variant': 24, 'pos': [tile['pos'][0] * self.tilesize, tile['pos'][1] * self.tilesize]})
-                        variant = random.choice(range(self.autotile_count + 3, len(self.game.assets[tile['type']])))
-                        tile['variant'] = variant
-
-                else:
-                    tile['variant'] = AUTOTILE_MAP[neighbours]
+    def autotile(self, windows=True):
+        grid = self.grid
+        types = grid.types
+        variants = grid.variants
+
+        # Neighbour bitmasks for the whole map in one pass
+        neighbour_mask, cracked_variants = self.neighbour_masks(np.pad(types, 1))
+
+        # Rubik's level randomising
+        rubiks = grid.type_mask('rubiks')
+        variants[rubiks] = self.rng.integers(0, 6, size=np.count_nonzero(rubiks))
+
+        # Tunnel correction
+        cracked = grid.type_mask('cracked')
+        variants[cracked] = cracked_variants[cracked]
+
+        autotile_variants = AUTOTILE_LUT[neighbour_mask]
+        autotiled = grid.autotile_lut[types] & ~rubiks & ~cracked & (autotile_variants >= 0)
+        variants[autotiled] = autotile_variants[autotiled]
+
+        if windows:
+            centre = autotiled & (autotile_variants == 5)
+            count = np.count_nonzero(centre)
+            window_variants = self.rng.integers(self.autotile_count, self.autotile_count + 3, size=count)
+            variants[centre] = np.where(self.rng.random(count) < 0.03, window_variants, 5)
+
+            decoration_roll = self.rng.random(types.shape)
+            for tile_type, chance in (('grass', 0.4), ('space', 0.1), ('heaven', 0.1), ('spooky', 0.005)):
+                decorated = centre & grid.type_mask(tile_type) & (decoration_roll < chance)
+                count = np.count_nonzero(decorated)
+                if not count:
+                    continue
+
+                variants[decorated] = self.rng.integers(self.autotile_count + 3, len(self.game.assets[tile_type]), size=count)
+                if tile_type == 'spooky':
+                    for x, y in grid.positions(decorated).tolist():
+                        self.add_offgrid_tile({'type': 'spawners', 'variant': 24, 'pos': [x * self.tilesize, y * self.tilesize]})
+
+        grid.mark_all_dirty()
+
+    def raycast(self, start, end):
+        # Walks every tile the segment passes through (Amanatides-Woo), first tile hit and where, or None if clear
+        x0, y0 = start[0] / self.tile_size, start[1] / self.tile_size
+        x1, y1 = end[0] / self.tile_size, end[1] / self.tile_size
+        tile_x, tile_y = math.floor(x0), math.floor(y0)
+        end_x, end_y = math.floor(x1), math.floor(y1)
+        dx, dy = x1 - x0, y1 - y0
+
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        delta_x = abs(1 / dx) if dx else math.inf
+        delta_y = abs(1 / dy) if dy else math.inf
+        next_x = ((tile_x + 1 - x0) if dx > 0 else (x0 - tile_x)) * delta_x if dx else math.inf
+        next_y = ((tile_y + 1 - y0) if dy > 0 else (y0 - tile_y)) * delta_y if dy else math.inf
+
+        t = 0
+        for _ in range(abs(end_x - tile_x) + abs(end_y - tile_y) + 1):
+            if self.grid.get(tile_x, tile_y):
+                return (tile_x, tile_y), (start[0] + t * (end[0] - start[0]), start[1] + t * (end[1] - start[1]))
+            if next_x < next_y:
+                tile_x += step_x
+                t = next_x
+                next_x += delta_x
+            else:
+                tile_y += step_y
+                t = next_y
+                next_y += delta_y
+        return None
+
+    def lines_of_sight(self, starts, end):
+        # Batched raycast from many points to one target, all rays step together
+        # Results go into this frame's sight cache so line_of_sight calls for the same rays are free
+        starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+        grid = self.grid
+        pos = starts / self.tile_size
+        target = np.asarray(end, dtype=float) / self.tile_size
+        tiles = np.floor(pos).astype(int)
+        steps = np.abs(np.floor(target).astype(int) - tiles).sum(axis=1) + 1
+        delta = target - pos
+        step = np.where(delta > 0, 1, -1)
+        with np.errstate(divide='ignore'):
+            t_delta = np.where(delta != 0, np.abs(1 / delta), np.inf)
+        t_next = np.where(delta != 0, np.where(delta > 0, tiles + 1 - pos, pos - tiles) * t_delta, np.inf)
+
+        clear = np.ones(len(starts), dtype=bool)
+        active = np.ones(len(starts), dtype=bool)
+        for n in range(int(steps.max(initial=0))):
+            active &= steps > n
+            i, j = tiles[:, 0] - grid.origin[0], tiles[:, 1] - grid.origin[1]
+            inside = active & (i >= 0) & (i < grid.types.shape[0]) & (j >= 0) & (j < grid.types.shape[1])
+            hit = np.zeros(len(starts), dtype=bool)
+            hit[inside] = grid.types[i[inside], j[inside]] != 0
+            clear &= ~hit
+            active &= ~hit
+
+            axis = (t_next[:, 1] <= t_next[:, 0]).astype(int)
+            rows = np.arange(len(starts))
+            tiles[rows, axis] += step[rows, axis]
+            t_next[rows, axis] += t_delta[rows, axis]
+
+        cache = self.frame_sight_cache()
+        for start, visible in zip(starts.tolist(), clear.tolist()):
+            cache[(*start, *end)] = visible
+        return clear
+
+    def line_of_sight(self, start, end):
+        cache = self.frame_sight_cache()
+        key = (*start, *end)
+        if key not in cache:
+            cache[key] = self.raycast(start, end) is None
+        return cache[key]
+
+    def frame_sight_cache(self):
+        if self.sight_frame != self.game.frame_count:
+            self.sight_cache = {}
+            self.sight_frame = self.game.frame_count
+        return self.sight_cache
 
     def physics_rects_around(self, pos, is_boss=False):
         rects = []
-        for tile in self.nearby_tiles(pos, is_boss=is_boss):
-            if tile['type'] in PHYSICS_TILES:
+        tile_pos = (int(pos[0] // self.tile_size),
+                    int(pos[1] // self.tile_size))
+        for offset in (NEIGHBOR_OFFSETS if not is_boss else NEIGHBOR_OFFSETS_EXTRA):
+            if self.grid.is_solid(tile_pos[0] + offset[0], tile_pos[1] + offset[1]):
                 rects.append(pygame.Rect(
-                    tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size, self.tile_size))
+                    (tile_pos[0] + offset[0]) * self.tile_size, (tile_pos[1] + offset[1]) * self.tile_size, self.tile_size, self.tile_size))
         return rects
+
+    def sweep_axis(self, pos, size, axis, movement, is_boss=False):
+        # physics_rects_around and colliderect in integer tile maths, visiting the same tiles in the same order
+        # Returns the corrected rect position, the sides hit (backwards, forwards) and the last tile hit
+        tile_size = self.tile_size
+        rect = [int(pos[0]), int(pos[1])]
+        width, height = int(size[0]), int(size[1])
+        hit_back = hit_forward = False
+        last_hit = None
+        if width <= 0 or height <= 0:
+            return rect, hit_back, hit_forward, last_hit
+
+        radius = 2 if is_boss else 1
+        centre_x = (rect[0] + width // 2) // tile_size
+        centre_y = (rect[1] + height // 2) // tile_size
+        extent = width if axis == 0 else height
+        solid = self.grid.solid
+        origin_x, origin_y = self.grid.origin
+        grid_width, grid_height = solid.shape
+        for tile_x in range(centre_x - radius, centre_x + radius + 1):
+            i = tile_x - origin_x
+            if i < 0 or i >= grid_width:
+                continue
+            tile_left = tile_x * tile_size
+            for tile_y in range(centre_y - radius, centre_y + radius + 1):
+                tile_top = tile_y * tile_size
+                if (tile_left >= rect[0] + width or rect[0] >= tile_left + tile_size or
+                        tile_top >= rect[1] + height or rect[1] >= tile_top + tile_size):
+                    continue
+                j = tile_y - origin_y
+                if j < 0 or j >= grid_height or not solid[i, j]:
+                    continue
+
+                tile_edge = tile_left if axis == 0 else tile_top
+                if movement > 0:
+                    rect[axis] = tile_edge - extent
+                    hit_forward = True
+                elif movement < 0:
+                    rect[axis] = tile_edge + tile_size
+                    hit_back = True
+                last_hit = (tile_x, tile_y)
+
+        return rect, hit_back, hit_forward, last_hit
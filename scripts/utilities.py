@@ -4,14 +4,26 @@ Includes animation management, entity information loading.
 """
 
 import os
+import collections
 import numpy as np
 import math
 import pygame
 if __name__ != '__main__':
     import scripts.entities as _entities
     import scripts.characters as _characters
+    import scripts.entity_manager as _entity_manager
+    import scripts.projectiles as _projectiles
+    import scripts.spark as _spark
+    import scripts.particle as _particle
+    import scripts.outline as _outline
+    import scripts.lighting as _lighting
+    import scripts.text as _text
 
 BASE_PATH = 'data/images/'
+# Transformed animation frames are kept up to this many bytes, least recently used go first:
+VARIANT_CACHE_BYTES = 32 * 1024 * 1024
+# Rotations are rounded to this many degrees so transformed frames can be reused:
+ROTATION_STEP = 1
 
 def load_image(path, dim=False):
     """Load in an image from file ignoring (0, 0, 0) pixels.
@@ -73,6 +85,7 @@ def initialise_main_screen(game):
     
     game.hud_display = pygame.Surface((game.screen_width, game.screen_height))
     game.hud_display.set_colorkey((0, 0, 0))
+    game.text = _text.TextRenderer()
     game.draw_text('Loading...', (game.screen_width / 2, game.screen_height / 2),
                    game.text_font, (86, 31, 126), scale=4, mode='center')
     game.screen.blit(pygame.transform.scale(game.hud_display, game.screen.get_size()), (0, 0))
@@ -125,7 +138,20 @@ def initialise_game_params(game):
     game.confirm_kill = False
     game.min_pause_darkness = 150
     game.transition = 0
-    game.currency_entities = []
+
+    # Every dynamic entity list lives in the entity manager:
+    game.entities = _entity_manager.EntityManager()
+    game.portals = game.entities.group('portals')
+    game.enemies = game.entities.group('enemies')
+    game.bosses = game.entities.group('bosses')
+    game.characters = game.entities.group('characters')
+    game.spawn_points = game.entities.group('spawn_points')
+    game.currency_entities = game.entities.group('currency_entities')
+    game.extra_entities = game.entities.group('extra_entities')
+    game.projectiles = _projectiles.ProjectilePool(game)
+    game.arcs = game.entities.group('arcs')
+    game.sparks = _spark.SparkPool()
+    game.particles = _particle.ParticlePool(game)
     game.boss_frequency = 5
     game.dump_arc = 0
 
@@ -396,7 +422,8 @@ def initialise_game_params(game):
     # overlay displays
     game.display_outline = pygame.Surface((game.screen_width / 2, game.screen_height / 2), pygame.SRCALPHA)
     game.display = pygame.Surface((game.screen_width / 2, game.screen_height / 2))
-    game.darkness_surface = pygame.Surface(game.display_outline.get_size(), pygame.SRCALPHA)
+    game.lighting = _lighting.Lighting(game.display_outline.get_size())
+    game.outlines = _outline.OutlineLayer(game.display_outline.get_size())
 
     # VALUES THAT SAVE
     game.max_health = 1
@@ -794,27 +821,78 @@ def reset_music(game):
 def detect_joysticks(game):
     game.joysticks = [pygame.joystick.Joystick(x) for x in range(pygame.joystick.get_count())]
 
+class VariantCache:
+    """
+    Least recently used cache of transformed animation frames, capped by the bytes of the surfaces held.
+    """
+    def __init__(self, max_bytes=VARIANT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.surfaces = collections.OrderedDict()
+
+    def get(self, key):
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+        return surface
+
+    def put(self, key, surface):
+        self.surfaces[key] = surface
+        self.bytes += surface.get_width() * surface.get_height() * surface.get_bytesize()
+        while self.bytes > self.max_bytes and len(self.surfaces) > 1:
+            _, evicted = self.surfaces.popitem(last=False)
+            self.bytes -= evicted.get_width() * evicted.get_height() * evicted.get_bytesize()
+
 class Animation:
+    """
+    Animation clip shared by everything playing it: the frames, frame duration, loop flag
+    and the index of the frame shown on every tick. AnimationState plays it.
+    """
+    # Shared by every animation, keyed by the frame surface so everything playing a clip shares its variants
+    variants = VariantCache()
+
     def __init__(self, images, img_dur=5, loop=True):
         self.images = images
         self.img_duration = img_dur
         self.loop = loop
-        self.done = False
-        self.frame = 0
+        self.length = img_dur * len(images)
+        self.frame_table = [index for index in range(len(images)) for _ in range(img_dur)]
 
-    def copy(self):
-        """Copy Animation object.
+    def play(self):
+        """Start playing the Animation from its first frame.
 
         Args:
             none
         Returns:
-            Animation object.
+            AnimationState object.
 
         """
-        return Animation(self.images, self.img_duration, self.loop)
+        return AnimationState(self)
+
+class AnimationState:
+    """
+    Playback position in an Animation clip. Setting img_duration changes the speed of this playback only.
+    """
+    __slots__ = ('clip', 'frame', 'done', 'duration', 'length')
+
+    def __init__(self, clip):
+        self.clip = clip
+        self.frame = 0
+        self.done = False
+        self.duration = clip.img_duration
+        self.length = clip.length
+
+    @property
+    def img_duration(self):
+        return self.duration
+
+    @img_duration.setter
+    def img_duration(self, value):
+        self.duration = value
+        self.length = value * len(self.clip.images)
 
     def update(self):
-        """Update Animation object's frame.
+        """Update AnimationState object's frame.
 
         Args:
             none
@@ -822,16 +900,16 @@ class Animation:
             none
 
         """
-        if self.loop:
-            self.frame = (self.frame + 1) % (self.img_duration * len(self.images))
+        if self.clip.loop:
+            self.frame = (self.frame + 1) % self.length
 
         else:
-            self.frame = min(self.frame + 1, self.img_duration * len(self.images) - 1)
-            if self.frame >= self.img_duration * len(self.images) - 1:
+            self.frame = min(self.frame + 1, self.length - 1)
+            if self.frame >= self.length - 1:
                 self.done = True
 
     def img(self):
-        """Get current frame of Animation object.
+        """Get current frame of AnimationState object.
 
         Args:
             none
@@ -839,4 +917,43 @@ class Animation:
             Pygame surface of current Animation frame.
 
         """
-        return self.images[int(self.frame / self.img_duration)]
+        clip = self.clip
+        if self.duration == clip.img_duration:
+            return clip.images[clip.frame_table[self.frame]]
+        return clip.images[int(self.frame / self.duration)]
+
+    def variant(self, flip=False, rotation=0, size=None, alpha=255):
+        """Get current frame of AnimationState object transformed, from the variant cache where possible.
+        The frame itself is never changed, so other users of the frame are not affected.
+
+        Args:
+            flip: flip horizontally.
+            rotation: anticlockwise rotation in radians, rounded to ROTATION_STEP degrees.
+            size: size to scale the frame to before rotating, None for its own size.
+            alpha: surface alpha.
+        Returns:
+            Pygame surface of the transformed frame.
+
+        """
+        image = self.img()
+        size = image.get_size() if size is None else (int(size[0]), int(size[1]))
+        angle = round(math.degrees(rotation) / ROTATION_STEP) * ROTATION_STEP
+        alpha = max(0, min(255, int(alpha)))
+        if not flip and angle == 0 and size == image.get_size() and alpha == 255:
+            return image
+
+        key = (image, flip, angle, size, alpha)
+        variant = Animation.variants.get(key)
+        if variant is None:
+            variant = image
+            if size != image.get_size():
+                variant = pygame.transform.scale(variant, size)
+            if angle != 0:
+                variant = pygame.transform.rotate(variant, angle)
+            if flip:
+                variant = pygame.transform.flip(variant, True, False)
+            if alpha != 255:
+                variant = variant.copy() if variant is image else variant
+                variant.set_alpha(alpha)
+            Animation.variants.put(key, variant)
+        return variant
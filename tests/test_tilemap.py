@@ -0,0 +1,316 @@
+"""
+Tests for the tilemap module of Hilbert's Hotel.
+Checks the array backed grid and the routines built on it against the dict based behaviour they replaced.
+"""
+import json
+import math
+import os
+import random
+import types
+import numpy as np
+import pygame
+import pytest
+from scripts.tilemap import (AUTOTILE_MAP, AUTOTILE_TYPES, TileGrid, TileView, Tilemap,
+                             load_map_binary, map_source_hash, save_map_binary)
+
+TILE_TYPES = ('normal', 'grass', 'spawners', 'decor', 'cracked')
+
+
+def random_tiles(rng, count=200, span=30):
+    tiles = {}
+    for _ in range(count):
+        x, y = rng.randint(-span, span), rng.randint(-span, span)
+        tiles[str(x) + ';' + str(y)] = {'type': rng.choice(TILE_TYPES), 'variant': rng.randint(0, 12), 'pos': [x, y]}
+    return tiles
+
+
+# TileGrid / TileView (user-001)
+
+def test_grid_round_trips_a_tile_dict():
+    tiles = random_tiles(random.Random(1))
+    grid = TileGrid()
+    grid.from_dict(tiles)
+    assert grid.to_dict() == tiles
+    assert grid.count() == len(tiles)
+
+
+def test_view_behaves_like_the_dict_it_replaced():
+    rng = random.Random(2)
+    expected = random_tiles(rng, count=50, span=10)
+    grid = TileGrid()
+    grid.from_dict(expected)
+    view = TileView(grid)
+
+    for _ in range(2000):
+        x, y = rng.randint(-25, 25), rng.randint(-25, 25)
+        key = str(x) + ';' + str(y)
+        action = rng.random()
+        if action < 0.4:
+            tile = {'type': rng.choice(TILE_TYPES), 'variant': rng.randint(0, 12), 'pos': [x, y]}
+            view[key] = tile
+            expected[key] = tile
+        elif action < 0.7:
+            if key in expected:
+                del view[key]
+                del expected[key]
+            else:
+                with pytest.raises(KeyError):
+                    del view[key]
+        else:
+            assert (key in view) == (key in expected)
+            assert view.get(key) == expected.get(key)
+
+    assert len(view) == len(expected)
+    assert sorted(view) == sorted(expected)
+    assert view.copy() == expected
+
+
+def test_view_rejects_malformed_keys():
+    view = TileView(TileGrid())
+    assert 'nonsense' not in view
+    assert (1, 2) not in view
+    with pytest.raises(KeyError):
+        view['1;2;3']
+
+
+def test_grid_grows_to_fit_tiles_set_outside_it():
+    grid = TileGrid()
+    grid.set(0, 0, 'normal', 1)
+    grid.set(-100, 250, 'grass', 3)
+    assert grid.get_tile(0, 0) == {'type': 'normal', 'variant': 1, 'pos': [0, 0]}
+    assert grid.get_tile(-100, 250) == {'type': 'grass', 'variant': 3, 'pos': [-100, 250]}
+    assert grid.is_solid(-100, 250)
+    assert not grid.is_solid(-101, 250)
+    assert grid.count() == 2
+
+
+# Bulk autotiling (user-005)
+
+def autotile_reference(tiles):
+    # The per tile rules autotile followed before it was vectorised, without windows
+    for tile in tiles.values():
+        x, y = tile['pos']
+        if tile['type'] == 'cracked':
+            tile['variant'] = 4
+            for index, shift in enumerate([(0, 1), (0, -1), (1, 0), (-1, 0)]):
+                if str(x + shift[0]) + ';' + str(y + shift[1]) not in tiles:
+                    tile['variant'] = index
+            continue
+
+        neighbours = set()
+        for shift in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
+            check_loc = str(x + shift[0]) + ';' + str(y + shift[1])
+            if check_loc in tiles and tiles[check_loc]['type'] in AUTOTILE_TYPES:
+                neighbours.add(shift)
+        neighbours = tuple(sorted(neighbours))
+        if tile['type'] in AUTOTILE_TYPES and neighbours in AUTOTILE_MAP:
+            tile['variant'] = AUTOTILE_MAP[neighbours]
+
+
+def autotiled_map(tiles):
+    tilemap = Tilemap(None)
+    tilemap.tilemap = tiles
+    return tilemap
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_autotile_matches_the_per_tile_rules(seed):
+    tiles = random_tiles(random.Random(seed), count=600, span=20)
+    tilemap = autotiled_map(tiles)
+    tilemap.autotile(windows=False)
+    autotile_reference(tiles)
+    assert tilemap.grid.to_dict() == tiles
+
+
+def test_local_autotile_matches_a_full_pass():
+    rng = random.Random(5)
+    tiles = random_tiles(rng, count=600, span=20)
+    for tile in tiles.values():
+        tile['variant'] = rng.randint(0, 4)
+    tilemap = autotiled_map(tiles)
+    tilemap.autotile(windows=False)
+
+    for _ in range(50):
+        pos = (rng.randint(-21, 21), rng.randint(-21, 21))
+        if rng.random() < 0.5:
+            tilemap.set_tile(pos, rng.choice(TILE_TYPES), autotile=True)
+        else:
+            tilemap.delete_tile(pos, autotile=True)
+
+    expected = autotiled_map(tilemap.grid.to_dict())
+    expected.autotile(windows=False)
+    assert tilemap.grid.to_dict() == expected.grid.to_dict()
+
+
+# Compact map format (user-010)
+
+OFFGRID = [{'type': 'decor', 'variant': 2, 'pos': [17.5, -40.0]}, {'type': 'spawners', 'variant': 5, 'pos': [3.25, 8.0]}]
+
+
+def write_json_map(path, tiles, offgrid=OFFGRID):
+    data = json.dumps({'tilemap': tiles, 'tile_size': 16, 'offgrid': offgrid}).encode()
+    with open(path, 'wb') as f:
+        f.write(data)
+    return map_source_hash(data)
+
+
+def test_compact_map_round_trips(tmp_path):
+    tiles = random_tiles(random.Random(6))
+    grid = TileGrid()
+    grid.from_dict(tiles)
+    save_map_binary(tmp_path / 'map.npz', grid, 16, OFFGRID)
+
+    loaded, tile_size, offgrid = load_map_binary(tmp_path / 'map.npz')
+    assert loaded.to_dict() == tiles
+    assert tile_size == 16
+    assert offgrid == OFFGRID
+
+
+def test_compact_map_is_only_used_while_its_json_is_unchanged(tmp_path):
+    json_path = str(tmp_path / 'map.json')
+    json_tiles = random_tiles(random.Random(7))
+    source = write_json_map(json_path, json_tiles)
+
+    # A compact copy with different tiles shows which of the two was loaded
+    compact_tiles = random_tiles(random.Random(8))
+    grid = TileGrid()
+    grid.from_dict(compact_tiles)
+    save_map_binary(tmp_path / 'map.npz', grid, 16, OFFGRID, source=source)
+
+    tilemap = Tilemap(None)
+    assert tilemap.map_template(json_path)[0].to_dict() == compact_tiles
+
+    # Edited but left with an older mtime than the compact copy, as after a checkout
+    edited_tiles = random_tiles(random.Random(9))
+    write_json_map(json_path, edited_tiles)
+    os.utime(json_path, (0, 0))
+    assert tilemap.map_template(json_path)[0].to_dict() == edited_tiles
+    assert Tilemap(None).map_template(json_path)[0].to_dict() == edited_tiles
+
+
+def test_compact_map_without_its_json_is_used(tmp_path):
+    tiles = random_tiles(random.Random(10))
+    grid = TileGrid()
+    grid.from_dict(tiles)
+    save_map_binary(tmp_path / 'map.npz', grid, 16, OFFGRID)
+    assert Tilemap(None).map_template(str(tmp_path / 'map.json'))[0].to_dict() == tiles
+
+
+def test_saving_both_formats_keeps_the_compact_copy_in_use(tmp_path):
+    tilemap = Tilemap(None)
+    tilemap.tilemap = random_tiles(random.Random(11))
+    tilemap.offgrid_tiles = [dict(tile) for tile in OFFGRID]
+    tilemap.save_tilemap(str(tmp_path / 'map.json'))
+    tilemap.save_tilemap(str(tmp_path / 'map.npz'))
+
+    with np.load(tmp_path / 'map.npz') as data:
+        source = str(data['source'])
+    with open(tmp_path / 'map.json', 'rb') as f:
+        assert source == map_source_hash(f.read())
+
+
+# Grid collision resolver (user-011)
+
+def sweep_reference(tilemap, pos, size, axis, movement, is_boss):
+    # The Rect based collision PhysicsEntity.update did before sweep_axis
+    entity_rect = pygame.Rect(pos[0], pos[1], size[0], size[1])
+    hit_back = hit_forward = False
+    last_hit = None
+    for rect in tilemap.physics_rects_around(entity_rect.center, is_boss=is_boss):
+        if entity_rect.colliderect(rect):
+            if movement > 0:
+                if axis == 0:
+                    entity_rect.right = rect.left
+                else:
+                    entity_rect.bottom = rect.top
+                hit_forward = True
+            elif movement < 0:
+                if axis == 0:
+                    entity_rect.left = rect.right
+                else:
+                    entity_rect.top = rect.bottom
+                hit_back = True
+            last_hit = (rect.x // tilemap.tile_size, rect.y // tilemap.tile_size)
+    return [entity_rect.x, entity_rect.y], hit_back, hit_forward, last_hit
+
+
+def test_sweep_axis_matches_rect_collision():
+    rng = random.Random(12)
+    tilemap = Tilemap(None)
+    tilemap.tilemap = random_tiles(rng, count=500, span=15)
+    hits = 0
+    for _ in range(5000):
+        pos = (rng.uniform(-280, 280), rng.uniform(-280, 280))
+        size = (rng.randint(1, 40), rng.randint(1, 40))
+        axis = rng.randint(0, 1)
+        movement = rng.choice((-2.5, -0.5, 0, 0.5, 2.5))
+        is_boss = rng.random() < 0.3
+        expected = sweep_reference(tilemap, pos, size, axis, movement, is_boss)
+        assert tilemap.sweep_axis(pos, size, axis, movement, is_boss) == expected
+        hits += expected[3] is not None
+    assert hits > 1000
+
+
+# DDA line of sight (user-012)
+
+def sampled_first_hit(tilemap, start, end, samples=4000):
+    # First occupied tile found by stepping finely along the segment
+    for n in range(samples + 1):
+        t = n / samples
+        tile = (math.floor((start[0] + t * (end[0] - start[0])) / tilemap.tile_size),
+                math.floor((start[1] + t * (end[1] - start[1])) / tilemap.tile_size))
+        if tilemap.has_tile(tile):
+            return tile
+    return None
+
+
+def old_line_of_sight(tilemap, start, end):
+    # The ten point check check_line_to_player did before the raycast
+    for n in range(10):
+        x = int((start[0] + (n / 10) * (end[0] - start[0])) // 16)
+        y = int((start[1] + (n / 10) * (end[1] - start[1])) // 16)
+        if str(x) + ';' + str(y) in tilemap.tilemap:
+            return False
+    return True
+
+
+def sight_map(seed):
+    tilemap = Tilemap(types.SimpleNamespace(frame_count=0))
+    tilemap.tilemap = random_tiles(random.Random(seed), count=120, span=15)
+    return tilemap
+
+
+def test_raycast_finds_the_first_tile_on_the_segment():
+    rng = random.Random(13)
+    tilemap = sight_map(13)
+    for _ in range(300):
+        start = (rng.uniform(-260, 260), rng.uniform(-260, 260))
+        end = (rng.uniform(-260, 260), rng.uniform(-260, 260))
+        hit = tilemap.raycast(start, end)
+        expected = sampled_first_hit(tilemap, start, end)
+        assert (hit[0] if hit else None) == expected
+        if hit:
+            (tile_x, tile_y), (x, y) = hit
+            assert tile_x * 16 - 1e-6 <= x <= (tile_x + 1) * 16 + 1e-6
+            assert tile_y * 16 - 1e-6 <= y <= (tile_y + 1) * 16 + 1e-6
+
+
+def test_raycast_never_sees_through_what_the_sampled_check_hit():
+    rng = random.Random(14)
+    tilemap = sight_map(14)
+    for _ in range(2000):
+        start = (rng.randint(-260, 260), rng.randint(-260, 260))
+        end = (rng.randint(-260, 260), rng.randint(-260, 260))
+        if not old_line_of_sight(tilemap, start, end):
+            assert not tilemap.line_of_sight(start, end)
+
+
+def test_batched_lines_of_sight_match_single_rays():
+    rng = random.Random(15)
+    tilemap = sight_map(15)
+    end = (rng.uniform(-200, 200), rng.uniform(-200, 200))
+    starts = [(rng.uniform(-260, 260), rng.uniform(-260, 260)) for _ in range(300)]
+    batched = tilemap.lines_of_sight(starts, end).tolist()
+    single = sight_map(15)
+    assert batched == [single.raycast(start, end) is None for start in starts]
+    assert 0 < sum(batched) < len(batched)